@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+from memoria_compartida import PublicacioCompartida, connecta_recomanacio
+from avaluador import AcumuladorErrors
+from temps import etapa
+import numpy as np
+import logging
+import time
+
+
+_recomanacio_worker = None
+
+
+def _inicialitza_worker(descriptor: dict):
+    """
+    Connecta cada procés del pool a la recomanació publicada en memòria compartida.
+
+    Les puntuacions s'obtenen amb connecta_score i el model es reconstrueix
+    sobre els arrays compartits, sense copiar-ne cap.
+
+    Parameters
+    ----------
+    descriptor : dict
+        Descriptor de PublicacioCompartida de la recomanació a avaluar.
+    """
+    global _recomanacio_worker
+    _recomanacio_worker = connecta_recomanacio(descriptor)
+
+
+def _avalua_fragment(files, mida_bloc, parametres):
+    """
+    Avalua un fragment d'usuaris al procés actual.
+
+    Parameters
+    ----------
+    files : np.ndarray
+        Índexs de fila dels usuaris del fragment.
+    mida_bloc : int
+        Nombre d'usuaris que es puntuen alhora.
+    parametres : dict
+        Paràmetres propis del mètode (p. ex. min_vots).
+
+    Returns
+    -------
+    AcumuladorErrors
+        Totals d'errors del fragment.
+    """
+    return avalua_files(_recomanacio_worker, files, mida_bloc, **parametres)
+
+
+def avalua_files(recomanacio, files, mida_bloc: int = 256, **parametres):
+    """
+    Acumula els errors de predicció d'uns quants usuaris, per blocs.
+
+    Parameters
+    ----------
+    recomanacio : Recomanacio
+        Objecte de recomanació a avaluar.
+    files : np.ndarray
+        Índexs de fila dels usuaris.
+    mida_bloc : int
+        Nombre d'usuaris que es puntuen alhora.
+    **parametres
+        Paràmetres propis del mètode (p. ex. min_vots).
+
+    Returns
+    -------
+    AcumuladorErrors
+        Totals d'errors dels usuaris.
+    """
+    acumulador = AcumuladorErrors()
+    score = recomanacio.score
+    for inici in range(0, len(files), mida_bloc):
+        bloc = files[inici:inici + mida_bloc]
+        with etapa('puntuacio'):
+            prediccions = recomanacio.puntuacions_lot(bloc, **parametres)
+        with etapa('errors'):
+            acumulador.afegeix_lot(prediccions, score.files_puntuacions(bloc))
+    return acumulador
+
+
+def avalua(recomanacio, ids_usuaris=None, mostra: int = None, processos: int = 1, llavor: int = 0,
+           mida_bloc: int = 256, descriptor: dict = None, **parametres):
+    """
+    Avalua un mètode de recomanació sobre tots els usuaris o una mostra.
+
+    Només es tenen en compte els usuaris amb alguna valoració. Amb més d'un
+    procés, els usuaris es reparteixen en fragments entre un pool de
+    processos i els totals parcials es combinen al final. Els processos no
+    reben una còpia de la recomanació: s'enganxen a la publicació en
+    memòria compartida.
+
+    Parameters
+    ----------
+    recomanacio : Recomanacio
+        Objecte de recomanació a avaluar.
+    ids_usuaris : list, optional
+        Usuaris a avaluar; per defecte, tots els carregats.
+    mostra : int, optional
+        Nombre d'usuaris a triar a l'atzar d'entre els anteriors.
+    processos : int
+        Nombre de processos del pool.
+    llavor : int
+        Llavor per triar la mostra.
+    mida_bloc : int
+        Nombre d'usuaris que es puntuen alhora.
+    descriptor : dict, optional
+        Descriptor d'una PublicacioCompartida de la recomanació ja feta; si no
+        s'indica i hi ha més d'un procés, se'n fa una per a aquesta avaluació.
+    **parametres
+        Paràmetres propis del mètode (p. ex. min_vots).
+
+    Returns
+    -------
+    dict
+        Mètode, usuaris avaluats, MAE, RMSE, temps i usuaris per segon.
+    """
+    score = recomanacio.score
+    if ids_usuaris is None:
+        files = np.arange(score.n_usuaris)
+    else:
+        files = score.index_usuaris(ids_usuaris)
+        files = files[files >= 0]
+    files = files[score.vots_usuaris()[files] > 0]
+    if mostra is not None and mostra < len(files):
+        files = np.sort(np.random.default_rng(llavor).choice(files, mostra, replace=False))
+
+    metode = type(recomanacio).__name__
+    logging.info(f"Avaluant {metode} sobre {len(files)} usuaris amb {processos} processos")
+    inici = time.perf_counter()
+    if processos <= 1:
+        acumulador = avalua_files(recomanacio, files, mida_bloc, **parametres)
+    else:
+        acumulador = AcumuladorErrors()
+        fragments = np.array_split(files, processos * 4)
+        publicacio = PublicacioCompartida(recomanacio) if descriptor is None else None
+        try:
+            with ProcessPoolExecutor(processos, initializer=_inicialitza_worker,
+                                     initargs=(descriptor or publicacio.descriptor,)) as pool:
+                parcials = pool.map(_avalua_fragment, fragments, [mida_bloc] * len(fragments),
+                                    [parametres] * len(fragments))
+                for parcial in parcials:
+                    acumulador.combina(parcial)
+        finally:
+            if publicacio is not None:
+                publicacio.tanca()
+    segons = time.perf_counter() - inici
+
+    resultat = {
+        'metode': metode,
+        'usuaris': acumulador.n_usuaris,
+        'valoracions': acumulador.n_valoracions,
+        'mae': acumulador.mae(),
+        'rmse': acumulador.rmse(),
+        'segons': segons,
+        'usuaris_per_segon': acumulador.n_usuaris / segons if segons > 0 else float('inf'),
+    }
+    logging.info(f"{metode}: {resultat['usuaris_per_segon']:.1f} usuaris/s, MAE: {resultat['mae']}, RMSE: {resultat['rmse']}")
+    return resultat
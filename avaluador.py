@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import numpy as np
+import math
+
+
+class Avaluador():
+    """
+    Classe per avaluar les prediccions de recomanacions.
+
+    Attributes
+    ----------
+    _prediccions : np.array
+        Vector de prediccions.
+    _valoracions_usuari : np.array
+        Vector de valoracions dels usuaris.
+    _mascara : np.array
+        Vector booleana que indica on hi ha valoracions no nul·les.
+
+    Methods
+    -------
+    __init__(prediccions, valoracions_usuari)
+        Inicialitza un nou objecte Avaluador.
+    mae()
+        Calcula l'Error Absolut Mitjà (MAE) de les prediccions.
+    rmse()
+        Calcula l'Arrel de l'Error Quadràtic Mitjà (RMSE) de les prediccions.
+    """
+    _prediccions: np.array
+    _valoracions_usuari: np.array
+    _mascara: np.array
+    
+    def __init__(self, prediccions: np.array, valoracions_usuari: np.array):
+        """
+        Inicialitza un nou objecte Avaluador.
+
+        Parameters
+        ----------
+        prediccions : np.array
+            Matriu de prediccions.
+        valoracions_usuari : np.array
+            Matriu de valoracions dels usuaris.
+        """
+        self._prediccions = prediccions
+        self._valoracions_usuari = valoracions_usuari
+        self._mascara = self._valoracions_usuari != 0.0
+    
+    def mae(self):
+        """
+        Calcula l'Error Absolut Mitjà (MAE) de les prediccions.
+
+        Returns
+        -------
+        float
+            Valor del MAE.
+        """
+        return (np.sum(abs(self._prediccions[self._mascara] - self._valoracions_usuari[self._mascara]))) / np.count_nonzero(self._valoracions_usuari)
+    
+    def rmse(self):
+        """
+        Calcula l'Arrel de l'Error Quadràtic Mitjà (RMSE) de les prediccions.
+
+        Returns
+        -------
+        float
+            Valor del RMSE.
+        """
+        return math.sqrt((np.sum((self._valoracions_usuari[self._mascara] - self._prediccions[self._mascara])**2))/np.count_nonzero(self._valoracions_usuari))
+
+
+class AcumuladorErrors():
+    """
+    Acumula els errors de moltes prediccions com a totals parcials.
+
+    Permet calcular el MAE i l'RMSE de tot un conjunt d'usuaris sense
+    guardar cap predicció, i combinar els totals de diferents processos.
+
+    Attributes
+    ----------
+    _suma_abs : float
+        Suma dels errors absoluts.
+    _suma_quadrats : float
+        Suma dels errors al quadrat.
+    _n_valoracions : int
+        Nombre de valoracions comparades.
+    _n_usuaris : int
+        Nombre d'usuaris avaluats.
+
+    Methods
+    -------
+    afegeix(prediccions, valoracions_usuari)
+        Acumula els errors d'un usuari.
+    afegeix_lot(prediccions, valoracions)
+        Acumula els errors d'un bloc d'usuaris.
+    combina(altre)
+        Suma els totals d'un altre acumulador.
+    mae()
+        Calcula l'Error Absolut Mitjà (MAE) acumulat.
+    rmse()
+        Calcula l'Arrel de l'Error Quadràtic Mitjà (RMSE) acumulat.
+    """
+    _suma_abs: float
+    _suma_quadrats: float
+    _n_valoracions: int
+    _n_usuaris: int
+
+    def __init__(self):
+        """
+        Inicialitza un acumulador buit.
+        """
+        self._suma_abs = 0.0
+        self._suma_quadrats = 0.0
+        self._n_valoracions = 0
+        self._n_usuaris = 0
+
+    @property
+    def n_usuaris(self) -> int:
+        return self._n_usuaris
+
+    @property
+    def n_valoracions(self) -> int:
+        return self._n_valoracions
+
+    def afegeix(self, prediccions: np.array, valoracions_usuari: np.array):
+        """
+        Acumula els errors d'un usuari, només on té valoracions.
+
+        Parameters
+        ----------
+        prediccions : np.array
+            Vector de prediccions.
+        valoracions_usuari : np.array
+            Vector de valoracions de l'usuari.
+        """
+        mascara = valoracions_usuari != 0
+        errors = np.asarray(prediccions, dtype=np.float64)[mascara] - np.asarray(valoracions_usuari, dtype=np.float64)[mascara]
+        self._acumula(errors, 1 if len(errors) else 0)
+
+    def afegeix_lot(self, prediccions: np.array, valoracions):
+        """
+        Acumula els errors d'un bloc d'usuaris, només on tenen valoracions.
+
+        Parameters
+        ----------
+        prediccions : np.array
+            Matriu (usuaris x ítems) de prediccions.
+        valoracions : np.array o sp.spmatrix
+            Matriu (usuaris x ítems) de valoracions, densa o dispersa.
+        """
+        if hasattr(valoracions, 'tocoo'):
+            valoracions = valoracions.tocoo()
+            files, columnes, valors = valoracions.row, valoracions.col, valoracions.data
+            no_zero = valors != 0
+            files, columnes, valors = files[no_zero], columnes[no_zero], valors[no_zero]
+        else:
+            files, columnes = np.nonzero(valoracions)
+            valors = valoracions[files, columnes]
+        errors = prediccions[files, columnes] - valors.astype(np.float64)
+        self._acumula(errors, len(np.unique(files)))
+
+    def _acumula(self, errors: np.array, n_usuaris: int):
+        """
+        Suma uns errors als totals.
+
+        Parameters
+        ----------
+        errors : np.array
+            Diferències entre prediccions i valoracions.
+        n_usuaris : int
+            Nombre d'usuaris als quals corresponen els errors.
+        """
+        self._suma_abs += float(np.sum(np.abs(errors)))
+        self._suma_quadrats += float(np.sum(errors**2))
+        self._n_valoracions += len(errors)
+        self._n_usuaris += n_usuaris
+
+    def combina(self, altre: 'AcumuladorErrors'):
+        """
+        Suma els totals d'un altre acumulador.
+
+        Parameters
+        ----------
+        altre : AcumuladorErrors
+            Acumulador amb els totals d'un altre fragment d'usuaris.
+        """
+        self._suma_abs += altre._suma_abs
+        self._suma_quadrats += altre._suma_quadrats
+        self._n_valoracions += altre._n_valoracions
+        self._n_usuaris += altre._n_usuaris
+
+    def mae(self):
+        """
+        Calcula l'Error Absolut Mitjà (MAE) de totes les prediccions acumulades.
+
+        Returns
+        -------
+        float
+            Valor del MAE (nan si no s'ha acumulat res).
+        """
+        if self._n_valoracions == 0:
+            return math.nan
+        return self._suma_abs / self._n_valoracions
+
+    def rmse(self):
+        """
+        Calcula l'Arrel de l'Error Quadràtic Mitjà (RMSE) de totes les prediccions acumulades.
+
+        Returns
+        -------
+        float
+            Valor de l'RMSE (nan si no s'ha acumulat res).
+        """
+        if self._n_valoracions == 0:
+            return math.nan
+        return math.sqrt(self._suma_quadrats / self._n_valoracions)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from score import ScoreMovies, ScoreAnimes
+from recomender import crea_recomender
+from temps import mesura
+import numpy as np
+import argparse
+import platform
+import logging
+import json
+import time
+import sys
+import os
+
+
+VERSIO_FORMAT = 1
+
+DATASETS = {
+    'movielens100k': (ScoreMovies, 'MovieLens100K/movies.csv', 'MovieLens100K/ratings.csv'),
+    'animes': (ScoreAnimes, 'AnimeData/anime.csv', 'AnimeData/rating.csv'),
+}
+
+METODES = ['simple', 'colaboratiu', 'colaboratiu items', 'factoritzacio', 'basat en contingut']
+
+
+def cronometra(funcio, repeticions: int = 5, escalfament: int = 1) -> dict:
+    """
+    Mesura el temps d'una funció sense arguments diverses vegades.
+
+    Parameters
+    ----------
+    funcio : callable
+        Funció a mesurar.
+    repeticions : int
+        Nombre de mesures.
+    escalfament : int
+        Execucions prèvies que no es compten.
+
+    Returns
+    -------
+    dict
+        Mediana, mínim i màxim de les mesures, en segons, i nombre de repeticions.
+    """
+    for _ in range(escalfament):
+        funcio()
+    mesures = []
+    for _ in range(repeticions):
+        inici = time.perf_counter()
+        funcio()
+        mesures.append(time.perf_counter() - inici)
+    return {'mediana': float(np.median(mesures)), 'minim': min(mesures), 'maxim': max(mesures),
+            'repeticions': repeticions}
+
+
+def cronometra_construccio(funcio, repeticions: int = 3) -> tuple:
+    """
+    Mesura diverses vegades una construcció, amb el desglossament per etapes.
+
+    No hi ha escalfament: cada construcció torna a llegir els fitxers i es
+    mesura sencera. Les etapes són les de la construcció més ràpida.
+
+    Parameters
+    ----------
+    funcio : callable
+        Funció sense arguments que construeix l'objecte.
+    repeticions : int
+        Nombre de construccions.
+
+    Returns
+    -------
+    tuple
+        Objecte de l'última construcció i diccionari amb la mediana, el mínim,
+        el màxim, el nombre de repeticions i les etapes.
+    """
+    mesures = []
+    for _ in range(repeticions):
+        with mesura() as cronometre:
+            objecte = funcio()
+        mesures.append(cronometre.registre())
+    totals = [m['total'] for m in mesures]
+    mes_rapida = mesures[int(np.argmin(totals))]
+    return objecte, {'mediana': float(np.median(totals)), 'minim': min(totals), 'maxim': max(totals),
+                     'repeticions': repeticions, 'etapes': mes_rapida['etapes']}
+
+
+def benchmark_score(dataset: str, repeticions: int = 5, llavor: int = 0, mostra: int = 50,
+                    construccions: int = 3) -> dict:
+    """
+    Mesura les primitives de Score (similitud, avg_item, avg_usu, min_vots, vector_puntuacions).
+
+    Cada primitiva es crida sobre una mostra fixa d'usuaris o d'ítems triada amb la llavor.
+
+    Parameters
+    ----------
+    dataset : str
+        Nom del dataset (clau de DATASETS).
+    repeticions : int
+        Mesures de cada primitiva.
+    llavor : int
+        Llavor de la mostra.
+    mostra : int
+        Nombre d'usuaris, d'ítems i de parelles d'usuaris de la mostra.
+    construccions : int
+        Mesures de la construcció de l'objecte Score.
+
+    Returns
+    -------
+    dict
+        Resultats per nom de mesura ('<dataset>/score.<primitiva>').
+    """
+    classe, fitxer_items, fitxer_valoracions = DATASETS[dataset]
+    resultats = {}
+    score, resultats[f'{dataset}/score.construccio'] = cronometra_construccio(
+        lambda: classe(fitxer_items, fitxer_valoracions), construccions)
+
+    rng = np.random.default_rng(llavor)
+    usuaris = [str(u) for u in rng.choice(score.ll_usuaris(), mostra)]
+    altres = [str(u) for u in rng.choice(score.ll_usuaris(), mostra)]
+    items = [str(i) for i in rng.choice(score.ll_items(), mostra)]
+
+    primitives = {
+        'similitud': lambda: [score.similitud(u, v) for u, v in zip(usuaris, altres)],
+        'avg_item': lambda: [score.avg_item(i) for i in items],
+        'avg_usu': lambda: [score.avg_usu(u) for u in usuaris],
+        'min_vots': lambda: score.min_vots(10),
+        'vector_puntuacions': lambda: [score.vector_puntuacions(u) for u in usuaris],
+    }
+    for nom, funcio in primitives.items():
+        logging.info(f"Benchmark {dataset}/score.{nom}")
+        resultats[f'{dataset}/score.{nom}'] = cronometra(funcio, repeticions)
+    return resultats
+
+
+def benchmark_metode(dataset: str, metode: str, repeticions: int = 5, llavor: int = 0, mostra: int = 20,
+                     min_vots: int = 10, construccions: int = 3) -> dict:
+    """
+    Mesura la construcció i recomana_per d'un mètode de recomanació.
+
+    Parameters
+    ----------
+    dataset : str
+        Nom del dataset (clau de DATASETS).
+    metode : str
+        Mètode de recomanació.
+    repeticions : int
+        Mesures de recomana_per sobre tota la mostra.
+    llavor : int
+        Llavor de la mostra d'usuaris.
+    mostra : int
+        Nombre d'usuaris de la mostra.
+    min_vots : int
+        Mínim de vots del mètode simple.
+    construccions : int
+        Mesures de la construcció del recomanador.
+
+    Returns
+    -------
+    dict
+        Resultats per nom de mesura ('<dataset>/<metode>.construccio' i '<dataset>/<metode>.recomana_per').
+    """
+    clau = f"{dataset}/{metode.replace(' ', '_')}"
+    logging.info(f"Benchmark {clau}")
+    r, construccio = cronometra_construccio(lambda: crea_recomender(dataset, metode), construccions)
+    recomanacio = r.recomanacio
+    usuaris = [str(u) for u in np.random.default_rng(llavor).choice(recomanacio.score.ll_usuaris(), mostra)]
+    extra = {'min_vots': min_vots} if metode == 'simple' else {}
+    return {
+        f'{clau}.construccio': construccio,
+        f'{clau}.recomana_per': cronometra(lambda: [recomanacio.recomana_per(u, **extra) for u in usuaris],
+                                           repeticions),
+    }
+
+
+def executa(datasets=None, metodes=None, repeticions: int = 5, llavor: int = 0, construccions: int = 3) -> dict:
+    """
+    Executa tot el benchmark.
+
+    Parameters
+    ----------
+    datasets : list, optional
+        Datasets a mesurar; per defecte, tots els de DATASETS.
+    metodes : list, optional
+        Mètodes a mesurar; per defecte, tots els de METODES.
+    repeticions : int
+        Mesures de cada primitiva i mètode.
+    llavor : int
+        Llavor de les mostres.
+    construccions : int
+        Mesures de cada construcció.
+
+    Returns
+    -------
+    dict
+        Format, entorn, paràmetres i resultats.
+    """
+    resultats = {}
+    for dataset in datasets or list(DATASETS):
+        resultats.update(benchmark_score(dataset, repeticions, llavor, construccions=construccions))
+        for metode in metodes or METODES:
+            resultats.update(benchmark_metode(dataset, metode, repeticions, llavor, construccions=construccions))
+    return {
+        'format': VERSIO_FORMAT,
+        'entorn': {'python': platform.python_version(), 'numpy': np.__version__, 'maquina': platform.machine(),
+                   'cpus': os.cpu_count()},
+        'parametres': {'repeticions': repeticions, 'llavor': llavor, 'construccions': construccions},
+        'resultats': resultats,
+    }
+
+
+def compara(actual: dict, base: dict, llindar: float = 0.2, marge: float = 1e-3) -> list:
+    """
+    Compara una execució amb una de referència i retorna les regressions.
+
+    Una mesura empitjora si la mediana actual supera la de referència en
+    més d'un llindar relatiu i també en més d'un marge absolut (per no
+    comptar soroll en mesures de microsegons). Les mesures que no són a
+    totes dues execucions, o que en alguna tenen una sola repetició, no es
+    comparen: una mostra única no és prou estable per fer de llindar.
+
+    Parameters
+    ----------
+    actual : dict
+        Resultat d'executa().
+    base : dict
+        Resultat de referència.
+    llindar : float
+        Augment relatiu tolerat (0.2 = 20%).
+    marge : float
+        Augment absolut tolerat, en segons.
+
+    Returns
+    -------
+    list
+        Tuples (nom, mediana de referència, mediana actual) de les mesures que empitjoren.
+    """
+    regressions = []
+    for nom, mesura_base in base['resultats'].items():
+        if nom not in actual['resultats']:
+            continue
+        if min(mesura_base.get('repeticions', 1), actual['resultats'][nom].get('repeticions', 1)) < 2:
+            continue
+        abans, ara = mesura_base['mediana'], actual['resultats'][nom]['mediana']
+        if ara > abans * (1 + llindar) and ara - abans > marge:
+            regressions.append((nom, abans, ara))
+    return regressions
+
+
+def main(arguments=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de les primitives de Score i dels mètodes de recomanació")
+    parser.add_argument('--datasets', nargs='+', choices=list(DATASETS), default=None, help="Datasets a mesurar")
+    parser.add_argument('--metodes', nargs='+', choices=METODES, default=None, help="Mètodes a mesurar")
+    parser.add_argument('--repeticions', type=int, default=5, help="Mesures de cada primitiva i mètode")
+    parser.add_argument('--construccions', type=int, default=3, help="Mesures de cada construcció (Score i mètodes)")
+    parser.add_argument('--llavor', type=int, default=0, help="Llavor de les mostres d'usuaris i d'ítems")
+    parser.add_argument('--sortida', metavar='FITXER', default=None, help="Desa els resultats en JSON")
+    parser.add_argument('--compara', metavar='FITXER', default=None, help="Compara amb uns resultats de referència")
+    parser.add_argument('--llindar', type=float, default=0.2, help="Augment relatiu tolerat en comparar (0.2 = 20%%)")
+    args = parser.parse_args(arguments)
+
+    resultat = executa(args.datasets, args.metodes, args.repeticions, args.llavor, args.construccions)
+    for nom, mesura_nom in resultat['resultats'].items():
+        print(f"{nom:55s} {mesura_nom['mediana'] * 1000:10.3f} ms")
+    if args.sortida is not None:
+        with open(args.sortida, 'w', encoding='utf-8') as f:
+            json.dump(resultat, f, indent=1)
+
+    if args.compara is not None:
+        with open(args.compara, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+        regressions = compara(resultat, base, args.llindar)
+        for nom, abans, ara in regressions:
+            print(f"REGRESSIÓ {nom}: {abans * 1000:.3f} ms -> {ara * 1000:.3f} ms ({ara / abans - 1:+.0%})")
+        if regressions:
+            return 1
+        print(f"Cap regressió per sobre del {args.llindar:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s | %(name)s | %(levelname)s | %(message)s')
+    sys.exit(main())
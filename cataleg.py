@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import csv
+import logging
+
+
+class Cataleg():
+    """
+    Índex en memòria del fitxer d'ítems, carregat un sol cop.
+
+    Attributes
+    ----------
+    _fitxer : str
+        Nom del fitxer d'ítems.
+    _index : dict
+        Diccionari id d'ítem -> (títol, extra, autor).
+
+    Methods
+    -------
+    __init__(nomFitxerTitols, columna_autor=None)
+        Llegeix el fitxer d'ítems i construeix l'índex.
+    busca(ID)
+        Retorna les dades d'un ítem.
+    busca_lot(ids)
+        Retorna les dades d'una llista d'ítems.
+    """
+    _fitxer: str
+    _index: dict
+
+    def __init__(self, nomFitxerTitols: str, columna_autor: int = None):
+        """
+        Llegeix el fitxer d'ítems i construeix l'índex.
+
+        Parameters
+        ----------
+        nomFitxerTitols : str
+            Nom del fitxer de títols.
+        columna_autor : int, optional
+            Columna del fitxer on hi ha l'autor, si n'hi ha.
+        """
+        logging.info(f"Carregant catàleg d'ítems de {nomFitxerTitols}")
+        self._fitxer = nomFitxerTitols
+        self._index = {}
+        with open(nomFitxerTitols, 'r', encoding='utf-8') as f:
+            next(f)
+            reader = csv.reader(f)
+            for line in reader:
+                if line and line[0] not in self._index:
+                    autor = line[columna_autor] if columna_autor is not None else ''
+                    self._index[line[0]] = (line[1], line[2], autor)
+        logging.debug(f"Ítems al catàleg: {len(self._index)}")
+
+    def __contains__(self, ID) -> bool:
+        return ID in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def busca(self, ID):
+        """
+        Retorna les dades d'un ítem.
+
+        Parameters
+        ----------
+        ID : str
+            Identificador de l'ítem.
+
+        Returns
+        -------
+        tuple
+            (títol, extra, autor), o None si l'ítem no és al catàleg.
+        """
+        return self._index.get(ID)
+
+    def busca_lot(self, ids):
+        """
+        Retorna les dades d'una llista d'ítems.
+
+        Parameters
+        ----------
+        ids : list
+            Identificadors dels ítems.
+
+        Returns
+        -------
+        list
+            (títol, extra, autor) de cada ítem, o None pels que no hi són.
+        """
+        return [self._index.get(ID) for ID in ids]
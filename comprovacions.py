@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+from instantania import desa, carrega, llegeix_manifest, reconstrueix_model
+from memoria_compartida import PublicacioCompartida
+from recomender import crea_recomender
+import avaluacio
+import numpy as np
+import argparse
+import tempfile
+import logging
+import sys
+
+
+METODES = ['simple', 'colaboratiu', 'colaboratiu items', 'factoritzacio', 'basat en contingut']
+
+
+def _recomanacions(recomender, ids_usuaris, metode: str):
+    """
+    Retorna els índexs dels ítems recomanats a uns usuaris.
+    """
+    extra = {'min_vots': 10} if metode == 'simple' else {}
+    return recomender.recomanacio.recomana_per_lot(ids_usuaris, 5, **extra)
+
+
+def comprova_reconstruccio_model(dataset: str, metode: str, usuaris: int = 50) -> list:
+    """
+    Desa una instantània, la carrega i en torna a ajustar només el model sobre les puntuacions desades.
+
+    És el camí que segueix carrega_o_crea quan canvia el codi del model: les
+    puntuacions es projecten a memòria en només lectura i el model s'ajusta
+    a sobre seu.
+
+    Parameters
+    ----------
+    dataset : str
+        Nom del dataset.
+    metode : str
+        Mètode de recomanació.
+    usuaris : int
+        Nombre d'usuaris amb què es comparen les recomanacions.
+
+    Returns
+    -------
+    list
+        Descripció dels errors trobats (buida si tot va bé).
+    """
+    errors = []
+    original = crea_recomender(dataset, metode)
+    ids_usuaris = original.recomanacio.score.ll_usuaris()[:usuaris]
+    esperades = _recomanacions(original, ids_usuaris, metode)
+    with tempfile.TemporaryDirectory() as directori:
+        desa(original, directori)
+        if not np.array_equal(_recomanacions(carrega(directori), ids_usuaris, metode), esperades):
+            errors.append("les recomanacions de la instantània carregada no coincideixen")
+        manifest = llegeix_manifest(directori)
+        generacio_score = manifest['parts']['score']['directori']
+        reconstruit = reconstrueix_model(directori, manifest, metode)
+        if not np.array_equal(_recomanacions(reconstruit, ids_usuaris, metode), esperades):
+            errors.append("les recomanacions del model reconstruït no coincideixen")
+        desa(reconstruit, directori, parts=('model',))
+        manifest = llegeix_manifest(directori)
+        if manifest['parts']['score']['directori'] != generacio_score:
+            errors.append("desar només el model ha tornat a escriure les puntuacions")
+        if not np.array_equal(_recomanacions(carrega(directori), ids_usuaris, metode), esperades):
+            errors.append("les recomanacions després de desar el model reconstruït no coincideixen")
+    return errors
+
+
+def _blocs_worker(_) -> dict:
+    """
+    Retorna, per a cada array numèric de les puntuacions i del model del procés, els blocs de memòria compartida que el contenen.
+    """
+    recomanacio = avaluacio._recomanacio_worker
+    blocs = [(bloc.name, np.frombuffer(bloc.buf, dtype=np.uint8)) for bloc in recomanacio._blocs_compartits]
+    _, arrays = recomanacio.score.estat()
+    # Els identificadors es tornen a posar en diccionaris a cada procés; estat() en fa arrays nous.
+    del arrays['ids_usuaris'], arrays['ids_items']
+    _, arrays_model = recomanacio.estat()
+    arrays.update({f'model/{nom}': array for nom, array in arrays_model.items()})
+    return {nom: [nom_bloc for nom_bloc, memoria in blocs if array.size and np.shares_memory(array, memoria)]
+            for nom, array in arrays.items()}
+
+
+def comprova_memoria_compartida(dataset: str, metode: str, processos: int = 2, mostra: int = 100) -> list:
+    """
+    Comprova que els processos de l'avaluació llegeixen la recomanació de la memòria compartida, sense copiar-la.
+
+    Cada procés del pool s'inicialitza com a avaluacio.avalua i informa de
+    quin bloc publicat conté cada array de les puntuacions i del model; a més,
+    l'avaluació en paral·lel ha de donar el mateix que la seqüencial.
+
+    Parameters
+    ----------
+    dataset : str
+        Nom del dataset.
+    metode : str
+        Mètode de recomanació.
+    processos : int
+        Processos del pool.
+    mostra : int
+        Usuaris de l'avaluació.
+
+    Returns
+    -------
+    list
+        Descripció dels errors trobats (buida si tot va bé).
+    """
+    errors = []
+    recomanacio = crea_recomender(dataset, metode).recomanacio
+    extra = {'min_vots': 10} if metode == 'simple' else {}
+    sequencial = avaluacio.avalua(recomanacio, mostra=mostra, **extra)
+    with PublicacioCompartida(recomanacio) as publicacio:
+        publicats = {descripcio['bloc'] for part in publicacio.descriptor['parts'].values()
+                     for descripcio in part['arrays'].values()}
+        with ProcessPoolExecutor(processos, initializer=avaluacio._inicialitza_worker,
+                                 initargs=(publicacio.descriptor,)) as pool:
+            informes = list(pool.map(_blocs_worker, range(processos)))
+        paralel = avaluacio.avalua(recomanacio, mostra=mostra, processos=processos,
+                                   descriptor=publicacio.descriptor, **extra)
+    for informe in informes:
+        for nom, blocs in informe.items():
+            if len(blocs) != 1 or blocs[0] not in publicats:
+                errors.append(f"l'array {nom} del procés no és a la memòria compartida publicada")
+    for mesura in ('usuaris', 'valoracions', 'mae', 'rmse'):
+        if not np.isclose(sequencial[mesura], paralel[mesura], equal_nan=True):
+            errors.append(f"{mesura} en paral·lel ({paralel[mesura]}) no coincideix amb el seqüencial ({sequencial[mesura]})")
+    return errors
+
+
+def main(arguments=None) -> int:
+    parser = argparse.ArgumentParser(description="Comprovacions de regressió sobre els datasets inclosos")
+    parser.add_argument('--datasets', nargs='+', default=['movielens100k', 'animes'], help="Datasets a comprovar")
+    parser.add_argument('--metodes', nargs='+', choices=METODES, default=METODES, help="Mètodes a comprovar")
+    args = parser.parse_args(arguments)
+
+    comprovacions = {'reconstrucció del model': comprova_reconstruccio_model,
+                     'memòria compartida': comprova_memoria_compartida}
+    fallades = 0
+    for dataset in args.datasets:
+        for metode in args.metodes:
+            for nom, comprovacio in comprovacions.items():
+                errors = comprovacio(dataset, metode)
+                print(f"{'FALLA' if errors else 'OK':5s} {nom} {dataset}/{metode}")
+                for error in errors:
+                    print(f"      {error}")
+                fallades += len(errors) > 0
+    return 1 if fallades else 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s | %(name)s | %(levelname)s | %(message)s')
+    sys.exit(main())
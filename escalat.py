@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from generador import genera, GENERADORS
+from score import ScoreMovies, ScoreBooks, ScoreAnimes
+from recomanacions import (RecomanacioSimple, RecomanacioColaborativa, RecomanacioColaborativaItems,
+                           RecomanacioFactoritzacio, RecomanacioBasadaEnContingut)
+import numpy as np
+import tracemalloc
+import itertools
+import argparse
+import tempfile
+import logging
+import json
+import time
+import os
+
+
+CLASSES_METODE = {
+    'simple': RecomanacioSimple,
+    'colaboratiu': RecomanacioColaborativa,
+    'colaboratiu items': RecomanacioColaborativaItems,
+    'factoritzacio': RecomanacioFactoritzacio,
+    'basat en contingut': RecomanacioBasadaEnContingut,
+}
+
+
+def treu_limits():
+    """
+    Desactiva els límits d'ítems, d'usuaris i de valoracions de les classes Score per a aquest procés.
+    """
+    for classe in (ScoreMovies, ScoreBooks, ScoreAnimes):
+        classe.MAX_ITEMS = None
+    ScoreBooks.MAX_USUARIS = None
+    ScoreBooks.MAX_VALORACIONS = None
+
+
+def mesura_memoria(funcio):
+    """
+    Executa una funció i en mesura el temps i el pic de memòria reservada.
+
+    El pic el dona tracemalloc, que també compta els arrays de numpy.
+
+    Parameters
+    ----------
+    funcio : callable
+        Funció sense arguments.
+
+    Returns
+    -------
+    tuple
+        Resultat de la funció, segons i pic de memòria en MB.
+    """
+    tracemalloc.start()
+    try:
+        inici = time.perf_counter()
+        resultat = funcio()
+        segons = time.perf_counter() - inici
+        _, pic = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return resultat, segons, pic / 2 ** 20
+
+
+def executa_escala(dataset: str, n_usuaris: int, n_items: int, densitat: float, metodes, directori: str,
+                   mostra: int = 20, llavor: int = 0, min_vots: int = 10) -> list:
+    """
+    Genera un dataset sintètic i mesura la construcció i la recomanació de cada mètode.
+
+    Parameters
+    ----------
+    dataset : str
+        Format del dataset ('movielens100k', 'books' o 'animes').
+    n_usuaris, n_items : int
+        Mida del dataset.
+    densitat : float
+        Fracció aproximada de cel·les amb valoració.
+    metodes : list
+        Mètodes a mesurar (claus de CLASSES_METODE).
+    directori : str
+        Directori on s'escriu el dataset.
+    mostra : int
+        Nombre d'usuaris als quals es recomana.
+    llavor : int
+        Llavor del dataset i de la mostra.
+    min_vots : int
+        Mínim de vots del mètode simple.
+
+    Returns
+    -------
+    list
+        Un diccionari per mètode amb la mida, els temps (s) i els pics de memòria (MB).
+    """
+    directori = os.path.join(directori, f'{dataset}_{n_usuaris}x{n_items}_{densitat}')
+    fitxers = genera(dataset, directori, n_usuaris, n_items, densitat, llavor=llavor)
+    files = []
+    for metode in metodes:
+        logging.info(f"Escala {dataset} {n_usuaris}x{n_items} ({densitat}): {metode}")
+        classe = CLASSES_METODE[metode]
+        recomanacio, construccio, memoria_construccio = mesura_memoria(
+            lambda: classe(fitxers['items'], fitxers['valoracions'], dataset))
+        score = recomanacio.score
+        usuaris = [str(u) for u in np.random.default_rng(llavor).choice(score.ll_usuaris(), mostra)]
+        extra = {'min_vots': min_vots} if metode == 'simple' else {}
+        _, recomanacio_segons, memoria_recomanacio = mesura_memoria(
+            lambda: [recomanacio.recomana_per(u, **extra) for u in usuaris])
+        files.append({'dataset': dataset, 'metode': metode, 'usuaris': score.n_usuaris, 'items': score.n_items,
+                      'valoracions': int(score.vots_usuaris().sum()), 'densitat': densitat,
+                      'construccio_s': construccio, 'construccio_mb': memoria_construccio,
+                      'recomanacio_s': recomanacio_segons / mostra, 'recomanacio_mb': memoria_recomanacio})
+        del recomanacio, score
+    return files
+
+
+def main(arguments=None) -> list:
+    parser = argparse.ArgumentParser(description="Temps i memòria de cada mètode sobre datasets sintètics de mida creixent")
+    parser.add_argument('--datasets', nargs='+', choices=list(GENERADORS), default=['movielens100k'])
+    parser.add_argument('--metodes', nargs='+', choices=list(CLASSES_METODE), default=list(CLASSES_METODE))
+    parser.add_argument('--usuaris', nargs='+', type=int, default=[1000, 4000], help="Nombres d'usuaris")
+    parser.add_argument('--items', nargs='+', type=int, default=[2000, 8000], help="Nombres d'ítems")
+    parser.add_argument('--densitats', nargs='+', type=float, default=[0.01], help="Densitats de la matriu")
+    parser.add_argument('--mostra', type=int, default=20, help="Usuaris als quals es recomana a cada escala")
+    parser.add_argument('--llavor', type=int, default=0, help="Llavor dels datasets i de les mostres")
+    parser.add_argument('--amb-limits', action='store_true', help="Manté els límits d'ítems i d'usuaris de les classes Score")
+    parser.add_argument('--directori', default=None, help="On s'escriuen els datasets (per defecte, un directori temporal)")
+    parser.add_argument('--sortida', metavar='FITXER', default=None, help="Desa els resultats en JSON")
+    args = parser.parse_args(arguments)
+
+    if not args.amb_limits:
+        treu_limits()
+    resultats = []
+    with tempfile.TemporaryDirectory() as temporal:
+        directori = args.directori or temporal
+        for dataset, n_usuaris, n_items, densitat in itertools.product(args.datasets, args.usuaris, args.items,
+                                                                       args.densitats):
+            resultats.extend(executa_escala(dataset, n_usuaris, n_items, densitat, args.metodes, directori,
+                                            args.mostra, args.llavor))
+
+    print(f"{'dataset':14s} {'metode':20s} {'usuaris':>8s} {'items':>8s} {'valoracions':>11s} "
+          f"{'construccio s':>13s} {'MB':>8s} {'recomanacio ms':>14s} {'MB':>8s}")
+    for fila in resultats:
+        print(f"{fila['dataset']:14s} {fila['metode']:20s} {fila['usuaris']:8d} {fila['items']:8d} "
+              f"{fila['valoracions']:11d} {fila['construccio_s']:13.3f} {fila['construccio_mb']:8.1f} "
+              f"{fila['recomanacio_s'] * 1000:14.3f} {fila['recomanacio_mb']:8.1f}")
+    if args.sortida is not None:
+        with open(args.sortida, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, indent=1)
+    return resultats
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s | %(name)s | %(levelname)s | %(message)s')
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import scipy.sparse as sp
+import logging
+from score import Score
+
+
+def valoracions_centrades(score: Score):
+    """
+    Retorna la matriu de valoracions menys la mitjana de cada usuari, només a les cel·les valorades.
+
+    Parameters
+    ----------
+    score : Score
+        Puntuacions.
+
+    Returns
+    -------
+    sp.csr_matrix
+        Matriu dispersa (usuaris x ítems) de desviacions respecte de la mitjana.
+    """
+    # Còpia explícita: els arrays d'una instantània són de només lectura.
+    mat = sp.csr_matrix(score.mat, dtype=np.float64, copy=True)
+    mat.eliminate_zeros()
+    mat.data -= np.repeat(score.mitjanes_usuaris(), np.diff(mat.indptr))
+    return mat
+
+
+def resol_factors(valoracions, fixos, regularitzacio: float = 0.1, mida_bloc: int = 4096):
+    """
+    Resol els factors de cada fila per mínims quadrats regularitzats, amb els altres factors fixos.
+
+    Per a cada fila u es resol (sum_i q_i q_i^T + reg * n_u * I) p_u = sum_i r_ui q_i,
+    on i recorre les columnes valorades. Les matrius de l'esquerra de tot un
+    bloc de files es calculen amb un sol producte dispers: la matriu de
+    valoracions (com a màscara) per la matriu dels productes exteriors q_i q_i^T.
+
+    Parameters
+    ----------
+    valoracions : sp.csr_matrix
+        Matriu (files x columnes) de valoracions centrades.
+    fixos : np.ndarray
+        Factors de les columnes (columnes x f).
+    regularitzacio : float
+        Pes de la regularització, multiplicat pel nombre de valoracions de la fila.
+    mida_bloc : int
+        Nombre de files que es resolen alhora.
+
+    Returns
+    -------
+    np.ndarray
+        Factors de les files (files x f).
+    """
+    n_files, f = valoracions.shape[0], fixos.shape[1]
+    exteriors = (fixos[:, :, np.newaxis] * fixos[:, np.newaxis, :]).reshape(len(fixos), f * f)
+    mascara = valoracions.copy()
+    mascara.data = np.ones_like(mascara.data)
+    vots = np.diff(valoracions.indptr)
+    resultat = np.zeros((n_files, f))
+    for inici in range(0, n_files, mida_bloc):
+        fi = min(inici + mida_bloc, n_files)
+        A = np.asarray(mascara[inici:fi] @ exteriors).reshape(fi - inici, f, f)
+        A += (regularitzacio * np.maximum(vots[inici:fi], 1))[:, np.newaxis, np.newaxis] * np.eye(f)
+        b = np.asarray(valoracions[inici:fi] @ fixos)
+        resultat[inici:fi] = np.linalg.solve(A, b[:, :, np.newaxis])[:, :, 0]
+    return resultat
+
+
+def entrena_als(valoracions, factors: int = 20, regularitzacio: float = 0.1, iteracions: int = 10, llavor: int = 0):
+    """
+    Entrena factors latents d'usuaris i d'ítems amb mínims quadrats alternats (ALS).
+
+    Parameters
+    ----------
+    valoracions : sp.csr_matrix
+        Matriu (usuaris x ítems) de valoracions centrades.
+    factors : int
+        Nombre de factors latents.
+    regularitzacio : float
+        Pes de la regularització.
+    iteracions : int
+        Nombre d'iteracions (cada una resol usuaris i ítems).
+    llavor : int
+        Llavor de la inicialització aleatòria.
+
+    Returns
+    -------
+    tuple
+        Factors dels usuaris (usuaris x f) i dels ítems (ítems x f).
+    """
+    logging.info(f"Entrenant ALS: {valoracions.shape[0]} usuaris, {valoracions.shape[1]} ítems, {factors} factors")
+    Q = np.random.default_rng(llavor).normal(0, 0.1, (valoracions.shape[1], factors))
+    per_items = valoracions.T.tocsr()
+    files = np.repeat(np.arange(valoracions.shape[0]), np.diff(valoracions.indptr))
+    for iteracio in range(iteracions):
+        P = resol_factors(valoracions, Q, regularitzacio)
+        Q = resol_factors(per_items, P, regularitzacio)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            errors = valoracions.data - np.einsum('ij,ij->i', P[files], Q[valoracions.indices])
+            logging.debug(f"ALS iteració {iteracio + 1}: RMSE d'entrenament {np.sqrt(np.mean(errors ** 2)):.4f}")
+    return P.astype(np.float32), Q.astype(np.float32)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import argparse
+import logging
+import csv
+import os
+
+
+GENERES = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Drama', 'Fantasy', 'Horror',
+           'Mystery', 'Romance', 'Sci-Fi', 'Thriller', 'War', 'Western']
+
+# Escala de puntuacions de cada format: mínim, màxim, pas, mitjana, desviació,
+# fracció de valoracions implícites i valor que les representa al fitxer.
+ESCALES = {
+    'movielens100k': (0.5, 5.0, 0.5, 3.5, 1.0, 0.0, None),
+    'books': (1.0, 10.0, 1.0, 7.6, 1.8, 0.6, 0),
+    'animes': (1.0, 10.0, 1.0, 7.8, 1.6, 0.2, -1),
+}
+
+
+def pesos_potencials(n: int, exponent: float, rng) -> np.ndarray:
+    """
+    Retorna probabilitats que segueixen una llei de potències (Zipf), en un ordre aleatori.
+
+    Parameters
+    ----------
+    n : int
+        Nombre d'elements.
+    exponent : float
+        Exponent de la llei (0 = uniforme; com més gran, més concentrada).
+    rng : np.random.Generator
+        Generador aleatori.
+
+    Returns
+    -------
+    np.ndarray
+        Probabilitat de cada element; sumen 1.
+    """
+    pesos = 1.0 / np.arange(1, n + 1) ** exponent
+    rng.shuffle(pesos)
+    return pesos / pesos.sum()
+
+
+def genera_valoracions(n_usuaris: int, n_items: int, densitat: float, dataset: str = 'movielens100k',
+                       exponent: float = 1.0, llavor: int = 0):
+    """
+    Genera valoracions sintètiques amb popularitat d'ítems i activitat d'usuaris en llei de potències.
+
+    Cada usuari té almenys una valoració. La puntuació combina la qualitat
+    de l'ítem, el biaix de l'usuari i soroll, i s'arrodoneix a l'escala del
+    dataset; una part de les valoracions es marca com a implícita si el
+    format en té (0 a Books, -1 a Animes).
+
+    Parameters
+    ----------
+    n_usuaris : int
+        Nombre d'usuaris.
+    n_items : int
+        Nombre d'ítems.
+    densitat : float
+        Fracció aproximada de cel·les de la matriu amb valoració.
+    dataset : str
+        Format de les puntuacions (clau d'ESCALES).
+    exponent : float
+        Exponent de la llei de potències de la popularitat dels ítems.
+    llavor : int
+        Llavor del generador aleatori.
+
+    Returns
+    -------
+    tuple
+        Índexs d'usuari i d'ítem (ordenats per usuari) i puntuacions.
+    """
+    minim, maxim, pas, mitjana, desviacio, implicites, valor_implicit = ESCALES[dataset]
+    rng = np.random.default_rng(llavor)
+    total = min(n_usuaris * n_items, max(n_usuaris, int(round(densitat * n_usuaris * n_items))))
+    popularitat = pesos_potencials(n_items, exponent, rng)
+    activitat = pesos_potencials(n_usuaris, exponent / 2, rng)
+
+    usuaris = np.concatenate([np.arange(n_usuaris), rng.choice(n_usuaris, total - n_usuaris, p=activitat)])
+    items = rng.choice(n_items, total, p=popularitat)
+    parelles = np.unique(usuaris.astype(np.int64) * n_items + items)
+    usuaris, items = parelles // n_items, parelles % n_items
+    logging.info(f"Generades {len(parelles)} valoracions ({len(parelles) / (n_usuaris * n_items):.5f} de densitat)")
+
+    qualitat = rng.normal(0, 0.6, n_items)
+    biaix = rng.normal(0, 0.4, n_usuaris)
+    z = qualitat[items] + biaix[usuaris] + rng.normal(0, 0.7, len(items))
+    valors = np.clip(np.round((mitjana + desviacio * z) / pas) * pas, minim, maxim)
+    if implicites > 0:
+        valors[rng.random(len(valors)) < implicites] = valor_implicit
+    return usuaris, items, valors
+
+
+def _escriu_csv(fitxer: str, capcalera: list, files):
+    """
+    Escriu un CSV amb capçalera.
+    """
+    with open(fitxer, 'w', encoding='utf-8', newline='') as f:
+        escriptor = csv.writer(f)
+        escriptor.writerow(capcalera)
+        escriptor.writerows(files)
+
+
+def _generes(rng, n: int, separador: str) -> list:
+    """
+    Retorna n combinacions aleatòries d'entre un i tres gèneres.
+    """
+    return [separador.join(rng.choice(GENERES, rng.integers(1, 4), replace=False)) for _ in range(n)]
+
+
+def genera_movielens(directori: str, n_usuaris: int, n_items: int, densitat: float, exponent: float = 1.0,
+                     llavor: int = 0) -> dict:
+    """
+    Escriu movies.csv i ratings.csv amb el format de MovieLens.
+
+    Parameters
+    ----------
+    directori : str
+        Directori de sortida (es crea si no existeix).
+    n_usuaris, n_items : int
+        Nombre d'usuaris i de pel·lícules.
+    densitat : float
+        Fracció aproximada de cel·les amb valoració.
+    exponent : float
+        Exponent de la popularitat dels ítems.
+    llavor : int
+        Llavor del generador aleatori.
+
+    Returns
+    -------
+    dict
+        Fitxers d'ítems i de valoracions.
+    """
+    os.makedirs(directori, exist_ok=True)
+    rng = np.random.default_rng(llavor + 1)
+    usuaris, items, valors = genera_valoracions(n_usuaris, n_items, densitat, 'movielens100k', exponent, llavor)
+    fitxers = {'items': os.path.join(directori, 'movies.csv'), 'valoracions': os.path.join(directori, 'ratings.csv')}
+    anys = rng.integers(1920, 2024, n_items)
+    _escriu_csv(fitxers['items'], ['movieId', 'title', 'genres'],
+                zip(range(1, n_items + 1), (f'Movie {i} ({a})' for i, a in zip(range(1, n_items + 1), anys)),
+                    _generes(rng, n_items, '|')))
+    instants = rng.integers(828000000, 1540000000, len(valors))
+    _escriu_csv(fitxers['valoracions'], ['userId', 'movieId', 'rating', 'timestamp'],
+                zip((usuaris + 1).tolist(), (items + 1).tolist(), valors.tolist(), instants.tolist()))
+    return fitxers
+
+
+def genera_books(directori: str, n_usuaris: int, n_items: int, densitat: float, exponent: float = 1.0,
+                 llavor: int = 0) -> dict:
+    """
+    Escriu Books.csv, Ratings.csv i Users.csv amb el format del Book Recommendation Dataset.
+
+    Els ISBN són text de deu xifres i les valoracions implícites valen 0.
+
+    Parameters
+    ----------
+    directori : str
+        Directori de sortida (es crea si no existeix).
+    n_usuaris, n_items : int
+        Nombre d'usuaris i de llibres.
+    densitat : float
+        Fracció aproximada de cel·les amb valoració.
+    exponent : float
+        Exponent de la popularitat dels ítems.
+    llavor : int
+        Llavor del generador aleatori.
+
+    Returns
+    -------
+    dict
+        Fitxers d'ítems, de valoracions i d'usuaris.
+    """
+    os.makedirs(directori, exist_ok=True)
+    rng = np.random.default_rng(llavor + 1)
+    usuaris, items, valors = genera_valoracions(n_usuaris, n_items, densitat, 'books', exponent, llavor)
+    fitxers = {'items': os.path.join(directori, 'Books.csv'), 'valoracions': os.path.join(directori, 'Ratings.csv'),
+               'usuaris': os.path.join(directori, 'Users.csv')}
+    isbns = [f'{i:010d}' for i in rng.choice(10 ** 9, n_items, replace=False)]
+    anys = rng.integers(1900, 2005, n_items)
+    _escriu_csv(fitxers['items'], ['ISBN', 'Book-Title', 'Book-Author', 'Year-Of-Publication', 'Publisher',
+                                   'Image-URL-S', 'Image-URL-M', 'Image-URL-L'],
+                ((isbn, f'Book {i}', f'Author {i % 997}', a, f'Publisher {i % 101}',
+                  *(f'http://images.amazon.com/images/P/{isbn}.01.{mida}ZZZZZZZ.jpg' for mida in 'THL'))
+                 for i, (isbn, a) in enumerate(zip(isbns, anys), 1)))
+    _escriu_csv(fitxers['valoracions'], ['User-ID', 'ISBN', 'Book-Rating'],
+                zip((usuaris + 1).tolist(), (isbns[i] for i in items), valors.astype(int).tolist()))
+    edats = rng.integers(10, 90, n_usuaris)
+    _escriu_csv(fitxers['usuaris'], ['User-ID', 'Location', 'Age'],
+                zip(range(1, n_usuaris + 1), ['nowhere, usa'] * n_usuaris, edats.tolist()))
+    return fitxers
+
+
+def genera_animes(directori: str, n_usuaris: int, n_items: int, densitat: float, exponent: float = 1.0,
+                  llavor: int = 0) -> dict:
+    """
+    Escriu anime.csv i rating.csv amb el format de l'Anime Recommendations Database.
+
+    Les valoracions implícites (vist però no puntuat) valen -1.
+
+    Parameters
+    ----------
+    directori : str
+        Directori de sortida (es crea si no existeix).
+    n_usuaris, n_items : int
+        Nombre d'usuaris i d'animes.
+    densitat : float
+        Fracció aproximada de cel·les amb valoració.
+    exponent : float
+        Exponent de la popularitat dels ítems.
+    llavor : int
+        Llavor del generador aleatori.
+
+    Returns
+    -------
+    dict
+        Fitxers d'ítems i de valoracions.
+    """
+    os.makedirs(directori, exist_ok=True)
+    rng = np.random.default_rng(llavor + 1)
+    usuaris, items, valors = genera_valoracions(n_usuaris, n_items, densitat, 'animes', exponent, llavor)
+    fitxers = {'items': os.path.join(directori, 'anime.csv'), 'valoracions': os.path.join(directori, 'rating.csv')}
+    membres = np.bincount(items, minlength=n_items) * 10
+    _escriu_csv(fitxers['items'], ['anime_id', 'name', 'genre', 'type', 'episodes', 'rating', 'members'],
+                zip(range(1, n_items + 1), (f'Anime {i}' for i in range(1, n_items + 1)), _generes(rng, n_items, ', '),
+                    rng.choice(['TV', 'Movie', 'OVA'], n_items), rng.integers(1, 100, n_items).tolist(),
+                    np.round(rng.uniform(5, 9.5, n_items), 2).tolist(), membres.tolist()))
+    _escriu_csv(fitxers['valoracions'], ['user_id', 'anime_id', 'rating'],
+                zip((usuaris + 1).tolist(), (items + 1).tolist(), valors.astype(int).tolist()))
+    return fitxers
+
+
+GENERADORS = {'movielens100k': genera_movielens, 'books': genera_books, 'animes': genera_animes}
+
+
+def genera(dataset: str, directori: str, n_usuaris: int, n_items: int, densitat: float, exponent: float = 1.0,
+           llavor: int = 0) -> dict:
+    """
+    Escriu un dataset sintètic amb el format d'un dels datasets ('movielens100k', 'books' o 'animes').
+
+    Returns
+    -------
+    dict
+        Fitxers escrits ('items', 'valoracions' i, a Books, 'usuaris').
+    """
+    logging.info(f"Generant {dataset} sintètic a {directori}: {n_usuaris} usuaris, {n_items} ítems, densitat {densitat}")
+    return GENERADORS[dataset](directori, n_usuaris, n_items, densitat, exponent, llavor)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(name)s | %(levelname)s | %(message)s')
+    parser = argparse.ArgumentParser(description="Genera datasets sintètics amb el format de MovieLens, Books o Animes")
+    parser.add_argument('dataset', choices=list(GENERADORS))
+    parser.add_argument('directori')
+    parser.add_argument('--usuaris', type=int, default=1000, help="Nombre d'usuaris")
+    parser.add_argument('--items', type=int, default=2000, help="Nombre d'ítems")
+    parser.add_argument('--densitat', type=float, default=0.01, help="Fracció aproximada de cel·les amb valoració")
+    parser.add_argument('--exponent', type=float, default=1.0, help="Exponent de la popularitat dels ítems")
+    parser.add_argument('--llavor', type=int, default=0, help="Llavor del generador aleatori")
+    args = parser.parse_args()
+    for nom, fitxer in genera(args.dataset, args.directori, args.usuaris, args.items, args.densitat,
+                              args.exponent, args.llavor).items():
+        print(f"{nom}: {fitxer}")
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from score import ScoreMovies, ScoreBooks, ScoreAnimes, nom_usuaris
+from recomanacions import (RecomanacioSimple, RecomanacioColaborativa, RecomanacioColaborativaItems,
+                           RecomanacioFactoritzacio, RecomanacioBasadaEnContingut)
+from recomender import Recomender, RecomenderMovies, RecomenderBooks, RecomenderAnimes, crea_recomender
+from temps import etapa
+import numpy as np
+import importlib
+import tempfile
+import hashlib
+import logging
+import shutil
+import json
+import os
+
+
+VERSIO_FORMAT = 2
+MANIFEST = 'manifest.json'
+PREFIX_GENERACIO = 'generacio_'
+
+# Mòduls el codi dels quals determina el contingut de cada part.
+CODI = {'score': ('score',), 'model': ('recomanacions', 'veins', 'factors')}
+
+CLASSES_SCORE = {c.__name__: c for c in (ScoreMovies, ScoreBooks, ScoreAnimes)}
+CLASSES_RECOMANACIO = {c.__name__: c for c in (RecomanacioSimple, RecomanacioColaborativa,
+                                               RecomanacioColaborativaItems, RecomanacioFactoritzacio,
+                                               RecomanacioBasadaEnContingut)}
+CLASSES_RECOMENDER = {c.__name__: c for c in (RecomenderMovies, RecomenderBooks, RecomenderAnimes)}
+
+
+def nom_instantania(dataset: str, method: str) -> str:
+    """
+    Retorna el directori de la instantània d'un dataset i un mètode.
+
+    Parameters
+    ----------
+    dataset : str
+        Nom del dataset.
+    method : str
+        Mètode de recomanació.
+
+    Returns
+    -------
+    str
+        Nom del directori.
+    """
+    return 'recomender_' + dataset + '_' + method.replace(' ', '_')
+
+
+def empremta(fitxer: str, anterior: dict = None) -> dict:
+    """
+    Retorna l'empremta d'un fitxer: mida, data de modificació i resum SHA-256 del contingut.
+
+    Si la mida i la data coincideixen amb les de l'empremta anterior, se'n
+    reaprofita el resum sense tornar a llegir el fitxer.
+
+    Parameters
+    ----------
+    fitxer : str
+        Nom del fitxer.
+    anterior : dict, optional
+        Empremta calculada abans.
+
+    Returns
+    -------
+    dict
+        Mida, mtime_ns i sha256; None si el fitxer no existeix.
+    """
+    try:
+        estat = os.stat(fitxer)
+    except OSError:
+        return None
+    if anterior is not None and anterior['mida'] == estat.st_size and anterior['mtime_ns'] == estat.st_mtime_ns:
+        return anterior
+    resum = hashlib.sha256()
+    with open(fitxer, 'rb') as f:
+        for bloc in iter(lambda: f.read(1 << 20), b''):
+            resum.update(bloc)
+    return {'mida': estat.st_size, 'mtime_ns': estat.st_mtime_ns, 'sha256': resum.hexdigest()}
+
+
+def versio_codi(part: str) -> str:
+    """
+    Retorna el resum SHA-256 del codi font dels mòduls que calculen una part.
+
+    Parameters
+    ----------
+    part : str
+        Nom de la part ('score' o 'model').
+
+    Returns
+    -------
+    str
+        Resum en hexadecimal.
+    """
+    resum = hashlib.sha256()
+    for nom in CODI[part]:
+        with open(importlib.import_module(nom).__file__, 'rb') as f:
+            resum.update(f.read())
+    return resum.hexdigest()
+
+
+def fitxers_fonts(meta_recomender: dict) -> dict:
+    """
+    Retorna els fitxers d'entrada d'un recomanador.
+
+    Parameters
+    ----------
+    meta_recomender : dict
+        Metadades retornades per Recomender.estat().
+
+    Returns
+    -------
+    dict
+        Fitxers d'ítems, de valoracions i d'usuaris.
+    """
+    return {'items': meta_recomender['fitxer_items'], 'valoracions': meta_recomender['fitxer_valoracions'],
+            'usuaris': nom_usuaris(meta_recomender['fitxer_valoracions'])}
+
+
+def _desa_arrays(directori: str, part: str, arrays: dict):
+    """
+    Desa cada array d'una part en un fitxer .npy.
+
+    Parameters
+    ----------
+    directori : str
+        Directori de la generació.
+    part : str
+        Nom de la part ('score' o 'model').
+    arrays : dict
+        Arrays a desar.
+    """
+    for nom, array in arrays.items():
+        with open(os.path.join(directori, f'{part}.{nom}.npy'), 'wb') as f:
+            np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+
+
+def _carrega_arrays(directori: str, part: str, noms: list) -> dict:
+    """
+    Carrega els arrays d'una part projectats a memòria, en només lectura.
+
+    Parameters
+    ----------
+    directori : str
+        Directori de la generació.
+    part : str
+        Nom de la part ('score' o 'model').
+    noms : list
+        Noms dels arrays.
+
+    Returns
+    -------
+    dict
+        Arrays carregats.
+    """
+    arrays = {}
+    for nom in noms:
+        fitxer = os.path.join(directori, f'{part}.{nom}.npy')
+        try:
+            arrays[nom] = np.load(fitxer, mmap_mode='r', allow_pickle=False)
+        except ValueError:
+            # Els arrays buits no es poden projectar a memòria.
+            arrays[nom] = np.load(fitxer, allow_pickle=False)
+    return arrays
+
+
+def llegeix_manifest(directori: str) -> dict:
+    """
+    Llegeix el manifest d'una instantània.
+
+    Parameters
+    ----------
+    directori : str
+        Directori de la instantània.
+
+    Returns
+    -------
+    dict
+        Manifest; None si no n'hi ha o si és d'un format anterior.
+    """
+    fitxer = os.path.join(directori, MANIFEST)
+    if not os.path.exists(fitxer):
+        return None
+    with open(fitxer, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != VERSIO_FORMAT:
+        logging.debug(f"Instantània de {directori} amb format {manifest.get('format')}; cal tornar-la a crear")
+        return None
+    return manifest
+
+
+def _escriu_manifest(directori: str, manifest: dict):
+    """
+    Substitueix el manifest d'una instantània amb un reanomenament atòmic.
+    """
+    temporal = os.path.join(directori, MANIFEST + '.tmp')
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(temporal, os.path.join(directori, MANIFEST))
+
+
+def _neteja(directori: str, manifest: dict):
+    """
+    Esborra les generacions i els fitxers que el manifest ja no fa servir.
+    """
+    vigents = {entrada['directori'] for entrada in manifest['parts'].values()}
+    for nom in os.listdir(directori):
+        cami = os.path.join(directori, nom)
+        if nom.startswith(PREFIX_GENERACIO) and nom not in vigents:
+            shutil.rmtree(cami, ignore_errors=True)
+        elif nom.endswith('.npy'):
+            # Arrays del format 1, desats directament al directori.
+            os.remove(cami)
+
+
+def desa(recomender: Recomender, directori: str, parts=('score', 'model')):
+    """
+    Desa un recomanador com a arrays .npy i un manifest JSON.
+
+    Les parts indicades s'escriuen en un subdirectori (generació) nou i
+    després es substitueix el manifest amb un reanomenament atòmic; les
+    parts no indicades continuen apuntant a la generació anterior. Si el
+    procés s'atura a mitja desada, la instantània anterior queda intacta, i
+    els arrays que altres processos tinguin projectats a memòria no es
+    sobreescriuen mai. Cada part guarda l'empremta dels fitxers d'entrada
+    dels quals depèn i la versió del codi que l'ha calculada.
+
+    Parameters
+    ----------
+    recomender : Recomender
+        Recomanador a desar.
+    directori : str
+        Directori de la instantània.
+    parts : tuple
+        Parts que s'han de desar ('score', 'model'); la resta s'agafen de la instantània anterior.
+    """
+    os.makedirs(directori, exist_ok=True)
+    anterior = llegeix_manifest(directori)
+    if anterior is None:
+        parts = ('score', 'model')
+    logging.info(f"Desant instantània a {directori} ({', '.join(parts)})")
+    meta_recomender = recomender.estat()
+    fitxers = fitxers_fonts(meta_recomender)
+    recomanacio = recomender.recomanacio
+    generacio = tempfile.mkdtemp(prefix=PREFIX_GENERACIO, dir=directori)
+    try:
+        manifest = {'format': VERSIO_FORMAT, 'recomender': meta_recomender, 'parts': {}}
+        for part, objecte in (('score', recomanacio.score), ('model', recomanacio)):
+            if part not in parts:
+                manifest['parts'][part] = anterior['parts'][part]
+                continue
+            meta, arrays = objecte.estat()
+            _desa_arrays(generacio, part, arrays)
+            fonts_anteriors = anterior['parts'][part]['fonts'] if anterior is not None else {}
+            fonts = {nom: empremta(fitxers[nom], fonts_anteriors.get(nom)) for nom in type(objecte).FONTS}
+            manifest['parts'][part] = {'meta': meta, 'arrays': sorted(arrays), 'directori': os.path.basename(generacio),
+                                       'codi': versio_codi(part), 'fonts': fonts}
+        _escriu_manifest(directori, manifest)
+    except BaseException:
+        shutil.rmtree(generacio, ignore_errors=True)
+        raise
+    _neteja(directori, manifest)
+
+
+def parts_caducades(manifest: dict) -> tuple:
+    """
+    Comprova quines parts d'una instantània ja no corresponen als fitxers d'entrada o al codi.
+
+    Una part caduca si ha canviat el codi que la calcula o el contingut
+    d'algun fitxer del qual depèn; el model caduca també si caduquen les
+    puntuacions. Els fitxers que han canviat de data però no de contingut
+    no fan caducar res: se n'actualitza l'empremta al manifest.
+
+    Parameters
+    ----------
+    manifest : dict
+        Manifest de la instantània (es modifica si cal actualitzar-ne empremtes).
+
+    Returns
+    -------
+    tuple
+        Llista de parts caducades i si s'ha actualitzat alguna empremta.
+    """
+    fitxers = fitxers_fonts(manifest['recomender'])
+    caducades = []
+    actualitzat = False
+    for part in ('score', 'model'):
+        entrada = manifest['parts'][part]
+        motius = ['score'] if part == 'model' and 'score' in caducades else []
+        if entrada['codi'] != versio_codi(part):
+            motius.append('codi')
+        for nom, anterior in entrada['fonts'].items():
+            actual = empremta(fitxers[nom], anterior)
+            if actual is None:
+                logging.warning(f"No es troba {fitxers[nom]}: es fa servir la instantània sense comprovar-lo")
+            elif anterior is None or actual['sha256'] != anterior['sha256']:
+                motius.append(nom)
+            elif actual is not anterior:
+                entrada['fonts'][nom] = actual
+                actualitzat = True
+        if motius:
+            logging.info(f"La part {part} de la instantània ha caducat (canvis: {', '.join(motius)})")
+            caducades.append(part)
+    return caducades, actualitzat
+
+
+def _carrega_score(directori: str, manifest: dict):
+    """
+    Carrega la part de puntuacions d'una instantània.
+    """
+    entrada = manifest['parts']['score']
+    return CLASSES_SCORE[entrada['meta']['classe']].des_de_estat(
+        entrada['meta'], _carrega_arrays(os.path.join(directori, entrada['directori']), 'score', entrada['arrays']))
+
+
+def carrega(directori: str) -> Recomender:
+    """
+    Carrega un recomanador desat amb desa().
+
+    Els arrays es projecten a memòria, de manera que només es llegeixen
+    les pàgines que es fan servir.
+
+    Parameters
+    ----------
+    directori : str
+        Directori de la instantània.
+
+    Returns
+    -------
+    Recomender
+        Recomanador carregat.
+    """
+    logging.info(f"Carregant instantània de {directori}")
+    with etapa('instantania'):
+        manifest = llegeix_manifest(directori)
+        if manifest is None:
+            raise ValueError(f"No hi ha cap instantània vàlida a {directori}")
+        score = _carrega_score(directori, manifest)
+        entrada = manifest['parts']['model']
+        recomanacio = CLASSES_RECOMANACIO[entrada['meta']['classe']].des_de_estat(
+            score, entrada['meta'], _carrega_arrays(os.path.join(directori, entrada['directori']), 'model',
+                                                    entrada['arrays']))
+        meta_recomender = manifest['recomender']
+        return CLASSES_RECOMENDER[meta_recomender['classe']].des_de_estat(recomanacio, meta_recomender)
+
+
+def _parametres_model(method: str, manifest: dict, k: int, taules: int, bits: int, processos: int) -> dict:
+    """
+    Retorna els paràmetres amb què s'ha de tornar a ajustar el model d'una instantània.
+
+    Es mantenen els de la instantània llevat dels que s'indiquen explícitament.
+    """
+    meta_model = manifest['parts']['model']['meta']
+    if method == 'colaboratiu':
+        lsh = meta_model.get('index', {}).get('lsh')
+        if taules is None and lsh:
+            taules, bits = lsh['taules'], lsh['bits']
+        return {'k': k, 'taules': taules or 0, 'bits': bits, 'processos': processos}
+    elif method == 'colaboratiu items':
+        return {'k': meta_model.get('k', 50)}
+    elif method == 'factoritzacio':
+        return {nom: meta_model[nom] for nom in ('factors', 'regularitzacio', 'iteracions') if nom in meta_model}
+    elif method == 'basat en contingut':
+        return {'fitxer_items': manifest['recomender']['fitxer_items']}
+    return {}
+
+
+def reconstrueix_model(directori: str, manifest: dict, method: str, k: int = 5, taules: int = None, bits: int = 8,
+                       processos: int = 1) -> Recomender:
+    """
+    Carrega les puntuacions d'una instantània i torna a ajustar-ne el model.
+
+    Parameters
+    ----------
+    directori : str
+        Directori de la instantània.
+    manifest : dict
+        Manifest de la instantània.
+    method : str
+        Mètode de recomanació.
+    k, taules, bits, processos
+        Paràmetres del mètode col·laboratiu (vegeu carrega_o_crea).
+
+    Returns
+    -------
+    Recomender
+        Recomanador amb el model nou.
+    """
+    logging.info(f"Reconstruint el model de la instantània {directori}")
+    with etapa('instantania'):
+        score = _carrega_score(directori, manifest)
+    classe = CLASSES_RECOMANACIO[manifest['parts']['model']['meta']['classe']]
+    recomanacio = classe.des_de_score(score, **_parametres_model(method, manifest, k, taules, bits, processos))
+    meta_recomender = manifest['recomender']
+    return CLASSES_RECOMENDER[meta_recomender['classe']].des_de_estat(recomanacio, meta_recomender)
+
+
+def carrega_o_crea(dataset: str, method: str, k: int = 5, taules: int = None, bits: int = 8,
+                   processos: int = 1) -> Recomender:
+    """
+    Carrega la instantània d'un dataset i un mètode, o crea el recomanador i la desa.
+
+    Abans de carregar-la es comprova que la instantània correspongui als
+    fitxers d'entrada i al codi actuals: si han canviat les puntuacions es
+    torna a crear tot, i si només ha caducat el model es torna a ajustar
+    sobre les puntuacions desades.
+
+    Parameters
+    ----------
+    dataset : str
+        Nom del dataset.
+    method : str
+        Mètode de recomanació.
+    k : int
+        Nombre de veïns del mètode col·laboratiu.
+    taules : int, optional
+        Taules de l'índex aproximat de veïns (0 per a la cerca exacta); si no
+        s'indica, es manté la de la instantània (o la cerca exacta si és nova).
+    bits : int
+        Bits per taula de l'índex aproximat.
+    processos : int
+        Processos amb què es construeix l'índex de veïns.
+
+    Returns
+    -------
+    Recomender
+        Recomanador a punt per fer servir.
+    """
+    directori = nom_instantania(dataset, method)
+    manifest = llegeix_manifest(directori)
+    caducades, actualitzat = parts_caducades(manifest) if manifest is not None else (['score', 'model'], False)
+    if 'score' in caducades:
+        logging.debug(f"Instantània inexistent o caducada -> Creant recomender per a {dataset} amb el mètode {method}")
+        parametres = {'taules': taules or 0, 'bits': bits, 'processos': processos} if method == 'colaboratiu' else {}
+        r = crea_recomender(dataset, method, k, **parametres)
+        desa(r, directori)
+        return r
+
+    if 'model' in caducades:
+        r = reconstrueix_model(directori, manifest, method, k, taules, bits, processos)
+        desa(r, directori, parts=('model',))
+    else:
+        logging.debug(f"Instantània vigent -> Carregant recomender des de {directori}")
+        if actualitzat:
+            _escriu_manifest(directori, manifest)
+        r = carrega(directori)
+    if method == 'colaboratiu':
+        r.recomanacio.processos = processos
+    # Les valoracions noves canvien les puntuacions; k i l'LSH només el model.
+    score_canviat = r.recomanacio.aplica_pendents() > 0
+    model_canviat = False
+    if method == 'colaboratiu' and r.recomanacio.k != k:
+        logging.info(f"Reconstruint l'índex de veïns amb k={k}")
+        r.recomanacio.k = k
+        model_canviat = True
+    lsh = (0, 0) if taules == 0 else (taules, bits)
+    if method == 'colaboratiu' and taules is not None and r.recomanacio.lsh != lsh:
+        logging.info(f"Reconstruint l'índex de veïns amb LSH={lsh}")
+        r.recomanacio.configura_lsh(taules, bits)
+        model_canviat = True
+    if score_canviat:
+        desa(r, directori)
+    elif model_canviat:
+        desa(r, directori, parts=('model',))
+    return r
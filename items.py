@@ -5,6 +5,7 @@ import numpy as np
 import csv
 from abc import ABCMeta, abstractmethod
 import logging
+from cataleg import Cataleg
 
 
 class Item(metaclass=ABCMeta):
@@ -22,10 +23,10 @@ class Item(metaclass=ABCMeta):
 
     Methods
     -------
-    __init__(ID=0, nomFitxerTitols="")
+    __init__(ID=0, nomFitxerTitols="", cataleg=None)
         Inicialitza un nou objecte Item.
-    _carrega_dades(nomFitxerTitols)
-        Carrega les dades de l'ítem des del fitxer.
+    _carrega_dades(nomFitxerTitols, cataleg=None)
+        Carrega les dades de l'ítem des del catàleg o del fitxer.
     __str__()
         Retorna una representació en cadena de l'ítem.
     """
@@ -34,7 +35,7 @@ class Item(metaclass=ABCMeta):
     _ID: str
     _extra: str
 
-    def __init__(self, ID='', nomFitxerTitols=""):
+    def __init__(self, ID='', nomFitxerTitols="", cataleg: Cataleg = None):
         """
         Inicialitza un nou objecte Item.
 
@@ -44,21 +45,30 @@ class Item(metaclass=ABCMeta):
             Identificador de l'ítem.
         nomFitxerTitols : str
             Nom del fitxer de títols.
+        cataleg : Cataleg, optional
+            Catàleg ja carregat; si no se'n passa cap es llegeix el fitxer.
         """
         self._titol = ""
         self._ID = ID
         self._extra = ''
-        self._carrega_dades(nomFitxerTitols)
+        self._carrega_dades(nomFitxerTitols, cataleg)
 
-    def _carrega_dades(self, nomFitxerTitols):
+    def _carrega_dades(self, nomFitxerTitols, cataleg: Cataleg = None):
         """
-        Carrega les dades de l'ítem des del fitxer.
+        Carrega les dades de l'ítem des del catàleg o, si no n'hi ha, des del fitxer.
 
         Parameters
         ----------
         nomFitxerTitols : str
             Nom del fitxer de títols.
+        cataleg : Cataleg, optional
+            Catàleg ja carregat.
         """
+        if cataleg is not None:
+            dades = cataleg.busca(self._ID)
+            if dades is not None:
+                self._titol, self._extra, _ = dades
+            return
         with open(nomFitxerTitols, 'r', encoding='utf-8') as f:
             next(f)
             reader = csv.reader(f)
@@ -95,17 +105,17 @@ class Book(Item):
 
     Methods
     -------
-    __init__(ID=0, nomFitxerTitols="")
+    __init__(ID=0, nomFitxerTitols="", cataleg=None)
         Inicialitza un nou objecte Book.
-    _carrega_dades(nomFitzerTitols)
-        Carrega les dades de l'ítem des del fitxer.
+    _carrega_dades(nomFitzerTitols, cataleg=None)
+        Carrega les dades de l'ítem des del catàleg o del fitxer.
     __str__()
         Retorna una representació en cadena del llibre.
     """
 
     _autor: str
 
-    def __init__(self, ID=0, nomFitxerTitols=""):
+    def __init__(self, ID=0, nomFitxerTitols="", cataleg: Cataleg = None):
         """
         Inicialitza un nou objecte Book.
 
@@ -115,20 +125,30 @@ class Book(Item):
             Identificador del llibre.
         nomFitxerTitols : str
             Nom del fitxer de títols.
+        cataleg : Cataleg, optional
+            Catàleg ja carregat.
         """
         logging.debug(f"Inicialitzant Llibre amb id: {ID}")
-        super().__init__(ID, nomFitxerTitols)
+        self._autor = ''
+        super().__init__(ID, nomFitxerTitols, cataleg)
 
-    def _carrega_dades(self, nomFitxerTitols):
+    def _carrega_dades(self, nomFitxerTitols, cataleg: Cataleg = None):
         """
-        Carrega les dades del llibre des del fitxer.
+        Carrega les dades del llibre des del catàleg o del fitxer.
 
         Parameters
         ----------
         nomFitxerTitols : str
             Nom del fitxer de títols.
+        cataleg : Cataleg, optional
+            Catàleg ja carregat.
         """
-        super()._carrega_dades(nomFitxerTitols)
+        super()._carrega_dades(nomFitxerTitols, cataleg)
+        if cataleg is not None:
+            dades = cataleg.busca(self._ID)
+            if dades is not None:
+                self._autor = dades[2]
+            return
         with open(nomFitxerTitols, 'r') as f:
             reader = csv.reader(f)
             for line in reader:
@@ -163,7 +183,7 @@ class Movie(Item):
 
     Methods
     -------
-    __init__(ID=0, nomFitxerTitols="")
+    __init__(ID=0, nomFitxerTitols="", cataleg=None)
         Inicialitza un nou objecte Movie.
     __str__()
         Retorna una representació en cadena de la pel·lícula.
@@ -171,7 +191,7 @@ class Movie(Item):
 
     _generes: list = []
 
-    def __init__(self, ID = 0, nomFitxerTitols = ""):
+    def __init__(self, ID = 0, nomFitxerTitols = "", cataleg: Cataleg = None):
         """
         Inicialitza un nou objecte Movie.
 
@@ -181,9 +201,11 @@ class Movie(Item):
             Identificador de la pel·lícula.
         nomFitxerTitols : str
             Nom del fitxer de títols.
+        cataleg : Cataleg, optional
+            Catàleg ja carregat.
         """
         logging.debug(f"Inicialitzant Peli amb id: {ID}")
-        super().__init__(ID, nomFitxerTitols)
+        super().__init__(ID, nomFitxerTitols, cataleg)
         self._generes = self._extra.split('|')
 
     def __str__(self):
@@ -214,7 +236,7 @@ class Anime(Item):
 
     Methods
     -------
-    __init__(ID=0, nomFitxerTitols="")
+    __init__(ID=0, nomFitxerTitols="", cataleg=None)
         Inicialitza un nou objecte Anime.
     __str__()
         Retorna una representació en cadena de l'anime.
@@ -222,7 +244,7 @@ class Anime(Item):
 
     _generes: list = []
 
-    def __init__(self, ID = 0, nomFitxerTitols = ""):
+    def __init__(self, ID = 0, nomFitxerTitols = "", cataleg: Cataleg = None):
         """
         Inicialitza un nou objecte Anime.
 
@@ -232,9 +254,11 @@ class Anime(Item):
             Identificador de l'anime.
         nomFitxerTitols : str
             Nom del fitxer de títols.
+        cataleg : Cataleg, optional
+            Catàleg ja carregat.
         """
         logging.debug(f"Inicialitzant Anime amb id: {ID}")
-        super().__init__(ID, nomFitxerTitols)
+        super().__init__(ID, nomFitxerTitols, cataleg)
         self._generes = self._extra.split(",")
 
     def __str__(self):
@@ -1,13 +1,32 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from recomender import RecomenderMovies, RecomenderBooks, RecomenderAnimes
 import argparse
-import os 
-import pickle
+import cProfile
+import json
+import sys
 import logging
 from datetime import datetime
 
+parser = argparse.ArgumentParser()
+parser.add_argument('dataset')
+parser.add_argument('method')
+parser.add_argument('--k', type=int, default=5, help="Nombre de veïns del mètode col·laboratiu")
+parser.add_argument('--taules', type=int, default=None, help="Taules de l'índex aproximat (LSH) de veïns del mètode col·laboratiu; 0 per a la cerca exacta")
+parser.add_argument('--bits', type=int, default=8, help="Bits per taula de l'índex aproximat de veïns")
+parser.add_argument('--avalua', action='store_true', help="Avalua el mètode sobre tots els usuaris i surt")
+parser.add_argument('--mostra', type=int, default=None, help="Nombre d'usuaris a l'atzar per a l'avaluació")
+parser.add_argument('--processos', type=int, default=1, help="Processos per a l'avaluació i per construir l'índex de veïns")
+parser.add_argument('--min-vots', type=int, default=10, help="Mínim de vots del mètode simple fora del mode interactiu")
+parser.add_argument('--servidor', action='store_true', help="Serveix recomanacions per HTTP/JSON en lloc del mode interactiu")
+parser.add_argument('--host', default='127.0.0.1', help="Adreça del servidor")
+parser.add_argument('--port', type=int, default=8000, help="Port del servidor")
+parser.add_argument('--lot', metavar='FITXER', default=None, help="Recomana als usuaris del fitxer (un per línia, '-' per l'entrada estàndard) i escriu JSONL")
+parser.add_argument('--n', type=int, default=5, help="Nombre d'ítems a recomanar per usuari en el mode per lots")
+parser.add_argument('--mida-bloc', type=int, default=256, help="Usuaris que es processen alhora en el mode per lots")
+parser.add_argument('--profile', metavar='FITXER', default=None, help="Perfila l'execució amb cProfile i en desa les estadístiques al fitxer (per llegir amb pstats)")
+args = vars(parser.parse_args())
+
 doc = datetime.now().strftime("log_%H-%M-%d-%m.txt")
 logging.basicConfig(filename= doc, level=logging.DEBUG, format='%(asctime)s | %(name)s | %(levelname)s | %(message)s')
 console = logging.StreamHandler()
@@ -16,20 +35,16 @@ formatter = logging.Formatter('%(asctime)s | %(name)s | %(levelname)s | %(messag
 console.setFormatter(formatter)
 logging.getLogger().addHandler(console)
 
-parser = argparse.ArgumentParser()
-parser.add_argument('dataset')
-parser.add_argument('method')
-args = vars(parser.parse_args())
-
 dataset = str(args['dataset']).lower()
 method = str(args['method']).lower()
+k = args['k']
 
 datasets = ['movielens100k', 'books', 'animes']
-methods = ['simple', 'colaboratiu', 'basat en contingut']
+methods = ['simple', 'colaboratiu', 'colaboratiu items', 'factoritzacio', 'basat en contingut']
 
 while (dataset not in datasets) or (method not in methods):
     print("ERROR: Dataset ha de ser: 'MovieLens100K', 'Books' o 'Animes'.")
-    print("ERROR: Method ha de ser: 'simple', 'colaboratiu' o 'basat en contingut'")
+    print("ERROR: Method ha de ser: 'simple', 'colaboratiu', 'colaboratiu items', 'factoritzacio' o 'basat en contingut'")
     if method not in methods:
         method = input('Method: ')
         method = method.lower()
@@ -40,27 +55,49 @@ while (dataset not in datasets) or (method not in methods):
 logging.debug(f"Dataset: {dataset}")
 logging.debug(f"Method: {method}")
 
-arxiu_pickles = 'recomender_'+dataset+'_'+method+'.dat'
+# Els mòduls de càlcul (numpy, scipy...) s'importen un cop validats els arguments,
+# perquè --help o uns arguments incorrectes responguin de seguida.
+from instantania import carrega_o_crea
+from temps import mesura
+
+perfilador = None
+if args['profile'] is not None:
+    perfilador = cProfile.Profile()
+    perfilador.enable()
+
+try:
+    with mesura() as cronometre:
+        r = carrega_o_crea(dataset, method, k, args['taules'], args['bits'], args['processos'])
+    logging.info(f"Temps de càrrega del recomender: {json.dumps(cronometre.registre())}")
 
-if os.path.exists(arxiu_pickles):
-    logging.debug(f"Pickles existeixen -> Carregant recomender des de {arxiu_pickles}")
-    with open(arxiu_pickles, 'rb') as f: 
-        r = pickle.load(f)
-else:
-    logging.debug(f"Pickles no existeixen -> Creant recomender per a {dataset} amb el mètode {method}")
-    if dataset == 'books':
-        r = RecomenderBooks(dataset, method)
-    elif dataset == 'movielens100k':
-        r = RecomenderMovies(dataset, method)
+    if args['avalua']:
+        from avaluacio import avalua
+        parametres = {'min_vots': args['min_vots']} if method == 'simple' else {}
+        resultat = avalua(r.recomanacio, mostra=args['mostra'], processos=args['processos'], **parametres)
+        print(f"{method}: {resultat['usuaris']} usuaris, {resultat['usuaris_per_segon']:.1f} usuaris/s, "
+              f"MAE: {resultat['mae']:.4f}, RMSE: {resultat['rmse']:.4f}")
+    elif args['lot'] is not None:
+        parametres = {'min_vots': args['min_vots']} if method == 'simple' else {}
+        if args['lot'] == '-':
+            r.programa_lot(sys.stdin, sys.stdout, args['n'], args['mida_bloc'], **parametres)
+        else:
+            with open(args['lot'], encoding='utf-8') as entrada:
+                r.programa_lot(entrada, sys.stdout, args['n'], args['mida_bloc'], **parametres)
+    elif args['servidor']:
+        from servidor import Servidor
+        Servidor(dataset, method, k, r, args['processos']).serveix(args['host'], args['port'])
     else:
-        r = RecomenderAnimes(dataset, method)
-    with open(arxiu_pickles, 'wb') as f:
-        logging.info("Guardant Pickles")
-        pickle.dump(r, f)
+        logging.info("Executant programa principal del recomender")
+        r.programa_principal()
+finally:
+    # Es desa també si l'execució acaba amb una excepció o amb Ctrl+C (p. ex. el servidor).
+    if perfilador is not None:
+        perfilador.disable()
+        perfilador.dump_stats(args['profile'])
+        logging.info(f"Perfil desat a {args['profile']}")
 
-logging.info("Executant programa principal del recomender")
-r.programa_principal()
-print("\nAutores: Alicia Martí i Aya Talbi")
-print("Crèdits dels datasets: \nMovies: MovieLens Dataset (https://grouplens.org/datasets/movielens/latest/)")
-print("Books: Book Recommendation Dataset: (https://www.kaggle.com/datasets/arashnic/book-recommendation-dataset/data)")
-print("Animes: Anime Recommendations Database: (https://www.kaggle.com/datasets/CooperUnion/anime-recommendations-database/data)")
\ No newline at end of file
+if args['lot'] is None:
+    print("\nAutores: Alicia Martí i Aya Talbi")
+    print("Crèdits dels datasets: \nMovies: MovieLens Dataset (https://grouplens.org/datasets/movielens/latest/)")
+    print("Books: Book Recommendation Dataset: (https://www.kaggle.com/datasets/arashnic/book-recommendation-dataset/data)")
+    print("Animes: Anime Recommendations Database: (https://www.kaggle.com/datasets/CooperUnion/anime-recommendations-database/data)")
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from multiprocessing import shared_memory
+from score import Score, ScoreMovies, ScoreBooks, ScoreAnimes
+import numpy as np
+import logging
+
+
+CLASSES_SCORE = {c.__name__: c for c in (ScoreMovies, ScoreBooks, ScoreAnimes)}
+
+
+def _connecta_bloc(nom: str):
+    """
+    S'enganxa a un bloc de memòria compartida existent sense fer-se'n propietari.
+
+    Parameters
+    ----------
+    nom : str
+        Nom del bloc.
+
+    Returns
+    -------
+    shared_memory.SharedMemory
+        Bloc de memòria compartida.
+    """
+    try:
+        return shared_memory.SharedMemory(name=nom, track=False)
+    except TypeError:
+        # Abans de Python 3.13 el bloc queda registrat al resource_tracker.
+        # Els treballadors creats amb multiprocessing comparteixen el del
+        # procés que publica, de manera que el registre no té efecte.
+        return shared_memory.SharedMemory(name=nom)
+
+
+class PublicacioCompartida():
+    """
+    Publica la matriu, les taules d'identificadors i el model d'un recomanador en memòria compartida.
+
+    El procés que carrega el recomanador en crea una publicació; els
+    processos treballadors reben el descriptor (un diccionari petit que es
+    pot serialitzar) i s'hi connecten amb connecta(), amb
+    connecta_recomanacio() si s'ha publicat un objecte de recomanació, o amb
+    connecta_score() si només s'han publicat les puntuacions, sense copiar
+    cap array.
+
+    Attributes
+    ----------
+    _blocs : list
+        Blocs de memòria compartida creats.
+    _descriptor : dict
+        Metadades i, per a cada array, nom del bloc, tipus i forma.
+
+    Methods
+    -------
+    descriptor
+        Retorna el descriptor que cal passar als treballadors.
+    tanca()
+        Allibera i esborra els blocs de memòria compartida.
+    """
+    _blocs: list
+    _descriptor: dict
+
+    def __init__(self, objecte):
+        """
+        Copia l'estat d'un recomanador, d'una recomanació o només d'unes puntuacions a blocs de memòria compartida.
+
+        Parameters
+        ----------
+        objecte : Recomender, Recomanacio o Score
+            Recomanador ja carregat, objecte de recomanació o puntuacions soles.
+        """
+        # Importació local: recomender depèn de recomanacions, que fa servir aquest mòdul.
+        from recomender import Recomender
+        self._blocs = []
+        if isinstance(objecte, Score):
+            self._descriptor = {'recomender': None, 'parts': {}}
+            parts = (('score', objecte.estat()),)
+        else:
+            recomanacio = objecte.recomanacio if isinstance(objecte, Recomender) else objecte
+            self._descriptor = {'recomender': objecte.estat() if isinstance(objecte, Recomender) else None, 'parts': {}}
+            parts = (('score', recomanacio.score.estat()), ('model', recomanacio.estat()))
+        for part, (meta, arrays) in parts:
+            descripcio_arrays = {}
+            for nom, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                bloc = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                np.ndarray(array.shape, dtype=array.dtype, buffer=bloc.buf)[...] = array
+                self._blocs.append(bloc)
+                descripcio_arrays[nom] = {'bloc': bloc.name, 'dtype': array.dtype.str, 'forma': list(array.shape)}
+            self._descriptor['parts'][part] = {'meta': meta, 'arrays': descripcio_arrays}
+        mida = sum(bloc.size for bloc in self._blocs)
+        logging.info(f"Publicats {len(self._blocs)} blocs de memòria compartida ({mida} bytes)")
+
+    @property
+    def descriptor(self) -> dict:
+        return self._descriptor
+
+    def tanca(self):
+        """
+        Allibera i esborra els blocs de memòria compartida.
+        """
+        for bloc in self._blocs:
+            bloc.close()
+            bloc.unlink()
+        self._blocs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcio):
+        self.tanca()
+
+
+def _arrays_compartits(descripcio_arrays: dict, blocs: list) -> dict:
+    """
+    Crea vistes de només lectura sobre els blocs de memòria compartida d'una part.
+
+    Parameters
+    ----------
+    descripcio_arrays : dict
+        Nom del bloc, tipus i forma de cada array.
+    blocs : list
+        Llista on es guarden els blocs oberts, perquè no es tanquin.
+
+    Returns
+    -------
+    dict
+        Arrays de la part.
+    """
+    arrays = {}
+    for nom, descripcio in descripcio_arrays.items():
+        bloc = _connecta_bloc(descripcio['bloc'])
+        blocs.append(bloc)
+        array = np.ndarray(tuple(descripcio['forma']), dtype=np.dtype(descripcio['dtype']), buffer=bloc.buf)
+        array.flags.writeable = False
+        arrays[nom] = array
+    return arrays
+
+
+def connecta_score(descriptor: dict, blocs: list = None) -> Score:
+    """
+    Reconstrueix les puntuacions d'una publicació en memòria compartida, sense copiar-ne els arrays.
+
+    Parameters
+    ----------
+    descriptor : dict
+        Descriptor de PublicacioCompartida.
+    blocs : list, optional
+        Llista on es guarden els blocs oberts; si no s'indica, es guarden a les puntuacions.
+
+    Returns
+    -------
+    Score
+        Puntuacions que llegeixen directament de la memòria compartida.
+    """
+    propis = blocs is None
+    blocs = [] if propis else blocs
+    meta = descriptor['parts']['score']['meta']
+    score = CLASSES_SCORE[meta['classe']].des_de_estat(meta, _arrays_compartits(descriptor['parts']['score']['arrays'], blocs))
+    if propis:
+        # Els blocs s'han de mantenir oberts mentre visquin les puntuacions.
+        score._blocs_compartits = blocs
+    return score
+
+
+def connecta_recomanacio(descriptor: dict, blocs: list = None):
+    """
+    Reconstrueix l'objecte de recomanació d'una publicació en memòria compartida, sense copiar-ne els arrays.
+
+    Parameters
+    ----------
+    descriptor : dict
+        Descriptor de PublicacioCompartida d'un recomanador o d'una recomanació.
+    blocs : list, optional
+        Llista on es guarden els blocs oberts; si no s'indica, es guarden a la recomanació.
+
+    Returns
+    -------
+    Recomanacio
+        Objecte de recomanació que llegeix directament de la memòria compartida.
+    """
+    # Importació local: instantania depèn de recomanacions, que fa servir aquest mòdul.
+    from instantania import CLASSES_RECOMANACIO
+    propis = blocs is None
+    blocs = [] if propis else blocs
+    score = connecta_score(descriptor, blocs)
+    meta_model = descriptor['parts']['model']['meta']
+    recomanacio = CLASSES_RECOMANACIO[meta_model['classe']].des_de_estat(
+        score, meta_model, _arrays_compartits(descriptor['parts']['model']['arrays'], blocs))
+    if propis:
+        # Els blocs s'han de mantenir oberts mentre visqui la recomanació.
+        recomanacio._blocs_compartits = blocs
+    return recomanacio
+
+
+def connecta(descriptor: dict):
+    """
+    Reconstrueix un recomanador a partir d'una publicació en memòria compartida, sense copiar-ne els arrays.
+
+    Parameters
+    ----------
+    descriptor : dict
+        Descriptor de PublicacioCompartida.
+
+    Returns
+    -------
+    Recomender
+        Recomanador que llegeix directament de la memòria compartida.
+    """
+    from instantania import CLASSES_RECOMENDER
+    blocs = []
+    recomanacio = connecta_recomanacio(descriptor, blocs)
+    meta_recomender = descriptor['recomender']
+    recomender = CLASSES_RECOMENDER[meta_recomender['classe']].des_de_estat(recomanacio, meta_recomender)
+    # Els blocs s'han de mantenir oberts mentre visqui el recomanador.
+    recomender._blocs_compartits = blocs
+    return recomender
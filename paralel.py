@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+from memoria_compartida import PublicacioCompartida, connecta_score
+from score import Score
+import numpy as np
+import logging
+
+
+_score_worker = None
+
+
+def _inicialitza_worker(descriptor: dict):
+    """
+    Connecta cada procés del pool a les puntuacions publicades en memòria compartida.
+
+    Parameters
+    ----------
+    descriptor : dict
+        Descriptor de PublicacioCompartida.
+    """
+    global _score_worker
+    _score_worker = connecta_score(descriptor)
+
+
+def top_k_tram(score: Score, files, inici: int, fi: int, k: int):
+    """
+    Calcula els k usuaris més similars a cada fila d'entre els del tram [inici, fi).
+
+    Parameters
+    ----------
+    score : Score
+        Puntuacions.
+    files : np.ndarray
+        Índexs de les files de consulta.
+    inici : int
+        Primera fila del tram.
+    fi : int
+        Fila següent a l'última del tram.
+    k : int
+        Nombre de veïns.
+
+    Returns
+    -------
+    tuple
+        Matrius (len(files) x min(k, fi - inici)) d'índexs globals de veïns i de similituds.
+    """
+    similituds = score.similituds_files(files, slice(inici, fi))
+    propis = (files >= inici) & (files < fi)
+    similituds[np.flatnonzero(propis), files[propis] - inici] = -np.inf
+    k = min(k, fi - inici)
+    candidats = np.argpartition(-similituds, k - 1, axis=1)[:, :k]
+    return candidats + inici, np.take_along_axis(similituds, candidats, axis=1)
+
+
+def _top_k_tram_worker(files, inici: int, fi: int, k: int):
+    """
+    Calcula el top-k d'un tram al procés actual.
+    """
+    return top_k_tram(_score_worker, files, inici, fi, k)
+
+
+def combina_top_k(veins, pesos, k: int):
+    """
+    Combina els top-k parcials de diversos trams en el top-k global.
+
+    Els empats es resolen a favor de l'índex més petit, com a IndexVeins.
+
+    Parameters
+    ----------
+    veins : np.ndarray
+        Matriu (files x candidats) d'índexs de veïns de tots els trams.
+    pesos : np.ndarray
+        Matriu (files x candidats) de similituds.
+    k : int
+        Nombre de veïns.
+
+    Returns
+    -------
+    tuple
+        Matrius (files x k) d'índexs de veïns (-1 si no n'hi ha) i de similituds.
+    """
+    ordre = np.lexsort((veins, -pesos), axis=1)[:, :k]
+    veins, pesos = np.take_along_axis(veins, ordre, axis=1), np.take_along_axis(pesos, ordre, axis=1)
+    buits = np.isneginf(pesos)
+    veins[buits], pesos[buits] = -1, 0
+    if veins.shape[1] < k:
+        falten = k - veins.shape[1]
+        veins = np.hstack([veins, np.full((len(veins), falten), -1, dtype=veins.dtype)])
+        pesos = np.hstack([pesos, np.zeros((len(pesos), falten))])
+    return veins, pesos
+
+
+class CalculParalel():
+    """
+    Pool de processos que calcula similituds i top-k d'usuaris repartint els usuaris en trams.
+
+    Les puntuacions es publiquen un sol cop en memòria compartida i cada
+    procés s'hi connecta sense copiar-les. Cada consulta es divideix en tants
+    trams d'usuaris com processos; cada procés retorna el top-k del seu tram
+    i el procés principal els combina.
+
+    Attributes
+    ----------
+    _processos : int
+        Nombre de processos del pool.
+    _publicacio : PublicacioCompartida
+        Puntuacions publicades en memòria compartida.
+    _pool : ProcessPoolExecutor
+        Pool de processos.
+    _trams : list
+        Límits (inici, fi) del tram d'usuaris de cada procés.
+
+    Methods
+    -------
+    top_k(files, k)
+        Retorna els k veïns de cada fila de consulta.
+    tanca()
+        Atura el pool i allibera la memòria compartida.
+    """
+    _processos = int
+    _publicacio = PublicacioCompartida
+    _pool = ProcessPoolExecutor
+    _trams = list
+
+    def __init__(self, score: Score, processos: int):
+        """
+        Publica les puntuacions i engega el pool.
+
+        Parameters
+        ----------
+        score : Score
+            Puntuacions.
+        processos : int
+            Nombre de processos.
+        """
+        self._processos = processos
+        self._publicacio = PublicacioCompartida(score)
+        self._pool = ProcessPoolExecutor(processos, initializer=_inicialitza_worker,
+                                         initargs=(self._publicacio.descriptor,))
+        limits = np.linspace(0, score.n_usuaris, processos + 1).astype(int)
+        self._trams = [(inici, fi) for inici, fi in zip(limits[:-1], limits[1:]) if fi > inici]
+        logging.info(f"Càlcul paral·lel amb {processos} processos i {len(self._trams)} trams d'usuaris")
+
+    def top_k(self, files, k: int):
+        """
+        Retorna els k veïns de cada fila de consulta, sense comptar la mateixa fila.
+
+        Parameters
+        ----------
+        files : array_like
+            Índexs de les files de consulta.
+        k : int
+            Nombre de veïns.
+
+        Returns
+        -------
+        tuple
+            Matrius (len(files) x k) d'índexs de veïns (-1 si no n'hi ha) i de similituds.
+        """
+        files = np.asarray(files, dtype=np.int64)
+        parcials = list(self._pool.map(_top_k_tram_worker, [files] * len(self._trams),
+                                       *zip(*self._trams), [k] * len(self._trams)))
+        veins = np.hstack([veins for veins, _ in parcials])
+        pesos = np.hstack([pesos for _, pesos in parcials])
+        return combina_top_k(veins, pesos, k)
+
+    def tanca(self):
+        """
+        Atura el pool i allibera la memòria compartida.
+        """
+        self._pool.shutdown()
+        self._publicacio.tanca()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcio):
+        self.tanca()
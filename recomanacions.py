@@ -1,12 +1,103 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-∫
-from sklearn.feature_extraction.text import TfidfVectorizer
-from score import Score, ScoreBooks, ScoreMovies, ScoreAnimes
+from score import Score, ScoreBooks, ScoreMovies, ScoreAnimes, desglossa_dispersa, recompon_dispersa, modificable
+from veins import IndexVeins, IndexLSH, matriu_similituds_items, actualitza_similituds_items
+from factors import valoracions_centrades, resol_factors, entrena_als
+from temps import etapa
 from abc import ABCMeta, abstractmethod
 import numpy as np
+import scipy.sparse as sp
 import logging
 
 
+def selecciona_top_n(puntuacions, n: int = 5, excloure=None, filtre=None):
+    """
+    Retorna els índexs de les n puntuacions més altes, ordenats de més a menys.
+
+    Fa servir una partició parcial, de manera que el cost és lineal en el
+    nombre d'ítems. Els empats es resolen a favor de l'índex més baix.
+
+    Parameters
+    ----------
+    puntuacions : np.ndarray
+        Vector de puntuacions.
+    n : int
+        Nombre d'índexs a retornar.
+    excloure : np.ndarray, optional
+        Màscara booleana dels índexs que no es poden triar (p. ex. ítems ja valorats).
+    filtre : np.ndarray, optional
+        Màscara booleana dels únics índexs que es poden triar.
+
+    Returns
+    -------
+    np.ndarray
+        Índexs seleccionats, com a molt n.
+    """
+    candidats = ~np.isnan(puntuacions)
+    if excloure is not None:
+        candidats &= ~excloure
+    if filtre is not None:
+        candidats &= filtre
+    candidats = np.flatnonzero(candidats)
+    valors = puntuacions[candidats]
+    if len(candidats) > n:
+        if n <= 0:
+            return candidats[:0]
+        llindar = -np.partition(-valors, n - 1)[n - 1]
+        millors = np.flatnonzero(valors > llindar)
+        empats = np.flatnonzero(valors == llindar)[:n - len(millors)]
+        millors = np.concatenate((millors, empats))
+        candidats, valors = candidats[millors], valors[millors]
+    return candidats[np.lexsort((candidats, -valors))]
+
+
+def selecciona_top_n_lot(puntuacions, n: int = 5, excloure=None, filtre=None):
+    """
+    Retorna, per a cada fila, els índexs de les n puntuacions més altes.
+
+    És la versió per files de selecciona_top_n: mateix criteri d'ordenació
+    i d'empats, però amb una sola partició per a tot el bloc.
+
+    Parameters
+    ----------
+    puntuacions : np.ndarray
+        Matriu (usuaris x ítems) de puntuacions.
+    n : int
+        Nombre d'índexs a retornar per fila.
+    excloure : np.ndarray, optional
+        Màscara booleana (usuaris x ítems) dels índexs que no es poden triar.
+    filtre : np.ndarray, optional
+        Màscara booleana (ítems) dels únics índexs que es poden triar.
+
+    Returns
+    -------
+    np.ndarray
+        Matriu (usuaris x n) d'índexs, amb -1 on no hi ha prou candidats.
+    """
+    n_files, n_columnes = puntuacions.shape
+    resultat = np.full((n_files, n), -1, dtype=np.int32)
+    m = min(n, n_columnes)
+    if m <= 0 or n_files == 0:
+        return resultat
+    valors = np.where(np.isnan(puntuacions), -np.inf, puntuacions)
+    if excloure is not None:
+        valors[excloure] = -np.inf
+    if filtre is not None:
+        valors[:, ~filtre] = -np.inf
+    llindar = -np.partition(-valors, m - 1, axis=1)[:, m - 1:m]
+    majors = valors > llindar
+    empats = valors == llindar
+    falten = m - majors.sum(axis=1, keepdims=True)
+    tria = majors | (empats & (np.cumsum(empats, axis=1) <= falten))
+    index = np.nonzero(tria)[1].reshape(n_files, m)
+    triats = np.take_along_axis(valors, index, axis=1)
+    ordre = np.lexsort((index, -triats), axis=1)
+    index = np.take_along_axis(index, ordre, axis=1)
+    triats = np.take_along_axis(triats, ordre, axis=1)
+    resultat[:, :m] = np.where(np.isneginf(triats), -1, index)
+    return resultat
+
+
 class Recomanacio(metaclass=ABCMeta):
     """
     Classe base per a les recomanacions.
@@ -15,15 +106,25 @@ class Recomanacio(metaclass=ABCMeta):
     ----------
     _score : Score
         Objecte per calcular puntuacions.
+    FONTS : tuple
+        Fitxers d'entrada, a part dels de les puntuacions, dels quals depèn el model (p. ex. 'items').
 
     Methods
     -------
     recomana_per(id_usuari):
         Retorna una llista d'ítems recomanats per a l'usuari.
+    recomana_per_lot(ids_usuaris, n):
+        Retorna els índexs dels ítems recomanats per a molts usuaris alhora.
+    puntuacions_lot(files):
+        Retorna les puntuacions de tots els ítems per a un bloc d'usuaris.
     valoracions_usuari(id_usuari):
         Retorna les valoracions de l'usuari.
+    des_de_score(score, **parametres):
+        Crea la recomanació sobre unes puntuacions ja carregades.
     """
     _score = Score
+
+    FONTS = ()
     
     def __init__(self, fitxer_items: str, fitxer_valoracions:str, dataset: str):
         """
@@ -46,7 +147,7 @@ class Recomanacio(metaclass=ABCMeta):
         else:
             self._score = ScoreAnimes(fitxer_items, fitxer_valoracions)
     
-    def recomana_per(self, id_usuari):
+    def recomana_per(self, id_usuari, n: int = 5):
         """
         Retorna una llista d'ítems recomanats per a l'usuari.
 
@@ -54,6 +155,8 @@ class Recomanacio(metaclass=ABCMeta):
         ----------
         id_usuari : str
             Identificador de l'usuari.
+        n : int
+            Nombre d'ítems a recomanar.
 
         Returns
         -------
@@ -68,6 +171,230 @@ class Recomanacio(metaclass=ABCMeta):
         else:
             return self._score.ll_items().copy()
     
+    def recomana_per_lot(self, ids_usuaris, n: int = 5, mida_bloc: int = 256, **parametres):
+        """
+        Retorna els ítems recomanats per a molts usuaris alhora.
+
+        Els usuaris es processen per blocs: les valoracions del bloc s'apilen
+        en una matriu i les puntuacions es calculen amb productes de matrius.
+
+        Parameters
+        ----------
+        ids_usuaris : list
+            Identificadors dels usuaris.
+        n : int
+            Nombre d'ítems a recomanar per usuari.
+        mida_bloc : int
+            Nombre d'usuaris que es puntuen alhora.
+        **parametres
+            Paràmetres propis del mètode (p. ex. min_vots).
+
+        Returns
+        -------
+        np.ndarray
+            Matriu (usuaris x n) amb els índexs de columna dels ítems recomanats
+            (en l'ordre de ll_items), -1 pels usuaris no carregats o si no n'hi ha prou.
+        """
+        files = self._score.index_usuaris(ids_usuaris)
+        resultat = np.full((len(files), n), -1, dtype=np.int32)
+        carregats = np.flatnonzero(files >= 0)
+        if len(carregats) < len(files):
+            logging.warning(f"{len(files) - len(carregats)} usuaris no carregats.")
+        filtre = self._filtre_lot(**parametres)
+        for inici in range(0, len(carregats), mida_bloc):
+            posicions = carregats[inici:inici + mida_bloc]
+            bloc = files[posicions]
+            with etapa('puntuacio'):
+                puntuacions = self.puntuacions_lot(bloc, **parametres)
+            with etapa('seleccio'):
+                valoracions = self._score.files_puntuacions(bloc)
+                vistes = (valoracions != 0).toarray() if sp.issparse(valoracions) else valoracions != 0
+                resultat[posicions] = selecciona_top_n_lot(puntuacions, n, vistes, filtre)
+        return resultat
+
+    @abstractmethod
+    def puntuacions_lot(self, files, **parametres):
+        """
+        Retorna les puntuacions de tots els ítems per a un bloc d'usuaris.
+
+        Parameters
+        ----------
+        files : np.ndarray
+            Índexs de fila dels usuaris.
+
+        Returns
+        -------
+        np.ndarray
+            Matriu (len(files) x n_items) de puntuacions.
+        """
+
+    def _filtre_lot(self, **parametres):
+        """
+        Retorna la màscara dels ítems que es poden recomanar, o None si tots.
+
+        Returns
+        -------
+        np.ndarray
+            Màscara booleana dels ítems recomanables.
+        """
+        return None
+
+    def _millors_no_vistes(self, id_usuari, puntuacions, ll_items, n: int = 5, filtre=None):
+        """
+        Retorna els n ítems amb més puntuació que l'usuari encara no ha valorat.
+
+        Parameters
+        ----------
+        id_usuari : str
+            Identificador de l'usuari.
+        puntuacions : np.ndarray
+            Puntuació de cada ítem, en l'ordre de ll_items.
+        ll_items : list
+            Llista d'identificadors d'ítems.
+        n : int
+            Nombre d'ítems a recomanar.
+        filtre : np.ndarray, optional
+            Màscara booleana dels ítems que es poden recomanar.
+
+        Returns
+        -------
+        list
+            Identificadors dels ítems recomanats.
+        """
+        with etapa('seleccio'):
+            vistes = self._score.vector_puntuacions(id_usuari) != 0
+            return [ll_items[i] for i in selecciona_top_n(puntuacions, n, vistes, filtre)]
+
+    @property
+    def score(self) -> Score:
+        return self._score
+
+    def estat(self):
+        """
+        Retorna l'estat propi del mètode (sense les puntuacions) com a metadades i arrays.
+
+        Returns
+        -------
+        tuple
+            Diccionari de metadades i diccionari d'arrays.
+        """
+        return {'classe': type(self).__name__}, {}
+
+    @classmethod
+    def des_de_estat(cls, score: Score, meta: dict, arrays: dict):
+        """
+        Reconstrueix una recomanació a partir de les puntuacions i l'estat desat.
+
+        Parameters
+        ----------
+        score : Score
+            Puntuacions ja carregades.
+        meta : dict
+            Metadades retornades per estat().
+        arrays : dict
+            Arrays retornats per estat().
+
+        Returns
+        -------
+        Recomanacio
+            Objecte de recomanació.
+        """
+        recomanacio = cls.__new__(cls)
+        recomanacio._score = score
+        recomanacio._restaura(meta, arrays)
+        return recomanacio
+
+    @classmethod
+    def des_de_score(cls, score: Score, **parametres):
+        """
+        Crea una recomanació sobre unes puntuacions ja carregades i n'ajusta el model.
+
+        Parameters
+        ----------
+        score : Score
+            Puntuacions ja carregades.
+        **parametres
+            Paràmetres del model, els mateixos que accepta el constructor del mètode.
+
+        Returns
+        -------
+        Recomanacio
+            Objecte de recomanació.
+        """
+        recomanacio = cls.__new__(cls)
+        recomanacio._score = score
+        recomanacio._ajusta(**parametres)
+        return recomanacio
+
+    def _ajusta(self):
+        """
+        Ajusta el model propi del mètode sobre les puntuacions; per defecte no n'hi ha.
+        """
+        pass
+
+    def _restaura(self, meta: dict, arrays: dict):
+        """
+        Recupera l'estat propi del mètode desat amb estat().
+
+        Parameters
+        ----------
+        meta : dict
+            Metadades desades.
+        arrays : dict
+            Arrays desats.
+        """
+        pass
+
+    def afegeix_valoracio(self, id_usuari, id_item, valor, desa: bool = True):
+        """
+        Afegeix o canvia una valoració i actualitza el model del mètode.
+
+        Parameters
+        ----------
+        id_usuari : str
+            Identificador de l'usuari.
+        id_item : str
+            Identificador de l'ítem.
+        valor : float
+            Puntuació (diferent de zero).
+        desa : bool
+            Si cal afegir la valoració al fitxer de valoracions noves.
+        """
+        fila, columna = self._score.afegeix_valoracio(id_usuari, id_item, valor, desa)
+        self._actualitza(fila, columna)
+
+    def aplica_pendents(self) -> int:
+        """
+        Aplica les valoracions del fitxer de valoracions noves posteriors a l'estat carregat.
+
+        Returns
+        -------
+        int
+            Nombre de valoracions aplicades.
+        """
+        pendents = self._score.valoracions_pendents()
+        for id_usuari, id_item, valor in pendents:
+            self.afegeix_valoracio(id_usuari, id_item, valor, desa=False)
+        if pendents:
+            logging.info(f"Aplicades {len(pendents)} valoracions noves")
+        return len(pendents)
+
+    def _actualitza(self, fila: int, columna: int):
+        """
+        Actualitza el model del mètode després que canviï una valoració.
+
+        Per defecte no cal fer res: els models que depenen de la versió de
+        les valoracions es tornen a calcular el primer cop que es fan servir.
+
+        Parameters
+        ----------
+        fila : int
+            Índex de fila de l'usuari.
+        columna : int
+            Índex de columna de l'ítem.
+        """
+        pass
+
     def valoracions_usuari(self, id_usuari):
         """
         Retorna les valoracions de l'usuari.
@@ -100,12 +427,20 @@ class RecomanacioSimple(Recomanacio):
     """
     Classe per a la recomanació simple.
 
+    Attributes
+    ----------
+    _rankings : dict
+        Rànquing de popularitat ja calculat per a cada valor de min_vots.
+    _versio : int
+        Versió de les valoracions amb què s'han calculat els rànquings.
+
     Methods
     -------
     recomana_per(id_usuari):
         Retorna una llista d'ítems recomanats per a l'usuari mitjançant el mètode simple.
     """
     _score = Score
+    _rankings = dict
 
     def __init__(self, fitxer_items: str, fitxer_valoracions: str, dataset: str):  
         """
@@ -122,8 +457,88 @@ class RecomanacioSimple(Recomanacio):
         """
         
         super().__init__(fitxer_items, fitxer_valoracions, dataset)
+        self._ajusta()
+
+    def _ajusta(self):
+        """
+        Buida els rànquings, que es tornen a calcular quan cal.
+        """
+        self._rankings = {}
+        self._versio = self._score.versio
+
+    def _restaura(self, meta: dict, arrays: dict):
+        """
+        Buida els rànquings, que es tornen a calcular quan cal.
+        """
+        self._ajusta()
+
+    def _ranking(self, min_vots):
+        """
+        Retorna les puntuacions bayesianes i el rànquing d'ítems per a un mínim de vots.
+
+        El rànquing és el mateix per a tots els usuaris, així que es calcula
+        un sol cop per cada valor de min_vots.
+
+        Parameters
+        ----------
+        min_vots : int
+            Nombre mínim de vots.
+
+        Returns
+        -------
+        tuple
+            Vector de puntuacions i índexs dels ítems amb prou vots, de més a menys puntuats.
+        """
+        if self._versio != self._score.versio:
+            self._rankings = {}
+            self._versio = self._score.versio
+        if min_vots not in self._rankings:
+            num_vots = self._score.vots_items().astype(np.float64)
+            avg_items = self._score.mitjanes_items()
+            a_considerar = num_vots >= min_vots
+            avg_global = np.mean(avg_items[a_considerar])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                puntuacions = ((num_vots/(num_vots+min_vots))*avg_items)+((min_vots/(num_vots+min_vots))*avg_global)
+            ordre = np.argsort(-puntuacions, kind='stable')
+            self._rankings[min_vots] = (puntuacions, ordre[a_considerar[ordre]])
+        return self._rankings[min_vots]
     
-    def recomana_per(self, id_usuari):
+    def puntuacions_lot(self, files, min_vots: int = 10):
+        """
+        Retorna les puntuacions bayesianes, iguals per a tots els usuaris del bloc.
+
+        Parameters
+        ----------
+        files : np.ndarray
+            Índexs de fila dels usuaris.
+        min_vots : int
+            Nombre mínim de vots.
+
+        Returns
+        -------
+        np.ndarray
+            Matriu (len(files) x n_items) de puntuacions.
+        """
+        puntuacions, _ = self._ranking(min_vots)
+        return np.broadcast_to(puntuacions, (len(files), len(puntuacions)))
+
+    def _filtre_lot(self, min_vots: int = 10):
+        """
+        Retorna la màscara dels ítems amb un mínim de vots.
+
+        Parameters
+        ----------
+        min_vots : int
+            Nombre mínim de vots.
+
+        Returns
+        -------
+        np.ndarray
+            Màscara booleana dels ítems recomanables.
+        """
+        return self._score.vots_items() >= min_vots
+
+    def recomana_per(self, id_usuari, n: int = 5, min_vots: int = None):
         """
         Retorna una llista d'ítems recomanats per a l'usuari mitjançant el mètode simple.
 
@@ -131,6 +546,10 @@ class RecomanacioSimple(Recomanacio):
         ----------
         id_usuari : str
             Identificador de l'usuari.
+        n : int
+            Nombre d'ítems a recomanar.
+        min_vots : int, optional
+            Mínim de vots d'un ítem; si no s'indica, es demana per consola.
 
         Returns
         -------
@@ -144,29 +563,20 @@ class RecomanacioSimple(Recomanacio):
             return None, None
         else:
             logging.debug(f"Recomanació Simple per l'usuari: {id_usuari}")
-            min_vots = int(input('Minim vots: '))
-            items_a_considerar = self._score.min_vots(min_vots)
-            puntuacions = np.zeros(len(ll_items))
-            avg_global = self._score.avg_global(items_a_considerar)
+            if min_vots is None:
+                min_vots = int(input('Minim vots: '))
+            with etapa('puntuacio'):
+                puntuacions, ordre = self._ranking(min_vots)
             
-            for id_item in ll_items:
-                num_vots = self._score.num_vots(id_item)
-                avg_item = self._score.avg_item(id_item)
-                puntuacio = ((num_vots/(num_vots+min_vots))*avg_item)+((min_vots/(num_vots+min_vots))*avg_global)
-                puntuacions[ll_items.index(id_item)] = puntuacio
-            
-            copia_puntuacions = puntuacions.copy()
-            copia_puntuacions = copia_puntuacions.tolist()
-            items = []
-            while len(items) < 5:
-                index_maxim = copia_puntuacions.index(max(copia_puntuacions))
-                id_item = ll_items[index_maxim]
-                if id_item in items_a_considerar:
-                    if self._score.no_vista(id_usuari, id_item):
-                        items.append(id_item)
-                copia_puntuacions.pop(index_maxim)
-                ll_items.pop(index_maxim)
-            return puntuacions, items
+            with etapa('seleccio'):
+                vistes = self._score.vector_puntuacions(id_usuari) != 0
+                items = []
+                for index in ordre:
+                    if not vistes[index]:
+                        items.append(ll_items[index])
+                        if len(items) == n:
+                            break
+            return puntuacions.copy(), items
     
     def usuari_a_avaluar(self):
         """
@@ -184,14 +594,24 @@ class RecomanacioColaborativa(Recomanacio):
     """
     Classe per a la recomanació col·laborativa.
 
+    Attributes
+    ----------
+    _index : IndexVeins
+        Índex precalculat dels k veïns més similars de cada usuari.
+    _processos : int
+        Processos amb què es reconstrueix l'índex.
+
     Methods
     -------
     recomana_per(id_usuari):
         Retorna una llista d'ítems recomanats per a l'usuari mitjançant el mètode col·laboratiu.
     """
     _score = Score
+    _index = IndexVeins
+    _processos = int
 
-    def __init__(self, fitxer_items: str, fitxer_valoracions: str, dataset: str): 
+    def __init__(self, fitxer_items: str, fitxer_valoracions: str, dataset: str, k: int = 5,
+                 taules: int = 0, bits: int = 8, processos: int = 1):
         """
         Inicialitza un nou objecte de recomanació col·laborativa.
 
@@ -203,11 +623,122 @@ class RecomanacioColaborativa(Recomanacio):
             Nom del fitxer de valoracions.
         dataset : str
             Nom del dataset ('movielens100k' o 'books').
+        k : int
+            Nombre de veïns que es fan servir per predir.
+        taules : int
+            Taules de l'índex aproximat (LSH) per triar els veïns; 0 per a la cerca exacta.
+        bits : int
+            Bits per taula de l'índex aproximat.
+        processos : int
+            Processos amb què es calculen les similituds quan cal construir l'índex.
         """
         
         super().__init__(fitxer_items, fitxer_valoracions, dataset)
+        self._ajusta(k, taules, bits, processos)
+
+    def _ajusta(self, k: int = 5, taules: int = 0, bits: int = 8, processos: int = 1):
+        """
+        Construeix l'índex de veïns (vegeu el constructor per als paràmetres).
+        """
+        self._processos = processos
+        self._index = IndexVeins(k, IndexLSH(taules, bits) if taules > 0 else None)
+        self._index.construeix(self._score, processos=self._processos)
+
+    @property
+    def k(self) -> int:
+        return self._index.k
+
+    @k.setter
+    def k(self, k: int):
+        if k != self._index.k:
+            self._index = IndexVeins(k, self._index.lsh)
+            self._index.construeix(self._score, processos=self._processos)
+
+    @property
+    def processos(self) -> int:
+        return self._processos
+
+    @processos.setter
+    def processos(self, processos: int):
+        self._processos = processos
+
+    @property
+    def lsh(self) -> tuple:
+        """
+        Configuració de l'índex aproximat.
+
+        Returns
+        -------
+        tuple
+            Taules i bits de l'índex aproximat, (0, 0) si la cerca és exacta.
+        """
+        return (0, 0) if self._index.lsh is None else self._index.lsh.configuracio
+
+    def configura_lsh(self, taules: int, bits: int = 8):
+        """
+        Canvia la cerca de veïns (aproximada o exacta) i reconstrueix l'índex.
+
+        Parameters
+        ----------
+        taules : int
+            Taules de l'índex aproximat; 0 per a la cerca exacta.
+        bits : int
+            Bits per taula de l'índex aproximat.
+        """
+        self._index = IndexVeins(self._index.k, IndexLSH(taules, bits) if taules > 0 else None)
+        self._index.construeix(self._score, processos=self._processos)
+
+    def estat(self):
+        """
+        Retorna l'índex de veïns com a metadades i arrays.
+        """
+        meta, arrays = self._index.estat()
+        return {'classe': type(self).__name__, 'index': meta}, arrays
+
+    def _restaura(self, meta: dict, arrays: dict):
+        """
+        Recupera l'índex de veïns desat.
+        """
+        self._index = IndexVeins.des_de_estat(meta['index'], arrays)
+        self._processos = 1
+
+    def _actualitza(self, fila: int, columna: int):
+        """
+        Corregeix l'índex de veïns amb les similituds noves de l'usuari.
+        """
+        self._index.actualitza(self._score, fila)
     
-    def recomana_per(self, id_usuari):
+    def puntuacions_lot(self, files):
+        """
+        Prediu les valoracions de tots els ítems per a un bloc d'usuaris a partir dels seus veïns.
+
+        Parameters
+        ----------
+        files : np.ndarray
+            Índexs de fila dels usuaris.
+
+        Returns
+        -------
+        np.ndarray
+            Matriu (len(files) x n_items) de prediccions.
+        """
+        if not self._index.vigent(self._score):
+            self._index.construeix(self._score, processos=self._processos)
+        veins, pesos = self._index.veins_files(files)
+        pesos = pesos.astype(np.float64)
+        valids = veins >= 0
+        files_w = np.repeat(np.arange(len(files)), veins.shape[1])[valids.ravel()]
+        W = sp.csr_matrix((pesos[valids], (files_w, veins[valids])), shape=(len(files), self._score.n_usuaris))
+        mitjanes = self._score.mitjanes_usuaris()
+        numerador = W @ self._score.mat
+        numerador = numerador.toarray() if sp.issparse(numerador) else np.asarray(numerador, dtype=np.float64)
+        numerador = numerador - (W @ mitjanes)[:, np.newaxis]
+        denominador = np.asarray(W.sum(axis=1)).ravel()
+        prediccions = np.zeros(numerador.shape)
+        np.divide(numerador, denominador[:, np.newaxis], out=prediccions, where=denominador[:, np.newaxis] != 0)
+        return mitjanes[files][:, np.newaxis] + prediccions
+
+    def recomana_per(self, id_usuari, n: int = 5):
         """
         Retorna una llista d'ítems recomanats per a l'usuari mitjançant el mètode col·laboratiu.
 
@@ -215,6 +746,8 @@ class RecomanacioColaborativa(Recomanacio):
         ----------
         id_usuari : str
             Identificador de l'usuari.
+        n : int
+            Nombre d'ítems a recomanar.
 
         Returns
         -------
@@ -228,43 +761,25 @@ class RecomanacioColaborativa(Recomanacio):
             return None, None
         else:
             logging.debug(f"Recomanació Colaborativa per l'usuari: {id_usuari}")
-            logging.info(f"Trobant similituds amb altres usuaris. Aquest recomanador pot anar més lent per alguns casos (fins a 45s)")
-            similituds=[]
-            for usuari in self._score.ll_usuaris():
-                s=self._score.similitud(id_usuari,usuari)
-                similituds.append((usuari,s))
-            k = 5
-            similituds.sort(key = lambda x: x[1], reverse = True)
-            k_similituds = similituds[:k+1][1:]
-            usuaris_similars = [x[0] for x in k_similituds]
-            
-            puntuacions = np.zeros(len(ll_items))
-            mitjana_usu = self._score.avg_usu(id_usuari)
-            for item in ll_items:
-                numerador = 0
-                denominador = 0
-                
-                for usuari in usuaris_similars:
-                    i = usuaris_similars.index(usuari)
-                    mitjana = self._score.avg_usu(usuari)
-                    numerador += k_similituds[i][1]*(self._score.mat[self._score.ll_usuaris().index(usuari)][self._score.ll_items().index(item)]-mitjana)
-                    denominador += k_similituds[i][1]
-                try:
-                    puntuacio = float(numerador)/denominador
-                except ZeroDivisionError:
-                    puntuacio = 0
-                puntuacions[ll_items.index(item)] = mitjana_usu + puntuacio
-            
-            copia_puntuacions = puntuacions.copy()
-            copia_puntuacions = copia_puntuacions.tolist()
-            items = []
-            while len(items) < 5:
-                index_maxim = copia_puntuacions.index(max(copia_puntuacions))
-                id_item = ll_items[index_maxim]
-                if self._score.no_vista(id_usuari, id_item):
-                    items.append(id_item)
-                copia_puntuacions.pop(index_maxim)
-                ll_items.pop(index_maxim)
+            with etapa('puntuacio'):
+                if not self._index.vigent(self._score):
+                    self._index.construeix(self._score, processos=self._processos)
+                index_similars, k_similituds = self._index.veins(self._score.index_usuari(id_usuari))
+                k_similituds = k_similituds.astype(np.float64)
+                ll_usuaris = self._score.ll_usuaris()
+                usuaris_similars = [ll_usuaris[i] for i in index_similars]
+
+                mitjana_usu = self._score.avg_usu(id_usuari)
+                valoracions_similars = np.array([self._score.vector_puntuacions(usuari) for usuari in usuaris_similars], dtype=np.float64)
+                mitjanes_similars = np.array([self._score.avg_usu(usuari) for usuari in usuaris_similars], dtype=np.float64)
+                numerador = k_similituds @ (valoracions_similars - mitjanes_similars[:, np.newaxis])
+                denominador = np.sum(k_similituds)
+                if denominador != 0:
+                    puntuacions = mitjana_usu + numerador / denominador
+                else:
+                    puntuacions = np.full(len(ll_items), mitjana_usu, dtype=np.float64)
+
+            items = self._millors_no_vistes(id_usuari, puntuacions, ll_items, n)
             return puntuacions, items
         
     def usuari_a_avaluar(self):
@@ -279,10 +794,165 @@ class RecomanacioColaborativa(Recomanacio):
         super().usuari_a_avaluar()
     
 
+class RecomanacioColaborativaItems(Recomanacio):
+    """
+    Classe per a la recomanació col·laborativa basada en ítems.
+
+    Attributes
+    ----------
+    _similituds : sp.csc_matrix
+        Matriu dispersa (n_items x n_items) amb les similituds (positives) dels k veïns de cada ítem.
+
+    Methods
+    -------
+    recomana_per(id_usuari):
+        Retorna una llista d'ítems recomanats per a l'usuari a partir dels ítems que ha valorat.
+    """
+    _score = Score
+
+    def __init__(self, fitxer_items: str, fitxer_valoracions: str, dataset: str, k: int = 50):
+        """
+        Inicialitza un nou objecte de recomanació col·laborativa basada en ítems.
+
+        Parameters
+        ----------
+        fitxer_items : str
+            Nom del fitxer d'ítems.
+        fitxer_valoracions : str
+            Nom del fitxer de valoracions.
+        dataset : str
+            Nom del dataset ('movielens100k' o 'books').
+        k : int
+            Nombre d'ítems veïns que es guarden per cada ítem.
+        """
+        super().__init__(fitxer_items, fitxer_valoracions, dataset)
+        self._ajusta(k)
+
+    def _ajusta(self, k: int = 50):
+        """
+        Precalcula les similituds entre ítems guardant-ne k per ítem.
+        """
+        self._k = k
+        self._construeix_similituds()
+
+    def _construeix_similituds(self):
+        """
+        Precalcula la matriu de similituds entre ítems.
+        """
+        with etapa('model'):
+            self._similituds = matriu_similituds_items(self._score, self._k)
+        self._versio = self._score.versio
+
+    def estat(self):
+        """
+        Retorna la matriu de similituds entre ítems com a metadades i arrays.
+        """
+        meta = {'classe': type(self).__name__, 'k': self._k, 'versio': int(self._versio)}
+        return meta, desglossa_dispersa(self._similituds, 'similituds')
+
+    def _restaura(self, meta: dict, arrays: dict):
+        """
+        Recupera la matriu de similituds entre ítems desada.
+        """
+        self._k = meta['k']
+        self._versio = meta['versio']
+        n_items = self._score.n_items
+        self._similituds = recompon_dispersa(arrays, 'similituds', (n_items, n_items), 'csc')
+
+    def _actualitza(self, fila: int, columna: int):
+        """
+        Corregeix les similituds de l'ítem de la valoració sense tornar a calcular tota la matriu.
+
+        Si el model ja no corresponia a la versió anterior de les puntuacions,
+        es deixa que es torni a calcular sencer el primer cop que es faci servir.
+        """
+        if self._versio != self._score.versio - 1:
+            return
+        with etapa('model'):
+            self._similituds = actualitza_similituds_items(self._similituds, self._score, columna, self._k)
+        self._versio = self._score.versio
+
+    def puntuacions_lot(self, files):
+        """
+        Prediu les valoracions de tots els ítems per a un bloc d'usuaris.
+
+        Parameters
+        ----------
+        files : np.ndarray
+            Índexs de fila dels usuaris.
+
+        Returns
+        -------
+        np.ndarray
+            Matriu (len(files) x n_items) de prediccions.
+        """
+        if self._versio != self._score.versio:
+            self._construeix_similituds()
+        valoracions = sp.csr_matrix(self._score.files_puntuacions(files), dtype=np.float64)
+        vistes = valoracions.copy()
+        vistes.data[:] = 1
+        numerador = (valoracions @ self._similituds).toarray()
+        denominador = (vistes @ self._similituds).toarray()
+        mitjanes = self._score.mitjanes_usuaris()[files]
+        prediccions = np.repeat(mitjanes[:, np.newaxis], self._score.n_items, axis=1)
+        np.divide(numerador, denominador, out=prediccions, where=denominador != 0)
+        return prediccions
+
+    def recomana_per(self, id_usuari, n: int = 5):
+        """
+        Retorna una llista d'ítems recomanats per a l'usuari a partir dels ítems que ha valorat.
+
+        Parameters
+        ----------
+        id_usuari : str
+            Identificador de l'usuari.
+        n : int
+            Nombre d'ítems a recomanar.
+
+        Returns
+        -------
+        tuple
+            Vector de puntuacions i llista d'ítems recomanats.
+        """
+        ll_items = super().recomana_per(id_usuari)
+
+        if ll_items is None:
+            return None, None
+        else:
+            logging.debug(f"Recomanació Colaborativa per ítems per l'usuari: {id_usuari}")
+            with etapa('puntuacio'):
+                if self._versio != self._score.versio:
+                    self._construeix_similituds()
+                valoracions = self._score.vector_puntuacions(id_usuari).astype(np.float64)
+                numerador = self._similituds.T @ valoracions
+                denominador = self._similituds.T @ (valoracions != 0).astype(np.float64)
+                puntuacions = np.full(len(ll_items), self._score.avg_usu(id_usuari), dtype=np.float64)
+                np.divide(numerador, denominador, out=puntuacions, where=denominador != 0)
+
+            items = self._millors_no_vistes(id_usuari, puntuacions, ll_items, n)
+            return puntuacions, items
+
+    def usuari_a_avaluar(self):
+        """
+        Retorna el primer usuari amb alguna valoració feta per poder ser avaluat.
+
+        Returns
+        -------
+        str
+            Id del primer item a poder ser avaluat
+        """
+        super().usuari_a_avaluar()
+
+
 class RecomanacioBasadaEnContingut(Recomanacio):
     """
     Classe per a la recomanació basada en contingut.
 
+    Attributes
+    ----------
+    _tfidf : sp.csr_matrix
+        Matriu TF-IDF dispersa (n_items x termes) de les característiques dels ítems.
+
     Methods
     -------
     recomana_per(id_usuari):
@@ -290,6 +960,8 @@ class RecomanacioBasadaEnContingut(Recomanacio):
     """
     _score = Score
 
+    FONTS = ('items',)
+
     def __init__(self, fitxer_items: str, fitxer_valoracions: str, dataset: str):   
         """
         Inicialitza un nou objecte de recomanació basada en contingut.
@@ -304,9 +976,70 @@ class RecomanacioBasadaEnContingut(Recomanacio):
             Nom del dataset ('movielens100k' o 'books').
         """
         super().__init__(fitxer_items, fitxer_valoracions, dataset)
+        self._ajusta(fitxer_items)
+
+    def _ajusta(self, fitxer_items: str):
+        """
+        Ajusta el model TF-IDF amb les característiques del fitxer d'ítems.
+        """
         self._fitxer_items = fitxer_items
+        self._construeix_tfidf()
+
+    def _construeix_tfidf(self):
+        """
+        Ajusta el model TF-IDF sobre les característiques dels ítems.
+        """
+        # Importació local: scikit-learn tarda a carregar-se i només el fa servir aquest mètode.
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        logging.info("Construint la matriu TF-IDF dels ítems")
+        with etapa('model'):
+            item_features = self._score.item_features(self._fitxer_items)
+            tfidf = TfidfVectorizer(stop_words='english')
+            self._tfidf = tfidf.fit_transform(item_features).tocsr()
+
+    def estat(self):
+        """
+        Retorna la matriu TF-IDF com a metadades i arrays.
+        """
+        meta = {'classe': type(self).__name__, 'fitxer_items': self._fitxer_items, 'n_termes': int(self._tfidf.shape[1])}
+        return meta, desglossa_dispersa(self._tfidf, 'tfidf')
+
+    def _restaura(self, meta: dict, arrays: dict):
+        """
+        Recupera la matriu TF-IDF desada.
+        """
+        self._fitxer_items = meta['fitxer_items']
+        self._tfidf = recompon_dispersa(arrays, 'tfidf', (self._score.n_items, meta['n_termes']), 'csr')
+
+    def _actualitza(self, fila: int, columna: int):
+        """
+        Torna a ajustar el model TF-IDF si la valoració és d'un ítem nou.
+        """
+        if self._tfidf.shape[0] < self._score.n_items:
+            self._construeix_tfidf()
         
-    def recomana_per(self, id_usuari):
+    def puntuacions_lot(self, files):
+        """
+        Retorna la puntuació de contingut de tots els ítems per a un bloc d'usuaris.
+
+        Parameters
+        ----------
+        files : np.ndarray
+            Índexs de fila dels usuaris.
+
+        Returns
+        -------
+        np.ndarray
+            Matriu (len(files) x n_items) de puntuacions.
+        """
+        valoracions = sp.csr_matrix(self._score.files_puntuacions(files), dtype=np.float64)
+        perfils = (valoracions @ self._tfidf).toarray()
+        normalitzadors = np.asarray(valoracions.sum(axis=1)).ravel()
+        Q = np.zeros(perfils.shape)
+        np.divide(perfils, normalitzadors[:, np.newaxis], out=Q, where=normalitzadors[:, np.newaxis] != 0)
+        return np.asarray(self._tfidf @ Q.T).T * self._score.max()
+
+    def recomana_per(self, id_usuari, n: int = 5):
         """
         Retorna una llista d'ítems recomanats per a l'usuari mitjançant el mètode basat en contingut.
 
@@ -314,6 +1047,8 @@ class RecomanacioBasadaEnContingut(Recomanacio):
         ----------
         id_usuari : str
             Identificador de l'usuari.
+        n : int
+            Nombre d'ítems a recomanar.
 
         Returns
         -------
@@ -326,39 +1061,22 @@ class RecomanacioBasadaEnContingut(Recomanacio):
             return None, None
         else:
             logging.debug(f"Recomanació Basada En Contingut per l'usuari: {id_usuari}")
-            item_features = self._score.item_features(self._fitxer_items)
-    
-            tfidf = TfidfVectorizer(stop_words='english')
-            tfidf_matrix = tfidf.fit_transform(item_features).toarray()
-            
-            vector_puntuacions = self._score.vector_puntuacions(id_usuari)
-            
-            mat_numerador = np.copy(tfidf_matrix)
-            for i in range(len(vector_puntuacions)):
-                mat_numerador[i,:] = mat_numerador[i,:]*vector_puntuacions[i]
-           
-            perfil_user = np.sum(mat_numerador, axis=0)
-            
-            valor_normalitzador = np.sum(vector_puntuacions)
-            valor_erroni = np.float16(0)
-            if valor_normalitzador != valor_erroni:
-                Q = perfil_user / valor_normalitzador.astype(np.float64)
-            else:
-                Q = np.zeros(len(perfil_user))
-            
-            S = np.dot(tfidf_matrix, Q)
-            
-            p_final = S * self._score.max()
-            
-            items = []
-            copia_puntuacions = p_final.copy()
-            while len(items) < 5:
-                index = np.argmax(copia_puntuacions)
-                id_item = ll_items[index]
-                if self._score.no_vista(id_usuari, id_item):
-                    items.append(id_item)
-                copia_puntuacions = np.delete(copia_puntuacions, index)
-                ll_items.pop(index)
+            with etapa('puntuacio'):
+                vector_puntuacions = self._score.vector_puntuacions(id_usuari).astype(np.float64)
+
+                perfil_user = self._tfidf.T @ vector_puntuacions
+
+                valor_normalitzador = np.sum(vector_puntuacions)
+                if valor_normalitzador != 0:
+                    Q = perfil_user / valor_normalitzador
+                else:
+                    Q = np.zeros(len(perfil_user))
+
+                S = self._tfidf @ Q
+
+                p_final = S * self._score.max()
+
+            items = self._millors_no_vistes(id_usuari, p_final, ll_items, n)
             return p_final, items
         
     def usuari_a_avaluar(self):
@@ -373,3 +1091,152 @@ class RecomanacioBasadaEnContingut(Recomanacio):
         super().usuari_a_avaluar()
 
 
+class RecomanacioFactoritzacio(Recomanacio):
+    """
+    Classe per a la recomanació per factorització de matrius (ALS).
+
+    Les desviacions de cada valoració respecte de la mitjana de l'usuari es
+    factoritzen en factors latents d'usuaris i d'ítems, entrenats un sol cop.
+    La predicció és la mitjana de l'usuari més el producte escalar dels factors.
+
+    Attributes
+    ----------
+    _P : np.ndarray
+        Factors latents dels usuaris (n_usuaris x f).
+    _Q : np.ndarray
+        Factors latents dels ítems (n_items x f).
+    _factors : int
+        Nombre de factors latents.
+    _regularitzacio : float
+        Pes de la regularització.
+    _iteracions : int
+        Nombre d'iteracions de l'entrenament.
+
+    Methods
+    -------
+    recomana_per(id_usuari):
+        Retorna una llista d'ítems recomanats per a l'usuari a partir dels factors latents.
+    """
+    _score = Score
+    _P = np.ndarray
+    _Q = np.ndarray
+    _factors = int
+    _regularitzacio = float
+    _iteracions = int
+
+    def __init__(self, fitxer_items: str, fitxer_valoracions: str, dataset: str, factors: int = 20,
+                 regularitzacio: float = 0.1, iteracions: int = 10):
+        """
+        Inicialitza un nou objecte de recomanació per factorització i n'entrena els factors.
+
+        Parameters
+        ----------
+        fitxer_items : str
+            Nom del fitxer d'ítems.
+        fitxer_valoracions : str
+            Nom del fitxer de valoracions.
+        dataset : str
+            Nom del dataset ('movielens100k', 'books' o 'animes').
+        factors : int
+            Nombre de factors latents.
+        regularitzacio : float
+            Pes de la regularització.
+        iteracions : int
+            Nombre d'iteracions de l'entrenament.
+        """
+        super().__init__(fitxer_items, fitxer_valoracions, dataset)
+        self._ajusta(factors, regularitzacio, iteracions)
+
+    def _ajusta(self, factors: int = 20, regularitzacio: float = 0.1, iteracions: int = 10):
+        """
+        Entrena els factors latents (vegeu el constructor per als paràmetres).
+        """
+        self._factors = factors
+        self._regularitzacio = regularitzacio
+        self._iteracions = iteracions
+        with etapa('model'):
+            self._P, self._Q = entrena_als(valoracions_centrades(self._score), factors, regularitzacio, iteracions)
+
+    def estat(self):
+        """
+        Retorna els factors latents com a metadades i arrays.
+        """
+        meta = {'classe': type(self).__name__, 'factors': self._factors,
+                'regularitzacio': self._regularitzacio, 'iteracions': self._iteracions}
+        return meta, {'P': self._P, 'Q': self._Q}
+
+    def _restaura(self, meta: dict, arrays: dict):
+        """
+        Recupera els factors latents desats.
+        """
+        self._factors = meta['factors']
+        self._regularitzacio = meta['regularitzacio']
+        self._iteracions = meta['iteracions']
+        self._P, self._Q = arrays['P'], arrays['Q']
+
+    def _actualitza(self, fila: int, columna: int):
+        """
+        Torna a resoldre els factors de l'usuari i de l'ítem de la valoració, amb la resta fixos.
+        """
+        P, Q = modificable(self._P), modificable(self._Q)
+        P = np.vstack([P, np.zeros((self._score.n_usuaris - len(P), self._factors), dtype=P.dtype)])
+        Q = np.vstack([Q, np.zeros((self._score.n_items - len(Q), self._factors), dtype=Q.dtype)])
+        centrades = valoracions_centrades(self._score)
+        P[fila] = resol_factors(centrades[fila], Q, self._regularitzacio)[0]
+        Q[columna] = resol_factors(centrades[:, columna].T.tocsr(), P, self._regularitzacio)[0]
+        self._P, self._Q = P, Q
+
+    def puntuacions_lot(self, files):
+        """
+        Prediu les valoracions de tots els ítems per a un bloc d'usuaris.
+
+        Parameters
+        ----------
+        files : np.ndarray
+            Índexs de fila dels usuaris.
+
+        Returns
+        -------
+        np.ndarray
+            Matriu (len(files) x n_items) de prediccions.
+        """
+        mitjanes = self._score.mitjanes_usuaris()[files]
+        return mitjanes[:, np.newaxis] + self._P[files].astype(np.float64) @ self._Q.T
+
+    def recomana_per(self, id_usuari, n: int = 5):
+        """
+        Retorna una llista d'ítems recomanats per a l'usuari a partir dels factors latents.
+
+        Parameters
+        ----------
+        id_usuari : str
+            Identificador de l'usuari.
+        n : int
+            Nombre d'ítems a recomanar.
+
+        Returns
+        -------
+        tuple
+            Vector de puntuacions i llista d'ítems recomanats.
+        """
+        ll_items = super().recomana_per(id_usuari)
+
+        if ll_items is None:
+            return None, None
+        else:
+            logging.debug(f"Recomanació per Factorització per l'usuari: {id_usuari}")
+            with etapa('puntuacio'):
+                puntuacions = self.puntuacions_lot([self._score.index_usuari(id_usuari)])[0]
+            items = self._millors_no_vistes(id_usuari, puntuacions, ll_items, n)
+            return puntuacions, items
+
+    def usuari_a_avaluar(self):
+        """
+        Retorna el primer usuari amb alguna valoració feta per poder ser avaluat.
+
+        Returns
+        -------
+        str
+            Id del primer item a poder ser avaluat
+        """
+        super().usuari_a_avaluar()
@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from recomanacions import RecomanacioSimple, RecomanacioBasadaEnContingut, RecomanacioColaborativa, Recomanacio
+from recomanacions import RecomanacioSimple, RecomanacioBasadaEnContingut, RecomanacioColaborativa, RecomanacioColaborativaItems, RecomanacioFactoritzacio, Recomanacio
 from abc import ABCMeta, abstractmethod
 from items import Item, Movie, Book, Anime
+from cataleg import Cataleg
 import numpy as np
 import logging
+import json
 import math
 from avaluador import Avaluador
+from temps import etapa, mesura
 
 
 class Recomender(metaclass=ABCMeta):
@@ -21,13 +24,16 @@ class Recomender(metaclass=ABCMeta):
         Nom del fitxer d'ítems.
     _fitxer_valoracions : str
         Nom del fitxer de valoracions.
+    _cataleg : Cataleg
+        Índex dels ítems, que es carrega el primer cop que cal mostrar-ne algun.
     """
 
     _recomanacio = Recomanacio
     _fitxer_items = str
     _fitxer_valoracions = str
+    _cataleg = None
     
-    def __init__(self, dataset: str, method:str):
+    def __init__(self, dataset: str, method:str, k: int = 5, **parametres):
         """
         Inicialitza un nou recomanador.
 
@@ -36,17 +42,133 @@ class Recomender(metaclass=ABCMeta):
         dataset : str 
             Nom del dataset a utilitzar ('Books', 'MovieLens100K').
         method : str
-            Mètode de recomanació ('simple', 'colaboratiu', 'basat en contingut').
+            Mètode de recomanació ('simple', 'colaboratiu', 'colaboratiu items', 'factoritzacio', 'basat en contingut').
+        k : int
+            Nombre de veïns del mètode col·laboratiu.
+        **parametres
+            Paràmetres de la cerca de veïns del mètode col·laboratiu (taules, bits).
         """
         
         logging.info(f"Inicialitzant Recomender amb dataset: {dataset} i method: {method}")
+        self._dataset = dataset
+        self._method = method
+        self._cataleg = None
         if method == 'simple':
             self._recomanacio = RecomanacioSimple(self._fitxer_items, self._fitxer_valoracions, dataset)
         elif method == 'colaboratiu':
-            self._recomanacio = RecomanacioColaborativa(self._fitxer_items, self._fitxer_valoracions, dataset)
+            self._recomanacio = RecomanacioColaborativa(self._fitxer_items, self._fitxer_valoracions, dataset, k, **parametres)
+        elif method == 'colaboratiu items':
+            self._recomanacio = RecomanacioColaborativaItems(self._fitxer_items, self._fitxer_valoracions, dataset)
+        elif method == 'factoritzacio':
+            self._recomanacio = RecomanacioFactoritzacio(self._fitxer_items, self._fitxer_valoracions, dataset)
         else:
             self._recomanacio = RecomanacioBasadaEnContingut(self._fitxer_items, self._fitxer_valoracions, dataset)
         
+    @property
+    def recomanacio(self):
+        return self._recomanacio
+
+    def estat(self) -> dict:
+        """
+        Retorna les metadades del recomanador, per desar-lo.
+
+        Returns
+        -------
+        dict
+            Classe, dataset, mètode i fitxers del recomanador.
+        """
+        return {
+            'classe': type(self).__name__,
+            'dataset': self._dataset,
+            'method': self._method,
+            'fitxer_items': self._fitxer_items,
+            'fitxer_valoracions': self._fitxer_valoracions,
+        }
+
+    @classmethod
+    def des_de_estat(cls, recomanacio: Recomanacio, meta: dict):
+        """
+        Reconstrueix un recomanador a partir d'una recomanació ja carregada.
+
+        Parameters
+        ----------
+        recomanacio : Recomanacio
+            Objecte de recomanació.
+        meta : dict
+            Metadades retornades per estat().
+
+        Returns
+        -------
+        Recomender
+            Recomanador.
+        """
+        recomender = cls.__new__(cls)
+        recomender._recomanacio = recomanacio
+        recomender._dataset = meta['dataset']
+        recomender._method = meta['method']
+        recomender._fitxer_items = meta['fitxer_items']
+        recomender._fitxer_valoracions = meta['fitxer_valoracions']
+        recomender._cataleg = None
+        return recomender
+
+    @property
+    def cataleg(self) -> Cataleg:
+        """
+        Retorna el catàleg d'ítems, carregant-lo el primer cop.
+
+        Returns
+        -------
+        Cataleg
+            Índex dels ítems del dataset.
+        """
+        if self._cataleg is None:
+            self._cataleg = self._crea_cataleg()
+        return self._cataleg
+
+    def _crea_cataleg(self) -> Cataleg:
+        """
+        Carrega el catàleg del fitxer d'ítems.
+
+        Returns
+        -------
+        Cataleg
+            Índex dels ítems del dataset.
+        """
+        return Cataleg(self._fitxer_items)
+
+    def afegeix_valoracio(self, id_usuari, id_item, valor):
+        """
+        Afegeix o canvia una valoració, la desa al fitxer de valoracions noves i actualitza el model.
+
+        Parameters
+        ----------
+        id_usuari : str
+            Identificador de l'usuari.
+        id_item : str
+            Identificador de l'ítem.
+        valor : float
+            Puntuació (diferent de zero).
+        """
+        logging.info(f"Valoració nova: usuari {id_usuari}, ítem {id_item}, {valor}")
+        self._recomanacio.afegeix_valoracio(id_usuari, id_item, valor)
+
+    def crea_items(self, ids_items):
+        """
+        Crea els objectes ítem d'una llista de recomanacions.
+
+        Parameters
+        ----------
+        ids_items : list
+            Identificadors dels ítems.
+
+        Returns
+        -------
+        list
+            Objectes ítem, en el mateix ordre.
+        """
+        with etapa('items'):
+            return [self.crea_item(id_item, self._fitxer_items) for id_item in ids_items]
+
     def programa_principal(self):
         """
         Executa el programa principal per a la recomanació o avaluació d'ítems per a un usuari.
@@ -63,11 +185,13 @@ class Recomender(metaclass=ABCMeta):
             if accio == '1':
                 id_usuari = input("Identificador d'usuari: ")
                 logging.info(f"Recomanació per l'usuari: {id_usuari}")
-                puntuacions, ids_items_recomanats = self._recomanacio.recomana_per(id_usuari)
+                with mesura() as cronometre:
+                    puntuacions, ids_items_recomanats = self._recomanacio.recomana_per(id_usuari)
+                    items = self.crea_items(ids_items_recomanats) if puntuacions is not None else []
+                logging.info(f"Temps de la recomanació: {json.dumps(cronometre.registre())}")
                 
                 if puntuacions is not None:
-                    for id_item in ids_items_recomanats:
-                        I = self.crea_item(id_item, self._fitxer_items)
+                    for id_item, I in zip(ids_items_recomanats, items):
                         if I:
                             print('\n'+str(I))
                         else:
@@ -93,6 +217,75 @@ class Recomender(metaclass=ABCMeta):
                 logging.info('Sortint...')
                 break 
     
+    def programa_lot(self, entrada, sortida, n: int = 5, mida_bloc: int = 256, **parametres):
+        """
+        Recomana ítems als usuaris llegits d'un fitxer i n'escriu una línia JSON per usuari.
+
+        Els usuaris es llegeixen i es processen per blocs de mida_bloc, de
+        manera que el recomanador es carrega un sol cop i l'entrada pot ser
+        tan llarga com calgui.
+
+        Parameters
+        ----------
+        entrada : file
+            Fitxer amb un identificador d'usuari per línia.
+        sortida : file
+            Fitxer on s'escriuen els resultats.
+        n : int
+            Nombre d'ítems a recomanar per usuari.
+        mida_bloc : int
+            Nombre d'usuaris que es processen alhora.
+        **parametres
+            Paràmetres propis del mètode (p. ex. min_vots).
+
+        Returns
+        -------
+        int
+            Nombre d'usuaris processats.
+        """
+        ll_items = self._recomanacio.score.ll_items()
+        total = 0
+        bloc = []
+        for linia in entrada:
+            id_usuari = linia.strip()
+            if id_usuari:
+                bloc.append(id_usuari)
+            if len(bloc) == mida_bloc:
+                total += self._escriu_lot(bloc, sortida, ll_items, n, mida_bloc, parametres)
+                bloc = []
+        if bloc:
+            total += self._escriu_lot(bloc, sortida, ll_items, n, mida_bloc, parametres)
+        logging.info(f"Recomanacions per lots: {total} usuaris")
+        return total
+
+    def _escriu_lot(self, ids_usuaris, sortida, ll_items, n, mida_bloc, parametres) -> int:
+        """
+        Recomana ítems a un bloc d'usuaris i n'escriu els resultats.
+
+        Returns
+        -------
+        int
+            Nombre d'usuaris del bloc.
+        """
+        with mesura() as cronometre:
+            carregats = self._recomanacio.score.index_usuaris(ids_usuaris) >= 0
+            columnes = self._recomanacio.recomana_per_lot(ids_usuaris, n, mida_bloc, **parametres)
+            with etapa('items'):
+                linies = []
+                for id_usuari, carregat, fila in zip(ids_usuaris, carregats, columnes):
+                    if carregat:
+                        ids_items = [ll_items[c] for c in fila if c >= 0]
+                        items = [{'id': id_item, 'titol': fitxa[0] if fitxa else None}
+                                 for id_item, fitxa in zip(ids_items, self.cataleg.busca_lot(ids_items))]
+                        linies.append({'usuari': id_usuari, 'items': items})
+                    else:
+                        linies.append({'usuari': id_usuari, 'error': 'usuari no carregat'})
+        for linia in linies:
+            sortida.write(json.dumps(linia, ensure_ascii=False) + '\n')
+        sortida.flush()
+        logging.debug(f"Temps del bloc de {len(ids_usuaris)} usuaris: {json.dumps(cronometre.registre())}")
+        return len(ids_usuaris)
+
     @abstractmethod
     def crea_item(self, id_item, fitxer_items):
         """
@@ -135,7 +328,7 @@ class RecomenderMovies(Recomender):
     _fitxer_items = str
     _fitxer_valoracions = str
     
-    def __init__(self, dataset: str, method:str):
+    def __init__(self, dataset: str, method:str, k: int = 5, **parametres):
         """
         Inicialitza un nou recomanador de pel·lícules.
 
@@ -144,12 +337,16 @@ class RecomenderMovies(Recomender):
         dataset : str
             Nom del dataset a utilitzar ('Books', 'MovieLens100K').
         method : str
-            Mètode de recomanació ('simple', 'colaboratiu', 'basat en contingut').
+            Mètode de recomanació ('simple', 'colaboratiu', 'colaboratiu items', 'factoritzacio', 'basat en contingut').
+        k : int
+            Nombre de veïns del mètode col·laboratiu.
+        **parametres
+            Paràmetres de la cerca de veïns del mètode col·laboratiu (taules, bits).
         """
         
-        self._fitxer_items = 'MovieLens100k/movies.csv'
-        self._fitxer_valoracions = 'MovieLens100k/ratings.csv'
-        super().__init__(dataset, method)
+        self._fitxer_items = 'MovieLens100K/movies.csv'
+        self._fitxer_valoracions = 'MovieLens100K/ratings.csv'
+        super().__init__(dataset, method, k, **parametres)
     
     def crea_item(self, id_item, fitxer_items):
         """
@@ -169,7 +366,7 @@ class RecomenderMovies(Recomender):
         Movie
             Objecte pel·lícula.
         """
-        return Movie(id_item, fitxer_items)
+        return Movie(id_item, fitxer_items, self.cataleg)
 
 
 class RecomenderBooks(Recomender):
@@ -190,7 +387,7 @@ class RecomenderBooks(Recomender):
     _fitxer_items = str
     _fitxer_valoracions = str
     
-    def __init__(self, dataset: str, method:str):
+    def __init__(self, dataset: str, method:str, k: int = 5, **parametres):
         """
         Inicialitza un nou recomanador de pel·lícules.
 
@@ -199,12 +396,16 @@ class RecomenderBooks(Recomender):
         dataset : str
             Nom del dataset a utilitzar ('Books', 'MovieLens100K').
         method : str
-            Mètode de recomanació ('simple', 'colaboratiu', 'basat en contingut').
+            Mètode de recomanació ('simple', 'colaboratiu', 'colaboratiu items', 'factoritzacio', 'basat en contingut').
+        k : int
+            Nombre de veïns del mètode col·laboratiu.
+        **parametres
+            Paràmetres de la cerca de veïns del mètode col·laboratiu (taules, bits).
         """
         
         self._fitxer_items = 'Books/Books.csv'
         self._fitxer_valoracions = 'Books/Ratings.csv'
-        super().__init__(dataset, method)
+        super().__init__(dataset, method, k, **parametres)
     
     def crea_item(self, id_item, fitxer_items):
         """
@@ -224,7 +425,18 @@ class RecomenderBooks(Recomender):
         Book
             Objecte llibre.
         """
-        return Book(id_item, fitxer_items)
+        return Book(id_item, fitxer_items, self.cataleg)
+
+    def _crea_cataleg(self) -> Cataleg:
+        """
+        Carrega el catàleg del fitxer de llibres, amb l'autor a la tercera columna.
+
+        Returns
+        -------
+        Cataleg
+            Índex dels llibres.
+        """
+        return Cataleg(self._fitxer_items, columna_autor=2)
 
 
 class RecomenderAnimes(Recomender):
@@ -246,7 +458,7 @@ class RecomenderAnimes(Recomender):
     _fitxer_items = str
     _fitxer_valoracions = str
     
-    def __init__(self, dataset: str, method:str):
+    def __init__(self, dataset: str, method:str, k: int = 5, **parametres):
         """
         Inicialitza un nou recomanador de videojocs.
 
@@ -255,12 +467,16 @@ class RecomenderAnimes(Recomender):
         dataset : str
             Nom del dataset a utilitzar ('Books', 'MovieLens100K', 'Videogames').
         method : str
-            Mètode de recomanació ('simple', 'colaboratiu', 'basat en contingut').
+            Mètode de recomanació ('simple', 'colaboratiu', 'colaboratiu items', 'factoritzacio', 'basat en contingut').
+        k : int
+            Nombre de veïns del mètode col·laboratiu.
+        **parametres
+            Paràmetres de la cerca de veïns del mètode col·laboratiu (taules, bits).
         """
         
         self._fitxer_items = 'AnimeData/anime.csv'
         self._fitxer_valoracions = 'AnimeData/rating.csv'
-        super().__init__(dataset, method)
+        super().__init__(dataset, method, k, **parametres)
     
     def crea_item(self, id_item, fitxer_items):
         """
@@ -280,4 +496,33 @@ class RecomenderAnimes(Recomender):
         Anime
             Objecte anime.
         """
-        return Anime(id_item, fitxer_items)
+        return Anime(id_item, fitxer_items, self.cataleg)
+
+
+
+def crea_recomender(dataset: str, method: str, k: int = 5, **parametres) -> Recomender:
+    """
+    Crea el recomanador adequat per a un dataset i un mètode.
+
+    Parameters
+    ----------
+    dataset : str
+        Nom del dataset ('movielens100k', 'books' o 'animes').
+    method : str
+        Mètode de recomanació.
+    k : int
+        Nombre de veïns del mètode col·laboratiu.
+    **parametres
+        Paràmetres de la cerca de veïns del mètode col·laboratiu (taules, bits).
+
+    Returns
+    -------
+    Recomender
+        Recomanador construït a partir dels CSV.
+    """
+    if dataset == 'books':
+        return RecomenderBooks(dataset, method, k, **parametres)
+    elif dataset == 'movielens100k':
+        return RecomenderMovies(dataset, method, k, **parametres)
+    else:
+        return RecomenderAnimes(dataset, method, k, **parametres)
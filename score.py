@@ -4,27 +4,816 @@
 from abc import ABCMeta, abstractmethod
 from typing import List
 import numpy as np
+import scipy.sparse as sp
 import logging
 import math
 import csv
+import os
+from temps import etapa
+
+
+def llegeix_ids(fitxer, columna: int = 0):
+    """
+    Llegeix una columna d'identificadors d'un CSV, en una sola passada.
+
+    Parameters
+    ----------
+    fitxer : str
+        Nom del fitxer CSV, amb capçalera.
+    columna : int
+        Índex de la columna.
+
+    Returns
+    -------
+    np.ndarray
+        Identificadors com a bytes.
+    """
+    return np.loadtxt(fitxer, delimiter=',', skiprows=1, usecols=(columna,), dtype='S64',
+                      comments=None, ndmin=1, encoding='latin-1')
+
+
+def llegeix_valoracions(fitxer):
+    """
+    Llegeix les tres primeres columnes (usuari, ítem, puntuació) d'un fitxer de valoracions.
+
+    El fitxer es llegeix un sol cop amb el parser de numpy. Si alguna
+    puntuació no és un nombre, es torna a llegir com a text i aquestes
+    valoracions queden a nan.
+
+    Parameters
+    ----------
+    fitxer : str
+        Nom del fitxer CSV, amb capçalera.
+
+    Returns
+    -------
+    tuple
+        Identificadors d'usuari i d'ítem (bytes) i puntuacions (float32).
+    """
+    opcions = dict(delimiter=',', skiprows=1, usecols=(0, 1, 2), comments=None, ndmin=1, encoding='latin-1')
+    try:
+        dades = np.loadtxt(fitxer, dtype=[('usuari', 'S64'), ('item', 'S64'), ('valor', 'f4')], **opcions)
+        valors = dades['valor']
+    except ValueError:
+        dades = np.loadtxt(fitxer, dtype=[('usuari', 'S64'), ('item', 'S64'), ('valor', 'S32')], **opcions)
+        valors = a_float(dades['valor'])
+    return dades['usuari'], dades['item'], valors
+
+
+def a_dic(ids):
+    """
+    Construeix el diccionari identificador -> posició d'un array d'identificadors.
+
+    Parameters
+    ----------
+    ids : np.ndarray
+        Identificadors com a bytes, sense repeticions.
+
+    Returns
+    -------
+    dict
+        Diccionari amb els identificadors com a text.
+    """
+    return dict(zip(np.char.decode(ids, 'utf-8').tolist(), range(len(ids))))
+
+
+def a_float(valors):
+    """
+    Converteix un array de text a float, amb nan on el text no és un nombre.
+
+    Parameters
+    ----------
+    valors : np.ndarray
+        Array de text o bytes.
+
+    Returns
+    -------
+    np.ndarray
+        Array de float32.
+    """
+    try:
+        return valors.astype(np.float32)
+    except ValueError:
+        resultat = np.full(len(valors), np.nan, dtype=np.float32)
+        for i, valor in enumerate(valors):
+            try:
+                resultat[i] = float(valor)
+            except ValueError:
+                pass
+        return resultat
+
+
+def factoritza(valors, maxim=None):
+    """
+    Assigna a cada valor l'ordre en què apareix per primer cop.
+
+    Parameters
+    ----------
+    valors : np.ndarray
+        Array d'identificadors.
+    maxim : int, optional
+        Nombre màxim d'identificadors diferents; la resta tenen codi -1.
+
+    Returns
+    -------
+    tuple
+        Identificadors diferents en ordre d'aparició i codi de cada valor.
+    """
+    unics, primers, inversa = np.unique(valors, return_index=True, return_inverse=True)
+    ordre = np.argsort(primers, kind='stable')
+    codis = np.empty(len(ordre), dtype=np.int64)
+    codis[ordre] = np.arange(len(ordre))
+    codis = codis[inversa.ravel()]
+    if maxim is not None:
+        codis[codis >= maxim] = -1
+        ordre = ordre[:maxim]
+    return unics[ordre], codis
+
+
+def codis_dic(valors, dic):
+    """
+    Tradueix un array d'identificadors a codis amb un diccionari.
+
+    Parameters
+    ----------
+    valors : np.ndarray
+        Array d'identificadors com a bytes.
+    dic : dict
+        Diccionari identificador -> codi.
+
+    Returns
+    -------
+    np.ndarray
+        Codi de cada valor, -1 pels que no són al diccionari.
+    """
+    if len(dic) == 0:
+        return np.full(len(valors), -1, dtype=np.int64)
+    claus = np.char.encode(np.array(list(dic.keys())), 'utf-8')
+    codis_claus = np.fromiter(dic.values(), dtype=np.int64, count=len(dic))
+    ordre = np.argsort(claus)
+    claus, codis_claus = claus[ordre], codis_claus[ordre]
+    posicions = np.minimum(np.searchsorted(claus, valors), len(claus) - 1)
+    return np.where(claus[posicions] == valors, codis_claus[posicions], -1)
+
+
+def desglossa_dispersa(mat, prefix: str) -> dict:
+    """
+    Separa una matriu dispersa CSR o CSC en els seus tres arrays.
+
+    Parameters
+    ----------
+    mat : sp.csr_matrix o sp.csc_matrix
+        Matriu dispersa.
+    prefix : str
+        Prefix dels noms dels arrays.
+
+    Returns
+    -------
+    dict
+        Arrays data, indices i indptr de la matriu.
+    """
+    return {f'{prefix}_data': mat.data, f'{prefix}_indices': mat.indices, f'{prefix}_indptr': mat.indptr}
+
+
+def recompon_dispersa(arrays: dict, prefix: str, forma, format: str = 'csr'):
+    """
+    Torna a construir una matriu dispersa a partir dels seus tres arrays, sense copiar-los.
+
+    Parameters
+    ----------
+    arrays : dict
+        Arrays guardats amb desglossa_dispersa.
+    prefix : str
+        Prefix dels noms dels arrays.
+    forma : tuple
+        Forma de la matriu.
+    format : str
+        'csr' o 'csc'.
+
+    Returns
+    -------
+    sp.csr_matrix o sp.csc_matrix
+        Matriu dispersa.
+    """
+    classe = sp.csr_matrix if format == 'csr' else sp.csc_matrix
+    parts = (arrays[f'{prefix}_data'], arrays[f'{prefix}_indices'], arrays[f'{prefix}_indptr'])
+    return classe(parts, shape=tuple(forma), copy=False)
+
+
+def nom_delta(fitxer_valoracions: str) -> str:
+    """
+    Retorna el nom del fitxer de valoracions noves d'un fitxer de valoracions.
+
+    Parameters
+    ----------
+    fitxer_valoracions : str
+        Nom del fitxer de valoracions.
+
+    Returns
+    -------
+    str
+        Nom del fitxer de valoracions noves (p. ex. 'ratings_delta.csv').
+    """
+    arrel, _ = os.path.splitext(fitxer_valoracions)
+    return f'{arrel}_delta.csv'
+
+
+def nom_usuaris(fitxer_valoracions: str) -> str:
+    """
+    Retorna el nom del fitxer d'usuaris (Users.csv) del directori d'un fitxer de valoracions.
+
+    Parameters
+    ----------
+    fitxer_valoracions : str
+        Nom del fitxer de valoracions.
+
+    Returns
+    -------
+    str
+        Nom del fitxer d'usuaris.
+    """
+    return os.path.join(os.path.dirname(fitxer_valoracions), 'Users.csv')
+
+
+def desa_delta(fitxer, id_usuari, id_item, valor):
+    """
+    Afegeix una valoració al final del fitxer de valoracions noves.
+
+    Parameters
+    ----------
+    fitxer : str
+        Nom del fitxer de valoracions noves.
+    id_usuari : str
+        Identificador de l'usuari.
+    id_item : str
+        Identificador de l'ítem.
+    valor : float
+        Puntuació.
+    """
+    nou = not os.path.exists(fitxer)
+    with open(fitxer, 'a', encoding='utf-8', newline='') as f:
+        escriptor = csv.writer(f)
+        if nou:
+            escriptor.writerow(['usuari', 'item', 'valor'])
+        escriptor.writerow([id_usuari, id_item, valor])
+
+
+def llegeix_delta(fitxer, des_de: int = 0):
+    """
+    Llegeix les valoracions del fitxer de valoracions noves a partir d'una posició.
+
+    Parameters
+    ----------
+    fitxer : str
+        Nom del fitxer de valoracions noves.
+    des_de : int
+        Nombre de valoracions del principi que ja s'han aplicat.
+
+    Returns
+    -------
+    list
+        Tuples (id_usuari, id_item, valor) pendents d'aplicar.
+    """
+    if fitxer is None or not os.path.exists(fitxer):
+        return []
+    with open(fitxer, 'r', encoding='utf-8', newline='') as f:
+        lector = csv.reader(f)
+        next(lector, None)
+        return [(usuari, item, float(valor)) for usuari, item, valor in list(lector)[des_de:]]
+
+
+def modificable(array):
+    """
+    Retorna l'array si es pot escriure, o una còpia si és de només lectura (p. ex. projectat a memòria).
+
+    Parameters
+    ----------
+    array : np.ndarray
+        Array.
+
+    Returns
+    -------
+    np.ndarray
+        Array que es pot modificar.
+    """
+    return array if array.flags.writeable else array.copy()
+
+
+def amplia_dispersa(mat, forma):
+    """
+    Retorna una matriu dispersa amb més files o columnes buides, i arrays que es poden modificar.
+
+    Parameters
+    ----------
+    mat : sp.csr_matrix o sp.csc_matrix
+        Matriu dispersa.
+    forma : tuple
+        Forma nova (igual o més gran que l'actual).
+
+    Returns
+    -------
+    sp.csr_matrix o sp.csc_matrix
+        Matriu amb la forma nova i els índexs ordenats.
+    """
+    n_eix = forma[0] if mat.format == 'csr' else forma[1]
+    indptr = mat.indptr
+    if len(indptr) - 1 < n_eix:
+        indptr = np.concatenate([indptr, np.full(n_eix - len(indptr) + 1, indptr[-1], dtype=indptr.dtype)])
+    classe = sp.csr_matrix if mat.format == 'csr' else sp.csc_matrix
+    mat = classe((modificable(mat.data), modificable(mat.indices), modificable(indptr)), shape=tuple(forma), copy=False)
+    if not mat.has_sorted_indices:
+        mat.sort_indices()
+    return mat
+
+
+def estableix_dispersa(mat, eix: int, posicio: int, valor) -> float:
+    """
+    Escriu un valor a una matriu CSR (fila, columna) o CSC (columna, fila) sense reconstruir-la.
+
+    Parameters
+    ----------
+    mat : sp.csr_matrix o sp.csc_matrix
+        Matriu dispersa amb els índexs ordenats.
+    eix : int
+        Fila (CSR) o columna (CSC).
+    posicio : int
+        Columna (CSR) o fila (CSC).
+    valor : float
+        Valor nou.
+
+    Returns
+    -------
+    float
+        Valor anterior (0 si no n'hi havia).
+    """
+    inici, fi = mat.indptr[eix], mat.indptr[eix + 1]
+    lloc = inici + np.searchsorted(mat.indices[inici:fi], posicio)
+    if lloc < fi and mat.indices[lloc] == posicio:
+        antic = float(mat.data[lloc])
+        mat.data[lloc] = valor
+        return antic
+    mat.data = np.insert(mat.data, lloc, valor)
+    mat.indices = np.insert(mat.indices, lloc, posicio)
+    mat.indptr[eix + 1:] += 1
+    return 0.0
 
 
 class Score(metaclass=ABCMeta):
+    """
+    Classe base per a les puntuacions.
+
+    La matriu de valoracions es guarda densa o dispersa (CSR, amb una vista
+    CSC per a les operacions per columnes) segons quina ocupi menys memòria.
+
+    Attributes
+    ----------
+    _dic_usuaris : dict
+        Diccionari id d'usuari -> fila de la matriu.
+    _dic_items : dict
+        Diccionari id d'ítem -> columna de la matriu.
+    _mat : np.ndarray o sp.csr_matrix
+        Matriu de valoracions (usuaris x ítems).
+    _mat_csc : sp.csc_matrix
+        Vista per columnes de la matriu quan és dispersa, None altrament.
+    _mat_f32 : np.ndarray
+        Còpia en float32 de la matriu densa per als productes de similituds, None si no s'ha fet.
+    _versio_f32 : int
+        Versió de les valoracions de la còpia en float32.
+    _normes : np.ndarray
+        Norma euclidiana de cada fila, per al càlcul de similituds.
+    _normes_items : np.ndarray
+        Norma euclidiana de cada columna, per a les similituds entre ítems.
+    _vots_usuaris, _vots_items : np.ndarray
+        Nombre de valoracions de cada usuari i de cada ítem.
+    _sumes_usuaris, _sumes_items : np.ndarray
+        Suma de les valoracions de cada usuari i de cada ítem.
+    _mitjanes_usuaris, _mitjanes_items : np.ndarray
+        Mitjana de les valoracions de cada usuari i de cada ítem (0 si no en té).
+    _versio : int
+        Comptador que s'incrementa cada cop que canvien les valoracions.
+    _fitxer_delta : str
+        Fitxer on s'afegeixen les valoracions noves.
+    _n_delta : int
+        Nombre de valoracions del fitxer de valoracions noves ja aplicades a la matriu.
+    MAX_ITEMS : int
+        Nombre màxim d'ítems que es carreguen (None per no limitar-lo).
+    FONTS : tuple
+        Fitxers d'entrada dels quals depenen les puntuacions ('valoracions', 'items', 'usuaris').
+    """
     
     _dic_usuaris = dict 
     _dic_items = dict
     _n_usuaris = int 
     _n_items = int
     _mat = np.array
+    _mat_csc = sp.csc_matrix
+    _mat_f32 = np.array
+    _versio_f32 = int
+    _normes = np.array
+    _normes_items = np.array
+    _vots_usuaris = np.array
+    _vots_items = np.array
+    _sumes_usuaris = np.array
+    _sumes_items = np.array
+    _mitjanes_usuaris = np.array
+    _mitjanes_items = np.array
+    _versio = int
+    _fitxer_delta = str
+    _n_delta = int
+
+    AGREGATS = ('vots_usuaris', 'vots_items', 'sumes_usuaris', 'sumes_items', 'mitjanes_usuaris', 'mitjanes_items')
+    MAX_ITEMS = 50000
+    FONTS = ('valoracions',)
     
     def __init__(self, fitxer_items,fitxer_valoracions):
         self._dic_usuaris = {}
         self._dic_items = {}
         self._mat = None
+        self._mat_csc = None
+        self._mat_f32 = None
+        self._versio_f32 = -1
+        self._normes = None
+        self._normes_items = None
+        self._versio = 0
+        self._fitxer_delta = None if fitxer_valoracions is None else nom_delta(fitxer_valoracions)
+        self._n_delta = 0
 
     @property
     def mat(self):
         return self._mat
+
+    @property
+    def versio(self) -> int:
+        """
+        Versió de les valoracions, per saber si cal recalcular models derivats.
+
+        Returns
+        -------
+        int
+            Nombre de modificacions fetes a la matriu de valoracions.
+        """
+        return self._versio
+
+    @property
+    def n_usuaris(self) -> int:
+        return self._n_usuaris
+
+    @property
+    def n_items(self) -> int:
+        return self._n_items
+
+    def estat(self):
+        """
+        Retorna l'estat de les puntuacions com a metadades i arrays, per desar-lo.
+
+        Returns
+        -------
+        tuple
+            Diccionari de metadades (serialitzable a JSON) i diccionari d'arrays.
+        """
+        meta = {
+            'classe': type(self).__name__,
+            'n_usuaris': int(self._n_usuaris),
+            'n_items': int(self._n_items),
+            'versio': int(self._versio),
+            'dispersa': self.es_dispersa,
+            'fitxer_delta': self._fitxer_delta,
+            'n_delta': int(self._n_delta),
+        }
+        arrays = {
+            'ids_usuaris': np.array(self.ll_usuaris(), dtype=str),
+            'ids_items': np.array(self.ll_items(), dtype=str),
+            'normes': self._normes,
+            'normes_items': self._normes_items,
+            'vots_usuaris': self._vots_usuaris,
+            'vots_items': self._vots_items,
+            'sumes_usuaris': self._sumes_usuaris,
+            'sumes_items': self._sumes_items,
+            'mitjanes_usuaris': self._mitjanes_usuaris,
+            'mitjanes_items': self._mitjanes_items,
+        }
+        if self.es_dispersa:
+            arrays.update(desglossa_dispersa(self._mat, 'mat'))
+            arrays.update(desglossa_dispersa(self._mat_csc, 'csc'))
+        else:
+            arrays['mat'] = self._mat
+        return meta, arrays
+
+    @classmethod
+    def des_de_estat(cls, meta: dict, arrays: dict):
+        """
+        Reconstrueix unes puntuacions a partir de l'estat desat, sense rellegir els CSV.
+
+        Els arrays es fan servir tal com arriben (p. ex. projectats a memòria);
+        només els diccionaris d'identificadors es construeixen de nou.
+
+        Parameters
+        ----------
+        meta : dict
+            Metadades retornades per estat().
+        arrays : dict
+            Arrays retornats per estat().
+
+        Returns
+        -------
+        Score
+            Objecte de puntuacions.
+        """
+        score = cls.__new__(cls)
+        Score.__init__(score, None, None)
+        score._dic_usuaris = dict(zip(arrays['ids_usuaris'].tolist(), range(meta['n_usuaris'])))
+        score._dic_items = dict(zip(arrays['ids_items'].tolist(), range(meta['n_items'])))
+        score._n_usuaris, score._n_items = meta['n_usuaris'], meta['n_items']
+        score._versio = meta['versio']
+        score._fitxer_delta = meta.get('fitxer_delta')
+        score._n_delta = meta.get('n_delta', 0)
+        forma = (score._n_usuaris, score._n_items)
+        if meta['dispersa']:
+            score._mat = recompon_dispersa(arrays, 'mat', forma, 'csr')
+            score._mat_csc = recompon_dispersa(arrays, 'csc', forma, 'csc')
+        else:
+            score._mat = arrays['mat']
+        score._normes = arrays['normes']
+        score._normes_items = arrays['normes_items']
+        if 'vots_usuaris' in arrays:
+            for nom in Score.AGREGATS:
+                setattr(score, f'_{nom}', arrays[nom])
+        else:
+            score._calcula_agregats()
+        return score
+
+    @property
+    def es_dispersa(self) -> bool:
+        """
+        Indica si la matriu de valoracions es guarda en format dispers.
+
+        Returns
+        -------
+        bool
+            True si la matriu és dispersa, False si és densa.
+        """
+        return sp.issparse(self._mat)
+
+    def _construeix_matriu(self, files, columnes, valors):
+        """
+        Construeix la matriu de valoracions a partir de les coordenades.
+
+        Si un usuari ha valorat el mateix ítem més d'un cop es queda l'última
+        valoració, igual que quan s'omplia la matriu cel·la a cel·la. Es tria
+        el format dispers quan ocupa menys memòria que el dens.
+
+        Parameters
+        ----------
+        files : array_like
+            Índexs de fila (usuaris) de cada valoració.
+        columnes : array_like
+            Índexs de columna (ítems) de cada valoració.
+        valors : array_like
+            Puntuació de cada valoració.
+        """
+        files = np.asarray(files, dtype=np.int64)
+        columnes = np.asarray(columnes, dtype=np.int64)
+        valors = np.asarray(valors, dtype=np.float32)
+
+        posicions = files * self._n_items + columnes
+        _, ultimes = np.unique(posicions[::-1], return_index=True)
+        ultimes = len(posicions) - 1 - ultimes
+        no_zero = valors[ultimes] != 0
+        ultimes = ultimes[no_zero]
+        files, columnes, valors = files[ultimes], columnes[ultimes], valors[ultimes]
+
+        # Dens: 2 bytes per cel·la (float16). Dispers: dades (4) + índex (4)
+        # per valoració, duplicat per la vista CSC, més els punters.
+        bytes_dens = self._n_usuaris * self._n_items * 2
+        bytes_dispers = len(valors) * 16 + (self._n_usuaris + self._n_items + 2) * 4
+        forma = (self._n_usuaris, self._n_items)
+        if bytes_dispers < bytes_dens:
+            self._mat = sp.csr_matrix((valors, (files, columnes)), shape=forma, dtype=np.float32)
+            self._mat_csc = self._mat.tocsc()
+            logging.debug(f"Matriu dispersa: {len(valors)} valoracions ({bytes_dispers} bytes)")
+        else:
+            self._mat = np.zeros(forma, dtype='float16')
+            self._mat[files, columnes] = valors
+            self._mat_csc = None
+            logging.debug(f"Matriu densa: {forma} ({bytes_dens} bytes)")
+        self._calcula_normes()
+        self._calcula_agregats()
+
+    def _carrega_valoracions(self, ids_usuaris, ids_items, valors, max_items=None):
+        """
+        Omple els diccionaris i la matriu a partir de les columnes de valoracions.
+
+        Si els diccionaris ja estan plens, només es carreguen les valoracions
+        d'usuaris i ítems que hi són. Si no, es construeixen amb els
+        identificadors en ordre d'aparició, tallant les valoracions al primer
+        ítem que superi max_items.
+
+        Parameters
+        ----------
+        ids_usuaris : np.ndarray
+            Identificador d'usuari de cada valoració.
+        ids_items : np.ndarray
+            Identificador d'ítem de cada valoració.
+        valors : np.ndarray
+            Puntuació de cada valoració.
+        max_items : int, optional
+            Nombre màxim d'ítems a carregar.
+        """
+        with etapa('matriu'):
+            self._omple_matriu(ids_usuaris, ids_items, valors, max_items)
+        for id_usuari, id_item, valor in self.valoracions_pendents():
+            self.afegeix_valoracio(id_usuari, id_item, valor, desa=False)
+
+    def _omple_matriu(self, ids_usuaris, ids_items, valors, max_items):
+        """
+        Construeix els diccionaris i la matriu a partir de les columnes de valoracions (vegeu _carrega_valoracions).
+        """
+        if self._dic_items:
+            files = codis_dic(ids_usuaris, self._dic_usuaris)
+            columnes = codis_dic(ids_items, self._dic_items)
+        else:
+            items, columnes = factoritza(ids_items, max_items)
+            if np.any(columnes < 0):
+                tall = np.argmax(columnes < 0)
+                ids_usuaris, columnes, valors = ids_usuaris[:tall], columnes[:tall], valors[:tall]
+            usuaris, files = factoritza(ids_usuaris)
+            self._dic_usuaris = a_dic(usuaris)
+            self._dic_items = a_dic(items)
+        self._n_usuaris, self._n_items = len(self._dic_usuaris), len(self._dic_items)
+        valides = (files >= 0) & (columnes >= 0)
+        self._construeix_matriu(files[valides], columnes[valides], valors[valides])
+
+    def valoracions_pendents(self):
+        """
+        Retorna les valoracions del fitxer de valoracions noves que encara no s'han aplicat.
+
+        Returns
+        -------
+        list
+            Tuples (id_usuari, id_item, valor).
+        """
+        return llegeix_delta(self._fitxer_delta, self._n_delta)
+
+    def afegeix_valoracio(self, id_usuari, id_item, valor, desa: bool = True):
+        """
+        Afegeix o canvia una valoració sense reconstruir la matriu.
+
+        Els usuaris i ítems nous s'afegeixen al final dels diccionaris i la
+        matriu creix una fila o una columna. Les normes es corregeixen amb la
+        diferència entre el valor nou i l'antic.
+
+        Parameters
+        ----------
+        id_usuari : str
+            Identificador de l'usuari.
+        id_item : str
+            Identificador de l'ítem.
+        valor : float
+            Puntuació (diferent de zero).
+        desa : bool
+            Si cal afegir la valoració al fitxer de valoracions noves.
+
+        Returns
+        -------
+        tuple
+            Fila i columna de la valoració.
+        """
+        valor = float(valor)
+        if valor == 0:
+            raise ValueError("La valoració ha de ser diferent de zero")
+        if desa and self._fitxer_delta is not None:
+            desa_delta(self._fitxer_delta, id_usuari, id_item, valor)
+        fila = self._dic_usuaris.setdefault(id_usuari, len(self._dic_usuaris))
+        columna = self._dic_items.setdefault(id_item, len(self._dic_items))
+        self._amplia(len(self._dic_usuaris), len(self._dic_items))
+
+        if self.es_dispersa:
+            antic = estableix_dispersa(self._mat, fila, columna, valor)
+            estableix_dispersa(self._mat_csc, columna, fila, valor)
+        else:
+            antic = float(self._mat[fila, columna])
+            self._mat[fila, columna] = valor
+            if self._versio_f32 == self._versio and self._mat_f32.shape == self._mat.shape:
+                self._mat_f32[fila, columna] = self._mat[fila, columna]
+                self._versio_f32 += 1
+        diferencia = valor ** 2 - antic ** 2
+        self._normes[fila] = math.sqrt(max(self._normes[fila] ** 2 + diferencia, 0))
+        self._normes_items[columna] = math.sqrt(max(self._normes_items[columna] ** 2 + diferencia, 0))
+        nou = 1 if antic == 0 else 0
+        self._vots_usuaris[fila] += nou
+        self._vots_items[columna] += nou
+        self._sumes_usuaris[fila] += valor - antic
+        self._sumes_items[columna] += valor - antic
+        self._mitjanes_usuaris[fila] = self._sumes_usuaris[fila] / self._vots_usuaris[fila]
+        self._mitjanes_items[columna] = self._sumes_items[columna] / self._vots_items[columna]
+        self._n_delta += 1
+        self._versio += 1
+        return fila, columna
+
+    def _amplia(self, n_usuaris: int, n_items: int):
+        """
+        Fa créixer la matriu i les normes fins a la forma indicada i les fa modificables.
+
+        Parameters
+        ----------
+        n_usuaris : int
+            Nombre d'usuaris.
+        n_items : int
+            Nombre d'ítems.
+        """
+        forma = (n_usuaris, n_items)
+        if self.es_dispersa:
+            if self._mat.shape != forma or not self._mat.data.flags.writeable:
+                self._mat = amplia_dispersa(self._mat, forma)
+                self._mat_csc = amplia_dispersa(self._mat_csc, forma)
+        else:
+            mat = modificable(self._mat)
+            if mat.shape != forma:
+                mat = np.pad(mat, ((0, n_usuaris - mat.shape[0]), (0, n_items - mat.shape[1])))
+            self._mat = mat
+        for nom in ('normes',) + Score.AGREGATS[::2]:
+            array = getattr(self, f'_{nom}')
+            setattr(self, f'_{nom}', modificable(np.pad(array, (0, n_usuaris - len(array)))))
+        for nom in ('normes_items',) + Score.AGREGATS[1::2]:
+            array = getattr(self, f'_{nom}')
+            setattr(self, f'_{nom}', modificable(np.pad(array, (0, n_items - len(array)))))
+        self._n_usuaris, self._n_items = forma
+
+    def _calcula_normes(self):
+        """
+        Calcula la norma de cada fila i de cada columna de la matriu de valoracions.
+        """
+        if self.es_dispersa:
+            quadrats = self._mat.multiply(self._mat)
+            self._normes = np.sqrt(np.asarray(quadrats.sum(axis=1), dtype=np.float64).ravel())
+            self._normes_items = np.sqrt(np.asarray(quadrats.sum(axis=0), dtype=np.float64).ravel())
+        else:
+            mat = self._mat.astype(np.float32)
+            self._normes = np.linalg.norm(mat, axis=1).astype(np.float64)
+            self._normes_items = np.linalg.norm(mat, axis=0).astype(np.float64)
+
+    def _calcula_agregats(self):
+        """
+        Calcula el nombre, la suma i la mitjana de les valoracions de cada usuari i de cada ítem.
+        """
+        if self.es_dispersa:
+            self._vots_usuaris = np.diff(self._mat.indptr).astype(np.int64)
+            self._vots_items = np.diff(self._mat_csc.indptr).astype(np.int64)
+            self._sumes_usuaris = np.asarray(self._mat.sum(axis=1, dtype=np.float64)).ravel()
+            self._sumes_items = np.asarray(self._mat_csc.sum(axis=0, dtype=np.float64)).ravel()
+        else:
+            self._vots_usuaris = np.count_nonzero(self._mat, axis=1).astype(np.int64)
+            self._vots_items = np.count_nonzero(self._mat, axis=0).astype(np.int64)
+            self._sumes_usuaris = self._mat.sum(axis=1, dtype=np.float64)
+            self._sumes_items = self._mat.sum(axis=0, dtype=np.float64)
+        self._mitjanes_usuaris = np.zeros(len(self._vots_usuaris))
+        np.divide(self._sumes_usuaris, self._vots_usuaris, out=self._mitjanes_usuaris, where=self._vots_usuaris != 0)
+        self._mitjanes_items = np.zeros(len(self._vots_items))
+        np.divide(self._sumes_items, self._vots_items, out=self._mitjanes_items, where=self._vots_items != 0)
+
+    def vots_items(self):
+        """
+        Retorna el nombre de valoracions de cada ítem.
+
+        Returns
+        -------
+        np.ndarray
+            Vector amb el nombre de vots de cada columna.
+        """
+        return self._vots_items
+
+    def mitjanes_items(self):
+        """
+        Retorna la puntuació mitjana de cada ítem, sense comptar els zeros.
+
+        Returns
+        -------
+        np.ndarray
+            Vector amb la mitjana de cada columna (0 si no té vots).
+        """
+        return self._mitjanes_items
+
+    def mitjanes_usuaris(self):
+        """
+        Retorna la puntuació mitjana de cada usuari, sense comptar els zeros.
+
+        Returns
+        -------
+        np.ndarray
+            Vector amb la mitjana de cada fila (0 si no té vots).
+        """
+        return self._mitjanes_usuaris
+
+    def vots_usuaris(self):
+        """
+        Retorna el nombre de valoracions de cada usuari.
+
+        Returns
+        -------
+        np.ndarray
+            Vector amb el nombre de vots de cada fila.
+        """
+        return self._vots_usuaris
     
     def ll_items(self):
         """
@@ -47,6 +836,57 @@ class Score(metaclass=ABCMeta):
         """
         return list(self._dic_usuaris.keys())
 
+    def index_usuari(self, id_usuari) -> int:
+        """
+        Retorna la fila de la matriu corresponent a un usuari.
+
+        Parameters
+        ----------
+        id_usuari : str
+            Identificador de l'usuari.
+
+        Returns
+        -------
+        int
+            Índex de fila de l'usuari.
+        """
+        return self._dic_usuaris[id_usuari]
+
+    def index_usuaris(self, ids_usuaris):
+        """
+        Retorna les files de la matriu corresponents a una llista d'usuaris.
+
+        Parameters
+        ----------
+        ids_usuaris : list
+            Identificadors dels usuaris.
+
+        Returns
+        -------
+        np.ndarray
+            Índex de fila de cada usuari, -1 pels usuaris no carregats.
+        """
+        return np.array([self._dic_usuaris.get(id_usuari, -1) for id_usuari in ids_usuaris], dtype=np.int64)
+
+    def files_puntuacions(self, files):
+        """
+        Retorna les valoracions d'unes quantes files, en el format de la matriu.
+
+        Parameters
+        ----------
+        files : array_like
+            Índexs de fila dels usuaris.
+
+        Returns
+        -------
+        sp.csr_matrix o np.ndarray
+            Submatriu (len(files) x n_items) de valoracions.
+        """
+        files = np.asarray(files, dtype=np.int64)
+        if self.es_dispersa:
+            return self._mat[files]
+        return self._mat[files].astype(np.float32)
+
     def min_vots(self,min_vots):
         """
         Retorna una llista d'ítems amb un mínim de vots.
@@ -61,7 +901,7 @@ class Score(metaclass=ABCMeta):
         list
             Llista amb els ids dels ítems amb un mínim de vots.
         """
-        vector_num_vots = np.count_nonzero(self._mat, axis=0)
+        vector_num_vots = self.vots_items()
         uu = np.array(list(self._dic_items.keys()))
         ll = uu[vector_num_vots >= min_vots]
         return ll.tolist()
@@ -80,12 +920,7 @@ class Score(metaclass=ABCMeta):
         float
             Puntuació mitjana de l'usuari.
         """
-        fila=self._mat[self._dic_usuaris[id_usuari],:]
-        sense_zeros = fila[fila != 0]
-        if np.size(sense_zeros) != 0:
-            return np.mean(sense_zeros)
-        else:
-            return 0
+        return self._mitjanes_usuaris[self._dic_usuaris[id_usuari]]
     
     def avg_item(self, id_item) -> float:
         """
@@ -101,12 +936,7 @@ class Score(metaclass=ABCMeta):
         float
             Puntuació mitjana de l'ítem.
         """
-        columna = self._mat[:,self._dic_items.get(id_item)]
-        sense_zeros = columna[columna != 0]
-        if len(sense_zeros) == 0:
-            return 0
-        else:
-            return np.mean(sense_zeros)
+        return self._mitjanes_items[self._dic_items[id_item]]
         
     def num_vots(self, id_item):
         """
@@ -122,8 +952,7 @@ class Score(metaclass=ABCMeta):
         int
             Nombre de vots de l'ítem.
         """
-        columna = self._mat[:, self._dic_items[id_item]]
-        return np.count_nonzero(columna)
+        return int(self._vots_items[self._dic_items[id_item]])
     
     def avg_global(self, ll_id_items):
         """
@@ -139,7 +968,8 @@ class Score(metaclass=ABCMeta):
         float
             Puntuació mitjana global dels ítems considerats.
         """
-        return np.mean(np.array([self.avg_item(id_item) for id_item in ll_id_items]))
+        columnes = [self._dic_items[id_item] for id_item in ll_id_items]
+        return np.mean(self.mitjanes_items()[columnes])
 
     def no_vista(self, id_usuari, id_item):
         """
@@ -178,25 +1008,131 @@ class Score(metaclass=ABCMeta):
         float
             Similitud entre els dos usuaris.
         """
-        numerador=0
-        denominador1=0
-        denominador2=0
-        index_usu_client=self._dic_usuaris[usuari_client]
-        index_usu_sec=self._dic_usuaris[usuari_secundari]
-        num_rows, _ = self._mat.shape
-        for j in range(num_rows):
-            v_usuari_client=self._mat[index_usu_client][j]
-            v_usuari_secundari=self._mat[index_usu_sec][j]
-            if v_usuari_client!=0 and v_usuari_secundari!=0:
-                numerador+=v_usuari_client*v_usuari_secundari
-                denominador1+=(v_usuari_secundari)**2
-                denominador2+=(v_usuari_client)**2
+        v_usuari_client = self.vector_puntuacions(usuari_client).astype(np.float64)
+        v_usuari_secundari = self.vector_puntuacions(usuari_secundari).astype(np.float64)
+        comuns = (v_usuari_client != 0) & (v_usuari_secundari != 0)
+        numerador = np.dot(v_usuari_client[comuns], v_usuari_secundari[comuns])
+        denominador1 = np.dot(v_usuari_secundari[comuns], v_usuari_secundari[comuns])
+        denominador2 = np.dot(v_usuari_client[comuns], v_usuari_client[comuns])
         
         if numerador!=0 and denominador1!=0 and denominador2!=0:
             return numerador/(math.sqrt(denominador1)*math.sqrt(denominador2))
         else:
             return 0
      
+    def _densa_f32(self) -> np.ndarray:
+        """
+        Retorna la matriu densa en float32, convertida un sol cop per a cada versió de les valoracions.
+
+        Returns
+        -------
+        np.ndarray
+            Matriu (n_usuaris x n_items) en float32.
+        """
+        if self._versio_f32 != self._versio:
+            self._mat_f32 = self._mat.astype(np.float32)
+            self._versio_f32 = self._versio
+        return self._mat_f32
+
+    def similituds_files(self, files, usuaris=None):
+        """
+        Calcula la similitud cosinus d'unes quantes files contra tots els usuaris, o contra una part.
+
+        Parameters
+        ----------
+        files : array_like
+            Índexs de les files (usuaris) de consulta.
+        usuaris : slice o array_like, optional
+            Tram o índexs de les files contra les quals es calcula; per defecte, totes.
+
+        Returns
+        -------
+        np.ndarray
+            Matriu (len(files) x usuaris indicats) de similituds.
+        """
+        files = np.asarray(files, dtype=np.int64)
+        usuaris = slice(None) if usuaris is None else usuaris
+        if self.es_dispersa:
+            productes = (self._mat[files] @ self._mat[usuaris].T).toarray()
+        else:
+            mat = self._densa_f32()
+            productes = mat[files] @ mat[usuaris].T
+        normes = np.outer(self._normes[files], self._normes[usuaris])
+        similituds = np.zeros(productes.shape)
+        np.divide(productes, normes, out=similituds, where=normes != 0)
+        return similituds
+
+    def similituds_candidats(self, fila: int, candidats):
+        """
+        Calcula la similitud cosinus d'un usuari només amb uns quants candidats.
+
+        Parameters
+        ----------
+        fila : int
+            Índex de fila de l'usuari.
+        candidats : array_like
+            Índexs de fila dels candidats.
+
+        Returns
+        -------
+        np.ndarray
+            Vector de similituds, en l'ordre dels candidats.
+        """
+        candidats = np.asarray(candidats, dtype=np.int64)
+        if self.es_dispersa:
+            productes = (self._mat[candidats] @ self._mat[fila].T).toarray().ravel()
+        else:
+            mat = self._densa_f32()
+            productes = mat[candidats] @ mat[fila]
+        normes = self._normes[candidats] * self._normes[fila]
+        similituds = np.zeros(len(candidats))
+        np.divide(productes, normes, out=similituds, where=normes != 0)
+        return similituds
+
+    def similituds_columnes(self, columnes):
+        """
+        Calcula la similitud cosinus d'unes quantes columnes contra tots els ítems.
+
+        Parameters
+        ----------
+        columnes : array_like
+            Índexs de les columnes (ítems) de consulta.
+
+        Returns
+        -------
+        np.ndarray
+            Matriu (len(columnes) x n_items) de similituds.
+        """
+        columnes = np.asarray(columnes, dtype=np.int64)
+        if self.es_dispersa:
+            productes = (self._mat_csc[:, columnes].T @ self._mat_csc).toarray()
+        else:
+            mat = self._densa_f32()
+            productes = mat[:, columnes].T @ mat
+        normes = np.outer(self._normes_items[columnes], self._normes_items)
+        similituds = np.zeros(productes.shape)
+        np.divide(productes, normes, out=similituds, where=normes != 0)
+        return similituds
+
+    def similituds(self, id_usuari):
+        """
+        Calcula la similitud cosinus d'un usuari amb tots els usuaris.
+
+        El producte escalar només acumula els ítems valorats pels dos usuaris
+        i es divideix per les normes precalculades de les files completes.
+
+        Parameters
+        ----------
+        id_usuari : str
+            Identificador de l'usuari.
+
+        Returns
+        -------
+        np.ndarray
+            Vector de similituds, en l'ordre de ll_usuaris().
+        """
+        return self.similituds_files([self._dic_usuaris[id_usuari]])[0]
+
     def vector_puntuacions(self, id_user):
         """
         Retorna el vector de puntuacions d'un usuari.
@@ -211,7 +1147,10 @@ class Score(metaclass=ABCMeta):
         np.ndarray
             Vector de puntuacions de l'usuari.
         """
-        return self._mat[self._dic_usuaris[id_user],:]
+        fila = self._dic_usuaris[id_user]
+        if self.es_dispersa:
+            return self._mat.getrow(fila).toarray().ravel()
+        return self._mat[fila,:]
     
     def max(self):
         """
@@ -226,7 +1165,7 @@ class Score(metaclass=ABCMeta):
     
     def item_features(self, fitxer_items):
         """
-        Retorna les característiques dels ítems.
+        Retorna les característiques dels ítems, en l'ordre de les columnes de la matriu.
 
         Parameters
         ----------
@@ -236,21 +1175,21 @@ class Score(metaclass=ABCMeta):
         Returns
         -------
         list
-            Llista de característiques dels ítems.
+            Llista de característiques dels ítems ('' si l'ítem no és al fitxer).
         """
-        item_features = []
+        features = {}
         with open(fitxer_items, 'r', encoding='utf-8') as f:
             next(f)
             reader = csv.reader(f)
             for line in reader:
-                if len(item_features) < 50000:
+                if self.MAX_ITEMS is None or len(features) < self.MAX_ITEMS:
                     generes = line[-1]
                     id_item = line[0]
-                    if id_item in self._dic_items:
-                        item_features.append(generes)
+                    if id_item in self._dic_items and id_item not in features:
+                        features[id_item] = generes
                 else:
                     break
-        return item_features
+        return [features.get(id_item, '') for id_item in self._dic_items]
       
     def usuari_a_avaluar(self):
         """
@@ -262,9 +1201,10 @@ class Score(metaclass=ABCMeta):
             Id del primer usuari amb el que podem utilitzar la opció avaluació.
         """
         ha_puntuat = False
+        vots_usuaris = self.vots_usuaris()
         i = 0
         while not ha_puntuat:
-            if np.count_nonzero(self._mat[i,:]) != 0:
+            if vots_usuaris[i] != 0:
                 usuari_rata = list(self._dic_usuaris.keys())[i]
                 ha_puntuat = True
             i += 1
@@ -300,32 +1240,10 @@ class ScoreMovies(Score):
         super().__init__(fitxer_items, fitxer_valoracions) 
         
         logging.info("Inicialitzant ScoreMovies")
-        with open(fitxer_valoracions, 'r') as f:
-            next(f) 
-            i_usu = 0
-            i_item = 0
-            for line in f:
-                if len(self._dic_items) < 50000:
-                    id_usuari, id_item, _ , _ = line.strip().split(',')
-                    if id_usuari not in self._dic_usuaris.keys():
-                        self._dic_usuaris[id_usuari] = i_usu
-                        i_usu += 1
-                    if id_item not in self._dic_items.keys():    
-                        self._dic_items[id_item] = i_item
-                        i_item += 1
-                else:
-                    break
-
-        self._n_usuaris, self._n_items = len(self._dic_usuaris), len(self._dic_items)
-        self._mat = np.zeros((self._n_usuaris, self._n_items), dtype='float16')
-        
         logging.info("Carregant dades de valoracions")
-        with open(fitxer_valoracions, 'r') as f:
-            next(f) 
-            for line in f:
-                id_usuari, id_item, score, _ = line.strip().split(',')
-                score = float(score)
-                self._mat[self._dic_usuaris[id_usuari], self._dic_items[id_item]] = score 
+        with etapa('carrega'):
+            ids_usuaris, ids_items, valors = llegeix_valoracions(fitxer_valoracions)
+        self._carrega_valoracions(ids_usuaris, ids_items, valors, max_items=self.MAX_ITEMS)
         
         logging.debug(f"Usuaris carregats: {self._n_usuaris}")
         logging.debug(f"Pelis carregades: {self._n_items}")
@@ -335,6 +1253,19 @@ class ScoreBooks(Score):
     """
     Classe per calcular puntuacions de llibres.
 
+    Els usuaris es llegeixen de Users.csv, al mateix directori que el fitxer de valoracions.
+
+    Attributes
+    ----------
+    MAX_ITEMS : int
+        Nombre màxim de llibres que es carreguen (None per no limitar-lo).
+    MAX_USUARIS : int
+        Nombre màxim d'usuaris que es carreguen (None per no limitar-lo).
+    MAX_VALORACIONS : int
+        Nombre màxim de valoracions que es llegeixen (None per no limitar-lo).
+    FONTS : tuple
+        Les valoracions, els llibres i els usuaris.
+
     Methods
     -------
     __init__(fitxer_items, fitxer_valoracions)
@@ -345,6 +1276,11 @@ class ScoreBooks(Score):
     _ll_items = dict
     _n_usuaris = int 
     _n_items = int
+
+    MAX_ITEMS = 10000
+    MAX_USUARIS = 7000
+    MAX_VALORACIONS = 600000
+    FONTS = ('valoracions', 'items', 'usuaris')
     
     def __init__(self, fitxer_items,fitxer_valoracions):
         """
@@ -360,52 +1296,17 @@ class ScoreBooks(Score):
         super().__init__(fitxer_items, fitxer_valoracions) 
         
         logging.info("Inicialitzant ScoreBooks")
-        i_item = 0
-        with open(fitxer_items, 'r') as f:
-           next(f)
-           for line in f:
-               if len(self._dic_items) < 10000:
-                   line=line.strip().split(',')
-                   id_item = line[0]
-                   if id_item not in self._dic_items.keys():
-                       self._dic_items[id_item] = i_item
-                       i_item += 1
-               else:
-                   break 
-        i_usu = 0
-        with open('Books/Users.csv') as f:
-            next(f)
-            for line in f:
-                if len(self._dic_usuaris) < 7000:
-                    line=line.strip().split(',')
-                    id_usuari = line[0]
-                    if id_usuari not in self._dic_usuaris.keys():
-                        self._dic_usuaris[id_usuari] = i_usu
-                        i_usu += 1
-                else:
-                    break
-
-        self._n_usuaris, self._n_items = len(self._dic_usuaris), len(self._dic_items)
-        self._mat = np.zeros((self._n_usuaris, self._n_items), dtype='float16')
+        with etapa('carrega'):
+            items, _ = factoritza(llegeix_ids(fitxer_items), self.MAX_ITEMS)
+            self._dic_items = a_dic(items)
+            usuaris, _ = factoritza(llegeix_ids(nom_usuaris(fitxer_valoracions)), self.MAX_USUARIS)
+            self._dic_usuaris = a_dic(usuaris)
 
         logging.info("Carregant dades de valoracions")
-        with open(fitxer_valoracions, 'r') as f:
-            next(f) 
-            i = 0
-            for line in f:
-                if i < 600000:
-                    line = line.strip().split(',')
-                    id_usuari = line[0]
-                    id_item = line[1]
-                    try:
-                        score = float(line[2])
-                        if (id_usuari in self._dic_usuaris) and (id_item in self._dic_items):
-                            self._mat[self._dic_usuaris[id_usuari], self._dic_items[id_item]] = score
-                        i += 1
-                    except ValueError:
-                        pass
-                else:
-                   break
+        with etapa('carrega'):
+            ids_usuaris, ids_items, valors = llegeix_valoracions(fitxer_valoracions)
+        primeres = np.flatnonzero(~np.isnan(valors))[:self.MAX_VALORACIONS]
+        self._carrega_valoracions(ids_usuaris[primeres], ids_items[primeres], valors[primeres])
         logging.debug(f"Usuaris carregats: {self._n_usuaris}")
         logging.debug(f"Llibres carregats: {self._n_items}")
     
@@ -439,31 +1340,10 @@ class ScoreAnimes(Score):
         super().__init__(fitxer_items, fitxer_valoracions) 
         
         logging.info("Inicialitzant ScoreAnimes")      
-        with open(fitxer_valoracions, 'r') as f:
-            next(f)
-            i_usu = 0
-            i_item = 0
-            for line in f:
-                if len(self._dic_items) < 50000:
-                    id_usuari, id_item, _ = line.strip().split(',')
-                    if id_usuari not in self._dic_usuaris:
-                        self._dic_usuaris[id_usuari] = i_usu
-                        i_usu += 1
-                    if id_item not in self._dic_items:    
-                        self._dic_items[id_item] = i_item
-                        i_item += 1
-                else:
-                    break
-
-        self._n_usuaris, self._n_items = len(self._dic_usuaris), len(self._dic_items)
-        self._mat = np.zeros((self._n_usuaris, self._n_items), dtype='float16')
-        
         logging.info("Carregant dades de valoracions")
-        with open(fitxer_valoracions, 'r') as f:
-            next(f) 
-            for line in f:
-                id_usuari, id_item, score = line.strip().split(',')
-                score = 0 if float(score) == -1 else float(score)
-                self._mat[self._dic_usuaris[id_usuari], self._dic_items[id_item]] = score
+        with etapa('carrega'):
+            ids_usuaris, ids_items, valors = llegeix_valoracions(fitxer_valoracions)
+        valors[valors == -1] = 0
+        self._carrega_valoracions(ids_usuaris, ids_items, valors, max_items=self.MAX_ITEMS)
         logging.debug(f"Usuaris carregats: {self._n_usuaris}")
         logging.debug(f"Animes carregats: {self._n_items}")
\ No newline at end of file
@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from urllib.parse import urlsplit, parse_qs
+from instantania import carrega_o_crea
+from avaluacio import avalua
+from memoria_compartida import PublicacioCompartida
+from recomender import Recomender
+from temps import etapa, mesura
+import asyncio
+import json
+import logging
+
+
+ESTATS_HTTP = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+               500: 'Internal Server Error'}
+
+
+class ErrorPeticio(Exception):
+    """
+    Error d'una petició que es retorna al client amb un codi HTTP.
+    """
+
+    def __init__(self, codi: int, missatge: str):
+        super().__init__(missatge)
+        self.codi = codi
+
+
+class Servidor():
+    """
+    Servidor HTTP/JSON de recomanacions per a un dataset.
+
+    Cada mètode es carrega un sol cop, el primer cop que es demana, i es
+    manté en memòria. Els càlculs es fan en un executor perquè el bucle
+    d'esdeveniments continuï acceptant connexions. Amb més d'un procés,
+    cada mètode es publica un cop en memòria compartida i els processos que
+    avaluen s'hi enganxen en lloc de rebre'n una còpia.
+
+    Endpoints (GET):
+        /recomana?usuari=ID&metode=M&n=5&min_vots=10
+        /avalua?usuari=ID&metode=M&min_vots=10   (sense usuari: tots)
+
+    Attributes
+    ----------
+    _dataset : str
+        Nom del dataset.
+    _metode : str
+        Mètode per defecte.
+    _k : int
+        Nombre de veïns del mètode col·laboratiu.
+    _processos : int
+        Processos de les avaluacions.
+    _recomenders : dict
+        Recomanadors carregats, per mètode.
+    _publicacions : dict
+        Recomanacions publicades en memòria compartida, per mètode (només amb més d'un procés).
+    _carregues : dict
+        Càrregues en curs, per mètode, perquè dues peticions no carreguin el mateix.
+
+    Methods
+    -------
+    serveix(host, port)
+        Escolta peticions fins que s'atura el procés.
+    tanca()
+        Allibera la memòria compartida de les recomanacions publicades.
+    """
+    _dataset = str
+    _metode = str
+    _k = int
+    _processos = int
+    _recomenders = dict
+    _publicacions = dict
+    _carregues = dict
+
+    METODES = ['simple', 'colaboratiu', 'colaboratiu items', 'factoritzacio', 'basat en contingut']
+
+    # Cap endpoint fa servir el cos; se n'accepta un de petit i es descarta.
+    MIDA_MAXIMA_COS = 64 * 1024
+
+    def __init__(self, dataset: str, metode: str, k: int = 5, recomender: Recomender = None, processos: int = 1):
+        """
+        Inicialitza el servidor.
+
+        Parameters
+        ----------
+        dataset : str
+            Nom del dataset.
+        metode : str
+            Mètode per defecte de les peticions que no n'indiquen cap.
+        k : int
+            Nombre de veïns del mètode col·laboratiu.
+        recomender : Recomender, optional
+            Recomanador del mètode per defecte, si ja està carregat.
+        processos : int
+            Processos de les avaluacions.
+        """
+        self._dataset = dataset
+        self._metode = metode
+        self._k = k
+        self._processos = processos
+        self._recomenders = {}
+        self._publicacions = {}
+        self._carregues = {}
+        if recomender is not None:
+            self._registra(metode, recomender)
+
+    def _registra(self, metode: str, recomender: Recomender):
+        """
+        Guarda el recomanador d'un mètode i, amb més d'un procés, el publica en memòria compartida.
+
+        Parameters
+        ----------
+        metode : str
+            Mètode de recomanació.
+        recomender : Recomender
+            Recomanador carregat.
+        """
+        self._recomenders[metode] = recomender
+        if self._processos > 1:
+            self._publicacions[metode] = PublicacioCompartida(recomender.recomanacio)
+
+    def tanca(self):
+        """
+        Allibera la memòria compartida de les recomanacions publicades.
+        """
+        for publicacio in self._publicacions.values():
+            publicacio.tanca()
+        self._publicacions = {}
+
+    async def _recomender(self, metode: str) -> Recomender:
+        """
+        Retorna el recomanador d'un mètode, carregant-lo el primer cop.
+
+        Parameters
+        ----------
+        metode : str
+            Mètode de recomanació.
+
+        Returns
+        -------
+        Recomender
+            Recomanador del mètode.
+        """
+        if metode not in self.METODES:
+            raise ErrorPeticio(400, f"Mètode desconegut: {metode}")
+        if metode not in self._recomenders:
+            if metode not in self._carregues:
+                logging.info(f"Carregant el mètode {metode}")
+                self._carregues[metode] = asyncio.get_running_loop().run_in_executor(
+                    None, carrega_o_crea, self._dataset, metode, self._k)
+            try:
+                recomender = await self._carregues[metode]
+                if metode not in self._recomenders:
+                    self._registra(metode, recomender)
+            finally:
+                self._carregues.pop(metode, None)
+        return self._recomenders[metode]
+
+    @staticmethod
+    def _parametre_enter(parametres: dict, nom: str, defecte: int = None) -> int:
+        """
+        Llegeix un paràmetre enter de la consulta.
+
+        Parameters
+        ----------
+        parametres : dict
+            Paràmetres de la consulta.
+        nom : str
+            Nom del paràmetre.
+        defecte : int, optional
+            Valor si el paràmetre no hi és.
+
+        Returns
+        -------
+        int
+            Valor del paràmetre.
+        """
+        if nom not in parametres:
+            return defecte
+        try:
+            return int(parametres[nom])
+        except ValueError:
+            raise ErrorPeticio(400, f"El paràmetre {nom} ha de ser un enter")
+
+    async def _recomana(self, parametres: dict) -> dict:
+        """
+        Atén una petició de recomanació.
+
+        Parameters
+        ----------
+        parametres : dict
+            usuari, i opcionalment metode, n i min_vots.
+
+        Returns
+        -------
+        dict
+            Usuari, mètode i ítems recomanats amb el títol.
+        """
+        if 'usuari' not in parametres:
+            raise ErrorPeticio(400, "Falta el paràmetre usuari")
+        id_usuari = parametres['usuari']
+        metode = parametres.get('metode', self._metode)
+        n = self._parametre_enter(parametres, 'n', 5)
+        min_vots = self._parametre_enter(parametres, 'min_vots', 10)
+        if n <= 0:
+            raise ErrorPeticio(400, "El paràmetre n ha de ser positiu")
+        r = await self._recomender(metode)
+        if r.recomanacio.score.index_usuaris([id_usuari])[0] < 0:
+            raise ErrorPeticio(404, f"Usuari no carregat: {id_usuari}")
+        extra = {'min_vots': min_vots} if metode == 'simple' else {}
+        return await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self._recomana_sincron(r, id_usuari, metode, n, extra))
+
+    @staticmethod
+    def _recomana_sincron(r: Recomender, id_usuari: str, metode: str, n: int, extra: dict) -> dict:
+        """
+        Calcula una recomanació fora del bucle d'esdeveniments i en mesura el temps de cada etapa.
+
+        Returns
+        -------
+        dict
+            Usuari, mètode, ítems recomanats amb el títol i temps per etapa.
+        """
+        with mesura() as cronometre:
+            columnes = r.recomanacio.recomana_per_lot([id_usuari], n, **extra)[0]
+            with etapa('items'):
+                ll_items = r.recomanacio.score.ll_items()
+                ids_items = [ll_items[c] for c in columnes if c >= 0]
+                items = []
+                for id_item, fitxa in zip(ids_items, r.cataleg.busca_lot(ids_items)):
+                    items.append({'id': id_item, 'titol': fitxa[0] if fitxa else None})
+        temps = cronometre.registre()
+        logging.debug(f"Temps de la recomanació per {id_usuari}: {json.dumps(temps)}")
+        return {'usuari': id_usuari, 'metode': metode, 'items': items, 'temps': temps}
+
+    async def _avalua(self, parametres: dict) -> dict:
+        """
+        Atén una petició d'avaluació.
+
+        Parameters
+        ----------
+        parametres : dict
+            Opcionalment usuari, metode, mostra i min_vots.
+
+        Returns
+        -------
+        dict
+            Resultat de avaluacio.avalua.
+        """
+        metode = parametres.get('metode', self._metode)
+        mostra = self._parametre_enter(parametres, 'mostra')
+        min_vots = self._parametre_enter(parametres, 'min_vots', 10)
+        r = await self._recomender(metode)
+        ids_usuaris = [parametres['usuari']] if 'usuari' in parametres else None
+        if ids_usuaris is not None and r.recomanacio.score.index_usuaris(ids_usuaris)[0] < 0:
+            raise ErrorPeticio(404, f"Usuari no carregat: {ids_usuaris[0]}")
+        extra = {'min_vots': min_vots} if metode == 'simple' else {}
+        publicacio = self._publicacions.get(metode)
+        descriptor = publicacio.descriptor if publicacio is not None else None
+        return await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self._avalua_sincron(r, ids_usuaris, mostra, extra, self._processos, descriptor))
+
+    @staticmethod
+    def _avalua_sincron(r: Recomender, ids_usuaris: list, mostra: int, extra: dict, processos: int = 1,
+                        descriptor: dict = None) -> dict:
+        """
+        Avalua fora del bucle d'esdeveniments i afegeix al resultat el temps de cada etapa.
+
+        Amb més d'un procés, els processos s'enganxen a la publicació del
+        descriptor en lloc de publicar la recomanació a cada petició.
+        """
+        with mesura() as cronometre:
+            resultat = avalua(r.recomanacio, ids_usuaris, mostra=mostra, processos=processos, descriptor=descriptor,
+                              **extra)
+        resultat['temps'] = cronometre.registre()
+        return resultat
+
+    async def _respon(self, metode_http: str, ruta: str) -> dict:
+        """
+        Encamina una petició a l'endpoint que toca.
+
+        Parameters
+        ----------
+        metode_http : str
+            Mètode HTTP de la petició.
+        ruta : str
+            Ruta amb la consulta.
+
+        Returns
+        -------
+        dict
+            Cos de la resposta.
+        """
+        url = urlsplit(ruta)
+        parametres = {nom: valors[-1] for nom, valors in parse_qs(url.query).items()}
+        endpoints = {'/recomana': self._recomana, '/avalua': self._avalua}
+        if url.path not in endpoints:
+            raise ErrorPeticio(404, f"Ruta desconeguda: {url.path}")
+        if metode_http != 'GET':
+            raise ErrorPeticio(405, f"Mètode HTTP no permès: {metode_http}")
+        return await endpoints[url.path](parametres)
+
+    @staticmethod
+    async def _llegeix_linia(lector: asyncio.StreamReader) -> str:
+        """
+        Llegeix una línia de la petició.
+
+        Raises
+        ------
+        ErrorPeticio
+            Si la línia supera el límit del lector.
+        """
+        try:
+            return (await lector.readline()).decode('latin-1')
+        except (ValueError, asyncio.LimitOverrunError):
+            raise ErrorPeticio(400, "Línia de la petició massa llarga")
+
+    async def _llegeix_peticio(self, lector: asyncio.StreamReader):
+        """
+        Llegeix la línia de petició, les capçaleres i el cos (que es descarta).
+
+        Parameters
+        ----------
+        lector : asyncio.StreamReader
+            Flux d'entrada de la connexió.
+
+        Returns
+        -------
+        tuple
+            Mètode HTTP, ruta, versió i capçaleres, o None si el client ha tancat la connexió.
+
+        Raises
+        ------
+        ErrorPeticio
+            400 si la petició està mal formada i 413 si el cos supera MIDA_MAXIMA_COS.
+        """
+        linia = await self._llegeix_linia(lector)
+        if not linia.strip():
+            return None
+        try:
+            metode_http, ruta, versio = linia.split()
+        except ValueError:
+            raise ErrorPeticio(400, "Línia de petició incorrecta")
+        capcaleres = {}
+        while True:
+            capcalera = await self._llegeix_linia(lector)
+            if not capcalera.strip():
+                break
+            nom, _, valor = capcalera.partition(':')
+            capcaleres[nom.strip().lower()] = valor.strip().lower()
+        try:
+            llargada = int(capcaleres.get('content-length', 0) or 0)
+        except ValueError:
+            raise ErrorPeticio(400, "Capçalera Content-Length incorrecta")
+        if llargada < 0:
+            raise ErrorPeticio(400, "Capçalera Content-Length incorrecta")
+        if llargada > self.MIDA_MAXIMA_COS:
+            raise ErrorPeticio(413, f"El cos de la petició supera {self.MIDA_MAXIMA_COS} bytes")
+        if llargada:
+            await lector.readexactly(llargada)
+        return metode_http, ruta, versio, capcaleres
+
+    @staticmethod
+    async def _envia(escriptor: asyncio.StreamWriter, codi: int, cos: dict, mante: bool):
+        """
+        Escriu una resposta JSON.
+        """
+        dades = json.dumps(cos, ensure_ascii=False).encode('utf-8')
+        escriptor.write((f"HTTP/1.1 {codi} {ESTATS_HTTP[codi]}\r\n"
+                         f"Content-Type: application/json; charset=utf-8\r\n"
+                         f"Content-Length: {len(dades)}\r\n"
+                         f"Connection: {'keep-alive' if mante else 'close'}\r\n\r\n").encode('latin-1') + dades)
+        await escriptor.drain()
+
+    @staticmethod
+    async def _descarta(lector: asyncio.StreamReader, escriptor: asyncio.StreamWriter, limit: int = 1 << 20,
+                        espera: float = 1.0):
+        """
+        Tanca l'escriptura i descarta el que el client encara envia abans de tancar la connexió.
+
+        Si es tanca amb dades pendents de llegir, el sistema respon amb un
+        reset i el client pot perdre la resposta d'error que ja s'ha enviat.
+        """
+        if escriptor.can_write_eof():
+            escriptor.write_eof()
+        try:
+            async def buida():
+                llegits = 0
+                while llegits < limit:
+                    dades = await lector.read(64 * 1024)
+                    if not dades:
+                        break
+                    llegits += len(dades)
+            await asyncio.wait_for(buida(), espera)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+
+    async def _aten(self, lector: asyncio.StreamReader, escriptor: asyncio.StreamWriter):
+        """
+        Atén les peticions d'una connexió, mentre el client la mantingui oberta.
+
+        Una petició mal formada es respon amb un error i es tanca la
+        connexió, perquè ja no se sap on comença la següent.
+
+        Parameters
+        ----------
+        lector : asyncio.StreamReader
+            Flux d'entrada de la connexió.
+        escriptor : asyncio.StreamWriter
+            Flux de sortida de la connexió.
+        """
+        try:
+            while True:
+                try:
+                    peticio = await self._llegeix_peticio(lector)
+                except ErrorPeticio as e:
+                    logging.info(f"Petició rebutjada -> {e.codi}: {e}")
+                    await self._envia(escriptor, e.codi, {'error': str(e)}, False)
+                    await self._descarta(lector, escriptor)
+                    break
+                if peticio is None:
+                    break
+                metode_http, ruta, versio, capcaleres = peticio
+
+                try:
+                    codi, cos = 200, await self._respon(metode_http, ruta)
+                except ErrorPeticio as e:
+                    codi, cos = e.codi, {'error': str(e)}
+                except Exception as e:
+                    logging.exception(f"Error atenent {ruta}")
+                    codi, cos = 500, {'error': str(e)}
+                logging.info(f"{metode_http} {ruta} -> {codi}")
+
+                mante = versio == 'HTTP/1.1' and capcaleres.get('connection') != 'close'
+                await self._envia(escriptor, codi, cos, mante)
+                if not mante:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escriptor.close()
+
+    async def _serveix(self, host: str, port: int):
+        servidor = await asyncio.start_server(self._aten, host, port)
+        logging.info(f"Servidor escoltant a http://{host}:{port}")
+        async with servidor:
+            await servidor.serve_forever()
+
+    def serveix(self, host: str = '127.0.0.1', port: int = 8000):
+        """
+        Escolta peticions fins que s'atura el procés.
+
+        Parameters
+        ----------
+        host : str
+            Adreça on escoltar.
+        port : int
+            Port on escoltar.
+        """
+        try:
+            asyncio.run(self._serveix(host, port))
+        except KeyboardInterrupt:
+            logging.info('Aturant el servidor...')
+        finally:
+            self.tanca()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+
+
+class Cronometre():
+    """
+    Acumula el temps de cada etapa d'una operació (càrrega, matriu, model, puntuació, selecció, ítems...).
+
+    Una etapa que comença dins d'una altra (p. ex. el model que es torna a
+    calcular quan es demana una puntuació) només compta a la de dins, de
+    manera que les etapes no sumen més que el total.
+
+    Attributes
+    ----------
+    _etapes : dict
+        Segons acumulats per etapa, en l'ordre en què han començat.
+    _inici : float
+        Instant de creació del cronòmetre.
+    _interiors : list
+        Segons de les etapes interiors de cada etapa en curs, de la més externa a la més interna.
+
+    Methods
+    -------
+    etapa(nom)
+        Context que afegeix el temps del bloc a l'etapa.
+    registre()
+        Retorna el temps de cada etapa i el total.
+    """
+    _etapes = dict
+    _inici = float
+    _interiors = list
+
+    def __init__(self):
+        self._etapes = {}
+        self._inici = time.perf_counter()
+        self._interiors = []
+
+    @contextmanager
+    def etapa(self, nom: str):
+        """
+        Afegeix el temps del bloc a una etapa, descomptant-ne el de les etapes interiors.
+
+        Parameters
+        ----------
+        nom : str
+            Nom de l'etapa.
+        """
+        self._etapes.setdefault(nom, 0.0)
+        self._interiors.append(0.0)
+        inici = time.perf_counter()
+        try:
+            yield
+        finally:
+            durada = time.perf_counter() - inici
+            self._etapes[nom] += durada - self._interiors.pop()
+            if self._interiors:
+                self._interiors[-1] += durada
+
+    def registre(self) -> dict:
+        """
+        Retorna el temps de cada etapa i el total des de la creació, en segons.
+
+        Returns
+        -------
+        dict
+            {'etapes': {nom: segons}, 'total': segons}.
+        """
+        return {'etapes': dict(self._etapes), 'total': time.perf_counter() - self._inici}
+
+
+_actiu = ContextVar('cronometre', default=None)
+
+
+@contextmanager
+def mesura():
+    """
+    Activa un cronòmetre nou per a les etapes que s'executin dins del bloc.
+
+    Returns
+    -------
+    Cronometre
+        Cronòmetre actiu dins del bloc.
+    """
+    cronometre = Cronometre()
+    testimoni = _actiu.set(cronometre)
+    try:
+        yield cronometre
+    finally:
+        _actiu.reset(testimoni)
+
+
+@contextmanager
+def etapa(nom: str):
+    """
+    Compta el temps del bloc a l'etapa del cronòmetre actiu; sense cronòmetre actiu no fa res.
+
+    Parameters
+    ----------
+    nom : str
+        Nom de l'etapa.
+    """
+    cronometre = _actiu.get()
+    if cronometre is None:
+        yield
+    else:
+        with cronometre.etapa(nom):
+            yield
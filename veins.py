@@ -0,0 +1,736 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import scipy.sparse as sp
+import logging
+from score import Score
+from paralel import CalculParalel
+from temps import etapa
+
+
+class IndexLSH():
+    """
+    Índex aproximat de veïns per projeccions aleatòries (LSH per similitud cosinus).
+
+    Cada taula projecta les valoracions de cada usuari sobre uns quants
+    hiperplans aleatoris i en guarda el signe com a codi de bits: dos usuaris
+    amb un angle petit tenen el mateix codi amb més probabilitat. Els
+    candidats d'un usuari són els que comparteixen codi en alguna taula. Més
+    taules donen més recall; més bits per taula, cubetes més petites i
+    consultes més ràpides.
+
+    Attributes
+    ----------
+    _taules : int
+        Nombre de taules.
+    _bits : int
+        Nombre d'hiperplans (bits del codi) per taula.
+    _llavor : int
+        Llavor dels hiperplans.
+    _plans : np.ndarray
+        Hiperplans (n_items x taules*bits).
+    _codis_usuaris : np.ndarray
+        Codi de cada usuari a cada taula (n_usuaris x taules).
+    _ordre : np.ndarray
+        Usuaris de cada taula ordenats per codi (taules x n_usuaris).
+    _codis_ordenats : np.ndarray
+        Codis de cada taula en l'ordre de _ordre, per cercar-hi les cubetes.
+
+    Methods
+    -------
+    construeix(score)
+        Calcula els codis de tots els usuaris.
+    grups(taula, mida_bloc)
+        Reparteix els usuaris d'una taula en grups de cubetes senceres.
+    candidats(fila)
+        Retorna els usuaris que comparteixen cubeta amb un usuari.
+    actualitza(score, fila)
+        Recalcula el codi d'un usuari.
+    """
+    _taules: int
+    _bits: int
+    _llavor: int
+    _plans: np.ndarray
+    _codis_usuaris: np.ndarray
+    _ordre: np.ndarray
+    _codis_ordenats: np.ndarray
+
+    def __init__(self, taules: int = 32, bits: int = 8, llavor: int = 0):
+        """
+        Inicialitza un índex buit.
+
+        Parameters
+        ----------
+        taules : int
+            Nombre de taules.
+        bits : int
+            Nombre de bits del codi de cada taula (com a màxim 62).
+        llavor : int
+            Llavor dels hiperplans.
+        """
+        self._taules = taules
+        self._bits = min(bits, 62)
+        self._llavor = llavor
+        self._plans = np.empty((0, taules * self._bits), dtype=np.float32)
+        self._codis_usuaris = np.empty((0, taules), dtype=np.int64)
+        self._ordre = np.empty((taules, 0), dtype=np.int32)
+        self._codis_ordenats = np.empty((taules, 0), dtype=np.int64)
+
+    @property
+    def configuracio(self) -> tuple:
+        return self._taules, self._bits
+
+    @property
+    def taules(self) -> int:
+        return self._taules
+
+    def estat(self):
+        """
+        Retorna l'índex com a metadades i arrays, per desar-lo.
+
+        Returns
+        -------
+        tuple
+            Diccionari de metadades i diccionari d'arrays.
+        """
+        meta = {'taules': self._taules, 'bits': self._bits, 'llavor': self._llavor}
+        return meta, {'plans': self._plans, 'codis_usuaris': self._codis_usuaris, 'ordre': self._ordre}
+
+    @classmethod
+    def des_de_estat(cls, meta: dict, arrays: dict):
+        """
+        Reconstrueix un índex a partir de l'estat desat.
+
+        Parameters
+        ----------
+        meta : dict
+            Metadades retornades per estat().
+        arrays : dict
+            Arrays retornats per estat().
+
+        Returns
+        -------
+        IndexLSH
+            Índex aproximat.
+        """
+        index = cls(meta['taules'], meta['bits'], meta['llavor'])
+        index._plans = arrays['plans']
+        index._codis_usuaris = arrays['codis_usuaris']
+        index._ordre = arrays['ordre']
+        index._codis_ordenats = np.take_along_axis(index._codis_usuaris.T, index._ordre.astype(np.int64), axis=1)
+        return index
+
+    def _amplia_plans(self, n_items: int):
+        """
+        Afegeix hiperplans per als ítems nous, sense canviar els dels ítems existents.
+
+        Parameters
+        ----------
+        n_items : int
+            Nombre d'ítems actual.
+        """
+        if len(self._plans) < n_items:
+            rng = np.random.default_rng([self._llavor, len(self._plans)])
+            nous = rng.standard_normal((n_items - len(self._plans), self._plans.shape[1])).astype(np.float32)
+            self._plans = np.vstack([self._plans, nous])
+
+    def _codis(self, valoracions):
+        """
+        Calcula el codi de cada taula per a unes quantes files de valoracions.
+
+        Parameters
+        ----------
+        valoracions : sp.csr_matrix o np.ndarray
+            Valoracions (files x n_items).
+
+        Returns
+        -------
+        np.ndarray
+            Codis (files x taules).
+        """
+        projeccions = np.asarray(valoracions @ self._plans) > 0
+        pesos = np.left_shift(1, np.arange(self._bits, dtype=np.int64))
+        return projeccions.reshape(-1, self._taules, self._bits) @ pesos
+
+    def _ordena(self):
+        """
+        Ordena els usuaris de cada taula per codi.
+        """
+        self._ordre = np.argsort(self._codis_usuaris.T, axis=1, kind='stable').astype(np.int32)
+        self._codis_ordenats = np.take_along_axis(self._codis_usuaris.T, self._ordre.astype(np.int64), axis=1)
+
+    def construeix(self, score: Score, mida_bloc: int = 4096):
+        """
+        Genera els hiperplans i calcula els codis de tots els usuaris.
+
+        Parameters
+        ----------
+        score : Score
+            Puntuacions.
+        mida_bloc : int
+            Nombre d'usuaris que es projecten alhora.
+        """
+        logging.info(f"Construint índex LSH de {self._taules} taules de {self._bits} bits")
+        rng = np.random.default_rng(self._llavor)
+        self._plans = rng.standard_normal((score.n_items, self._taules * self._bits)).astype(np.float32)
+        codis = [self._codis(score.files_puntuacions(np.arange(inici, min(inici + mida_bloc, score.n_usuaris))))
+                 for inici in range(0, score.n_usuaris, mida_bloc)]
+        self._codis_usuaris = np.concatenate(codis) if codis else np.empty((0, self._taules), dtype=np.int64)
+        self._ordena()
+
+    def actualitza(self, score: Score, fila: int):
+        """
+        Recalcula el codi d'un usuari després que canviïn les seves valoracions.
+
+        Parameters
+        ----------
+        score : Score
+            Puntuacions ja actualitzades.
+        fila : int
+            Índex de fila de l'usuari.
+        """
+        self._amplia_plans(score.n_items)
+        nous = score.n_usuaris - len(self._codis_usuaris)
+        codis = np.vstack([self._codis_usuaris, np.zeros((nous, self._taules), dtype=np.int64)])
+        codis[fila] = self._codis(score.files_puntuacions([fila]))[0]
+        self._codis_usuaris = codis
+
+        # Es treu l'usuari de l'ordre de cada taula i es torna a inserir on li toca, sense reordenar-ho tot.
+        ordre, ordenats = [], []
+        for taula in range(self._taules):
+            files, codis_taula = self._ordre[taula], self._codis_ordenats[taula]
+            posicio = np.flatnonzero(files == fila)
+            files, codis_taula = np.delete(files, posicio), np.delete(codis_taula, posicio)
+            codi = codis[fila, taula]
+            inici, fi = np.searchsorted(codis_taula, codi, 'left'), np.searchsorted(codis_taula, codi, 'right')
+            posicio = inici + np.searchsorted(files[inici:fi], fila)
+            ordre.append(np.insert(files, posicio, fila))
+            ordenats.append(np.insert(codis_taula, posicio, codi))
+        self._ordre, self._codis_ordenats = np.array(ordre, dtype=np.int32), np.array(ordenats)
+
+    def grups(self, taula: int, mida_bloc: int):
+        """
+        Reparteix els usuaris d'una taula en grups de cubetes senceres.
+
+        Els usuaris de la taula estan ordenats per codi, de manera que cada
+        cubeta és un tram contigu de l'ordre. Cada grup ajunta cubetes
+        consecutives fins a mida_bloc usuaris; una cubeta més gran forma un
+        grup tota sola. Els candidats d'un usuari en aquesta taula són, doncs,
+        usuaris del seu mateix grup.
+
+        Parameters
+        ----------
+        taula : int
+            Índex de la taula.
+        mida_bloc : int
+            Nombre d'usuaris a partir del qual es tanca un grup.
+
+        Returns
+        -------
+        list
+            Parelles (índexs de fila dels usuaris, codi de cada usuari) de cada grup.
+        """
+        codis = self._codis_ordenats[taula]
+        n_usuaris = len(codis)
+        limits = np.concatenate([[0], np.flatnonzero(codis[1:] != codis[:-1]) + 1, [n_usuaris]])
+        grups = []
+        inici = 0
+        while inici < n_usuaris:
+            fi = limits[np.searchsorted(limits, inici + mida_bloc, 'right') - 1]
+            if fi <= inici:
+                fi = limits[np.searchsorted(limits, inici, 'right')]
+            grups.append((self._ordre[taula, inici:fi], codis[inici:fi]))
+            inici = fi
+        return grups
+
+    def candidats(self, fila: int):
+        """
+        Retorna els usuaris que comparteixen cubeta amb un usuari en alguna taula.
+
+        Parameters
+        ----------
+        fila : int
+            Índex de fila de l'usuari.
+
+        Returns
+        -------
+        np.ndarray
+            Índexs de fila dels candidats, sense repetir i sense l'usuari.
+        """
+        trobats = []
+        for taula in range(self._taules):
+            codis = self._codis_ordenats[taula]
+            codi = self._codis_usuaris[fila, taula]
+            inici, fi = np.searchsorted(codis, codi, 'left'), np.searchsorted(codis, codi, 'right')
+            trobats.append(self._ordre[taula, inici:fi])
+        candidats = np.sort(np.concatenate(trobats))
+        unics = np.ones(len(candidats), dtype=bool)
+        unics[1:] = candidats[1:] != candidats[:-1]
+        return candidats[unics & (candidats != fila)]
+
+
+class IndexVeins():
+    """
+    Índex precalculat dels k usuaris més similars de cada usuari.
+
+    Attributes
+    ----------
+    _k : int
+        Nombre de veïns guardats per usuari.
+    _veins : np.ndarray
+        Matriu (n_usuaris x k) amb l'índex de fila de cada veí, -1 si no n'hi ha.
+    _pesos : np.ndarray
+        Matriu (n_usuaris x k) amb la similitud de cada veí.
+    _versio : int
+        Versió de les valoracions amb què s'ha construït l'índex.
+    _lsh : IndexLSH
+        Índex aproximat per triar els candidats a veí, o None per a la cerca exacta.
+
+    Methods
+    -------
+    construeix(score)
+        Calcula els veïns de tots els usuaris.
+    vigent(score)
+        Comprova si l'índex correspon a les valoracions actuals.
+    veins(fila)
+        Retorna els veïns i els pesos d'un usuari.
+    veins_files(files)
+        Retorna els veïns i els pesos d'un bloc d'usuaris.
+    actualitza(score, fila)
+        Corregeix l'índex després que canviïn les valoracions d'un usuari.
+    """
+    _k: int
+    _veins: np.ndarray
+    _pesos: np.ndarray
+    _versio: int
+    _lsh: IndexLSH
+
+    def __init__(self, k: int = 5, lsh: IndexLSH = None):
+        """
+        Inicialitza un índex buit.
+
+        Parameters
+        ----------
+        k : int
+            Nombre de veïns a guardar per usuari.
+        lsh : IndexLSH, optional
+            Índex aproximat per triar els candidats; sense, la cerca és exacta.
+        """
+        self._k = k
+        self._lsh = lsh
+        self._veins = np.empty((0, k), dtype=np.int32)
+        self._pesos = np.empty((0, k), dtype=np.float32)
+        self._versio = -1
+
+    @property
+    def k(self) -> int:
+        return self._k
+
+    @property
+    def lsh(self) -> IndexLSH:
+        return self._lsh
+
+    def estat(self):
+        """
+        Retorna l'índex com a metadades i arrays, per desar-lo.
+
+        Returns
+        -------
+        tuple
+            Diccionari de metadades i diccionari d'arrays.
+        """
+        meta = {'k': self._k, 'versio': int(self._versio), 'lsh': None}
+        arrays = {'veins': self._veins, 'pesos': self._pesos}
+        if self._lsh is not None:
+            meta['lsh'], arrays_lsh = self._lsh.estat()
+            arrays.update({f'lsh_{nom}': array for nom, array in arrays_lsh.items()})
+        return meta, arrays
+
+    @classmethod
+    def des_de_estat(cls, meta: dict, arrays: dict):
+        """
+        Reconstrueix un índex a partir de l'estat desat.
+
+        Parameters
+        ----------
+        meta : dict
+            Metadades retornades per estat().
+        arrays : dict
+            Arrays retornats per estat().
+
+        Returns
+        -------
+        IndexVeins
+            Índex de veïns.
+        """
+        lsh = None
+        if meta.get('lsh'):
+            lsh = IndexLSH.des_de_estat(meta['lsh'], {nom[4:]: array for nom, array in arrays.items() if nom.startswith('lsh_')})
+        index = cls(meta['k'], lsh)
+        index._veins = arrays['veins']
+        index._pesos = arrays['pesos']
+        index._versio = meta['versio']
+        return index
+
+    def construeix(self, score: Score, mida_bloc: int = 256, processos: int = 1):
+        """
+        Calcula els k veïns de tots els usuaris, per blocs de files.
+
+        Parameters
+        ----------
+        score : Score
+            Puntuacions a partir de les quals es calculen les similituds.
+        mida_bloc : int
+            Nombre d'usuaris que es processen alhora.
+        processos : int
+            Amb més d'un, cada bloc es reparteix per trams d'usuaris entre un
+            pool de processos (només per a la cerca exacta).
+        """
+        logging.info(f"Construint índex de {self._k} veïns per a {score.n_usuaris} usuaris")
+        with etapa('model'):
+            self._construeix(score, mida_bloc, processos)
+
+    def _construeix(self, score: Score, mida_bloc: int, processos: int):
+        """
+        Calcula els k veïns de tots els usuaris (vegeu construeix).
+        """
+        n_usuaris = score.n_usuaris
+        self._veins = np.full((n_usuaris, self._k), -1, dtype=np.int32)
+        self._pesos = np.zeros((n_usuaris, self._k), dtype=np.float32)
+        if self._lsh is not None:
+            self._lsh.construeix(score)
+            # Durant la construcció els forats tenen pes -inf, perquè qualsevol candidat hi entri.
+            self._pesos[:] = -np.inf
+            for taula in range(self._lsh.taules):
+                for membres, codis in self._lsh.grups(taula, mida_bloc):
+                    for inici in range(0, len(membres), mida_bloc):
+                        self._desa_candidats(score, membres, codis, inici, min(inici + mida_bloc, len(membres)))
+            buits = np.isneginf(self._pesos)
+            self._veins[buits], self._pesos[buits] = -1, 0
+        elif processos > 1:
+            with CalculParalel(score, processos) as calcul:
+                for inici in range(0, n_usuaris, mida_bloc):
+                    files = np.arange(inici, min(inici + mida_bloc, n_usuaris))
+                    self._veins[files], self._pesos[files] = calcul.top_k(files, self._k)
+        else:
+            for inici in range(0, n_usuaris, mida_bloc):
+                files = np.arange(inici, min(inici + mida_bloc, n_usuaris))
+                similituds = score.similituds_files(files)
+                self._desa_top_k(files, similituds)
+        self._versio = score.versio
+
+    def _desa_candidats(self, score: Score, membres, codis, inici: int, fi: int):
+        """
+        Combina els veïns d'un tram d'un grup de cubetes amb els trobats a les taules anteriors.
+
+        Els candidats de cada usuari del tram són els del grup amb el mateix
+        codi: les similituds exactes s'obtenen amb un sol producte del tram
+        contra el grup, i la resta de parelles queden a -inf.
+
+        Parameters
+        ----------
+        score : Score
+            Puntuacions.
+        membres : np.ndarray
+            Índexs de fila dels usuaris del grup (IndexLSH.grups).
+        codis : np.ndarray
+            Codi de cada usuari del grup a la taula.
+        inici, fi : int
+            Tram del grup que es processa, [inici, fi).
+        """
+        files = membres[inici:fi]
+        similituds = score.similituds_files(files, membres)
+        similituds[codis[inici:fi, None] != codis[None, :]] = -np.inf
+        similituds[np.arange(len(files)), np.arange(inici, fi)] = -np.inf
+        k = min(self._k, len(membres))
+        triats = np.argpartition(-similituds, k - 1, axis=1)[:, :k]
+        pesos = np.take_along_axis(similituds, triats, axis=1).astype(np.float32)
+        veins = np.where(np.isneginf(pesos), -1, membres[triats])
+
+        # Un veí pot sortir a més d'una taula: es compta un sol cop.
+        veins = np.hstack([self._veins[files], veins])
+        pesos = np.hstack([self._pesos[files], pesos])
+        ordre = np.argsort(veins, axis=1, kind='stable')
+        veins, pesos = np.take_along_axis(veins, ordre, axis=1), np.take_along_axis(pesos, ordre, axis=1)
+        repetits = np.zeros(veins.shape, dtype=bool)
+        repetits[:, 1:] = (veins[:, 1:] == veins[:, :-1]) & (veins[:, 1:] >= 0)
+        veins[repetits], pesos[repetits] = -1, -np.inf
+        ordre = np.lexsort((veins, -pesos), axis=1)[:, :self._k]
+        self._veins[files] = np.take_along_axis(veins, ordre, axis=1)
+        self._pesos[files] = np.take_along_axis(pesos, ordre, axis=1)
+
+    def _desa_top_k(self, files, similituds):
+        """
+        Guarda els k veïns més similars de cada fila d'un bloc.
+
+        Parameters
+        ----------
+        files : np.ndarray
+            Índexs dels usuaris del bloc.
+        similituds : np.ndarray
+            Matriu (len(files) x n_usuaris) de similituds.
+        """
+        similituds[np.arange(len(files)), files] = -np.inf
+        k = min(self._k, similituds.shape[1] - 1)
+        if k <= 0:
+            return
+        candidats = np.argpartition(-similituds, k - 1, axis=1)[:, :k]
+        pesos = np.take_along_axis(similituds, candidats, axis=1)
+        ordre = np.lexsort((candidats, -pesos), axis=1)
+        candidats, pesos = np.take_along_axis(candidats, ordre, axis=1), np.take_along_axis(pesos, ordre, axis=1)
+        # Amb LSH, els usuaris que no són candidats tenen similitud -inf i queden com a forats.
+        buits = np.isneginf(pesos)
+        candidats[buits], pesos[buits] = -1, 0
+        self._veins[files, :k] = candidats
+        self._pesos[files, :k] = pesos
+
+    def _similituds(self, score: Score, files):
+        """
+        Calcula les similituds d'uns quants usuaris amb tots els altres.
+
+        Amb LSH només es calculen amb els candidats de cada usuari (IndexLSH.candidats)
+        i la resta queden a -inf, igual que a la construcció.
+
+        Parameters
+        ----------
+        score : Score
+            Puntuacions.
+        files : np.ndarray
+            Índexs de fila dels usuaris.
+
+        Returns
+        -------
+        np.ndarray
+            Matriu (len(files) x n_usuaris) de similituds.
+        """
+        if self._lsh is None:
+            return score.similituds_files(files)
+        similituds = np.full((len(files), score.n_usuaris), -np.inf)
+        for i, fila in enumerate(files):
+            candidats = self._lsh.candidats(fila)
+            similituds[i, candidats] = score.similituds_candidats(fila, candidats)
+        return similituds
+
+    def actualitza(self, score: Score, fila: int, mida_bloc: int = 256):
+        """
+        Corregeix l'índex després d'un canvi a les valoracions d'un sol usuari.
+
+        Només canvien les similituds amb aquest usuari: se li recalculen els
+        veïns, es recalculen sencers els usuaris que el tenien com a veí i, per
+        a la resta, entra a la llista si supera el veí més feble. Amb LSH,
+        totes aquestes similituds es calculen només amb els candidats. Si l'índex ja
+        no corresponia a la versió anterior de les valoracions, no es toca i es
+        reconstruirà quan calgui.
+
+        Parameters
+        ----------
+        score : Score
+            Puntuacions ja actualitzades.
+        fila : int
+            Índex de fila de l'usuari que ha canviat.
+        mida_bloc : int
+            Nombre d'usuaris que es recalculen alhora.
+        """
+        if self._versio != score.versio - 1:
+            return
+        if self._lsh is not None:
+            self._lsh.actualitza(score, fila)
+        n_usuaris = score.n_usuaris
+        nous = n_usuaris - len(self._veins)
+        self._veins = np.vstack([self._veins, np.full((nous, self._k), -1, dtype=np.int32)])
+        self._pesos = np.vstack([self._pesos, np.zeros((nous, self._k), dtype=np.float32)])
+
+        similituds = self._similituds(score, [fila])
+        self._desa_top_k(np.array([fila]), similituds.copy())
+        similituds = similituds[0].astype(np.float32)
+
+        tenien = (self._veins == fila).any(axis=1)
+        tenien[fila] = False
+        afectats = np.flatnonzero(tenien)
+        for inici in range(0, len(afectats), mida_bloc):
+            files = afectats[inici:inici + mida_bloc]
+            self._desa_top_k(files, self._similituds(score, files))
+
+        # La llista està ordenada per similitud decreixent: el veí més feble
+        # és l'últim, i un forat (-1) sempre deixa entrar el nou veí.
+        altres = ~tenien
+        altres[fila] = False
+        ultim_vei, ultim_pes = self._veins[:, -1], self._pesos[:, -1]
+        entren = altres & np.isfinite(similituds) & ((ultim_vei < 0) | (similituds > ultim_pes) |
+                                                     ((similituds == ultim_pes) & (fila < ultim_vei)))
+        entren = np.flatnonzero(entren)
+        if len(entren):
+            self._veins[entren, -1] = fila
+            self._pesos[entren, -1] = similituds[entren]
+            veins, pesos = self._veins[entren], self._pesos[entren]
+            ordre = np.lexsort((veins, -pesos, veins < 0), axis=1)
+            self._veins[entren] = np.take_along_axis(veins, ordre, axis=1)
+            self._pesos[entren] = np.take_along_axis(pesos, ordre, axis=1)
+        self._versio = score.versio
+
+    def vigent(self, score: Score) -> bool:
+        """
+        Comprova si l'índex correspon a les valoracions actuals.
+
+        Parameters
+        ----------
+        score : Score
+            Puntuacions actuals.
+
+        Returns
+        -------
+        bool
+            True si l'índex s'ha construït amb la mateixa versió de valoracions.
+        """
+        return self._versio == score.versio and len(self._veins) == score.n_usuaris
+
+    def veins(self, fila: int):
+        """
+        Retorna els veïns d'un usuari ordenats per similitud decreixent.
+
+        Parameters
+        ----------
+        fila : int
+            Índex de fila de l'usuari.
+
+        Returns
+        -------
+        tuple
+            Índexs de fila dels veïns i les seves similituds.
+        """
+        veins = self._veins[fila]
+        valids = veins >= 0
+        return veins[valids], self._pesos[fila][valids]
+
+    def veins_files(self, files):
+        """
+        Retorna els veïns d'un bloc d'usuaris.
+
+        Parameters
+        ----------
+        files : np.ndarray
+            Índexs de fila dels usuaris.
+
+        Returns
+        -------
+        tuple
+            Matrius (len(files) x k) d'índexs de veïns (-1 si no n'hi ha) i de similituds.
+        """
+        return self._veins[files], self._pesos[files]
+
+
+def matriu_similituds_items(score: Score, k: int = 50, mida_bloc: int = 512):
+    """
+    Calcula la matriu dispersa de similituds entre ítems, amb els k veïns de cada ítem.
+
+    La columna j conté les similituds dels k ítems més semblants a j, de
+    manera que el producte d'una fila de valoracions per la matriu acumula,
+    per a cada ítem, les valoracions dels seus veïns.
+
+    Parameters
+    ----------
+    score : Score
+        Puntuacions a partir de les quals es calculen les similituds.
+    k : int
+        Nombre de veïns a guardar per ítem.
+    mida_bloc : int
+        Nombre d'ítems que es processen alhora.
+
+    Returns
+    -------
+    sp.csc_matrix
+        Matriu (n_items x n_items) de similituds.
+    """
+    logging.info(f"Calculant similituds entre {score.n_items} ítems (k={k})")
+    n_items = score.n_items
+    k = min(k, n_items - 1)
+    files, columnes, valors = _veins_items(score, np.arange(n_items), k, mida_bloc)
+    return sp.csc_matrix((valors, (files, columnes)), shape=(n_items, n_items))
+
+
+def _veins_items(score: Score, items, k: int, mida_bloc: int = 512):
+    """
+    Calcula els k veïns (amb similitud positiva) d'uns quants ítems.
+
+    Returns
+    -------
+    tuple
+        Files (veïns), columnes (ítems) i similituds en float32, com a triplets d'una matriu dispersa.
+    """
+    files, columnes, valors = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], []
+    for inici in range(0, len(items) if k > 0 else 0, mida_bloc):
+        bloc = np.asarray(items[inici:inici + mida_bloc], dtype=np.int64)
+        similituds = score.similituds_columnes(bloc)
+        similituds[np.arange(len(bloc)), bloc] = 0
+        veins = np.argpartition(-similituds, k - 1, axis=1)[:, :k]
+        pesos = np.take_along_axis(similituds, veins, axis=1)
+        positius = pesos > 0
+        files.append(veins[positius])
+        columnes.append(np.repeat(bloc, k).reshape(len(bloc), k)[positius])
+        valors.append(pesos[positius])
+    return np.concatenate(files), np.concatenate(columnes), np.concatenate(valors or [[]]).astype(np.float32)
+
+
+def actualitza_similituds_items(similituds: sp.csc_matrix, score: Score, columna: int, k: int = 50,
+                                mida_bloc: int = 512) -> sp.csc_matrix:
+    """
+    Corregeix la matriu de similituds entre ítems després que canviï una valoració de l'ítem columna.
+
+    Només canvien les similituds de columna amb la resta d'ítems (el seu
+    vector i la seva norma): la resta de parells no comparteixen el valor
+    modificat. Es tornen a calcular els veïns de columna i dels ítems que el
+    tenien com a veí (el pes pot haver baixat i deixar passar un altre ítem);
+    els ítems on ara supera el veí més fluix el guanyen en lloc d'aquest.
+
+    Parameters
+    ----------
+    similituds : sp.csc_matrix
+        Matriu de similituds calculada amb matriu_similituds_items abans del canvi.
+    score : Score
+        Puntuacions ja modificades.
+    columna : int
+        Índex de l'ítem de la valoració.
+    k : int
+        Nombre de veïns per ítem.
+    mida_bloc : int
+        Nombre d'ítems que es tornen a calcular alhora.
+
+    Returns
+    -------
+    sp.csc_matrix
+        Matriu (n_items x n_items) de similituds corregida.
+    """
+    n_items = score.n_items
+    k = min(k, n_items - 1)
+    indptr = np.asarray(similituds.indptr, dtype=np.int64)
+    indptr = np.concatenate([indptr, np.full(n_items + 1 - len(indptr), indptr[-1])])
+    files = np.asarray(similituds.indices, dtype=np.int64)
+    valors = np.asarray(similituds.data, dtype=np.float32)
+    columnes = np.repeat(np.arange(n_items), np.diff(indptr))
+
+    noves = score.similituds_columnes([columna])[0]
+    noves[columna] = 0
+    recalcula = np.zeros(n_items, dtype=bool)
+    recalcula[columna] = True
+    recalcula[columnes[files == columna]] = True
+
+    # Ítems que no el tenien de veí i on ara entra: substitueix el veí més fluix si ja en tenen k.
+    quantitats = np.diff(indptr)
+    minims = np.full(n_items, np.inf, dtype=np.float32)
+    plens = quantitats > 0
+    minims[plens] = np.minimum.reduceat(valors, indptr[:-1][plens])
+    guanya = ~recalcula & (noves > 0) & ((quantitats < k) | (noves > minims))
+    treu = guanya[columnes] & (quantitats[columnes] >= k) & (valors == minims[columnes])
+    posicions = np.flatnonzero(treu)
+    posicions = posicions[np.unique(columnes[posicions], return_index=True)[1]]
+
+    conserva = ~recalcula[columnes]
+    conserva[posicions] = False
+    inserits = np.flatnonzero(guanya)
+    nous_files, nous_columnes, nous_valors = _veins_items(score, np.flatnonzero(recalcula), k, mida_bloc)
+    logging.debug(f"Similituds de l'ítem {columna}: {recalcula.sum()} ítems recalculats, {len(inserits)} amb un veí nou")
+    files = np.concatenate([files[conserva], np.full(len(inserits), columna), nous_files])
+    columnes = np.concatenate([columnes[conserva], inserits, nous_columnes])
+    valors = np.concatenate([valors[conserva], noves[inserits].astype(np.float32), nous_valors])
+    return sp.csc_matrix((valors, (files, columnes)), shape=(n_items, n_items))